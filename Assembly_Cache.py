@@ -0,0 +1,62 @@
+from dolfin import *
+
+"""Cache for the assembly of matrices: each Function feeding a form has a version counter which is bumped
+   (through 'touch') whenever its values are changed by an assignment or a solve, while Constants are compared
+   by value. A matrix is assembled again only if the state of the coefficients of its form has changed
+   since the last assembly into the same tensor"""
+class AssemblyCache:
+    def __init__(self, enabled = True):
+        self.enabled = enabled
+        self.versions = {}
+        self.keys = {}
+        self.coefficients = {}
+        self.hits = {}
+        self.misses = {}
+
+
+    """Bump the version of the given functions"""
+    def touch(self, *functions):
+        for f in functions:
+            self.versions[id(f)] = self.versions.get(id(f), 0) + 1
+
+
+    """Forget the versions and the assembled states (e.g. when the mesh and the functions are rebuilt)"""
+    def clear(self):
+        self.versions.clear()
+        self.keys.clear()
+        self.coefficients.clear()
+
+
+    """State of the coefficients of a form"""
+    def state(self, name, form):
+        if(name not in self.coefficients):
+            self.coefficients[name] = form.coefficients()
+        return tuple(tuple(c.values()) if isinstance(c, Constant) else (id(c), self.versions.get(id(c), 0)) \
+                     for c in self.coefficients[name])
+
+
+    """Check whether the form has to be assembled into the tensor (the caller is then expected to assemble it)"""
+    def needs_assembly(self, name, form, tensor):
+        if(not self.enabled):
+            return True
+        key = (id(tensor), self.state(name, form))
+        if(self.keys.get(name) == key):
+            self.hits[name] = self.hits.get(name, 0) + 1
+            return False
+        self.keys[name] = key
+        self.misses[name] = self.misses.get(name, 0) + 1
+        return True
+
+
+    """Assemble the form into the tensor unless its coefficients did not change: return True if it has been assembled"""
+    def assemble(self, name, form, tensor):
+        if(self.needs_assembly(name, form, tensor)):
+            assemble(form, tensor = tensor)
+            return True
+        return False
+
+
+    """Text with the hits and the misses for each tensor"""
+    def report(self):
+        return "\n".join(name + ": " + str(self.hits.get(name, 0)) + " reused, " + str(self.misses[name]) + " assembled" \
+                         for name in sorted(self.misses))
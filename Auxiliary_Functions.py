@@ -2,6 +2,8 @@ from dolfin import *
 import numpy as np
 import ufl
 
+from Auxiliary_Functions_NumPy import *
+
 """Define symmetric gradient"""
 def D(u):
     return sym(grad(u))
@@ -22,3 +24,38 @@ def CHeaviside(psi, eps):
 """'Continuous Dirac's delta approximation'"""
 def CDelta(psi, eps):
     return conditional(lt(abs(psi),eps), 1.0/(2.0*eps)*(1.0 + ufl.cos(np.pi*psi/eps)), 0.0)
+
+
+"""Reusable L2 projection onto a fixed space: the mass matrix is assembled and factorized only once
+   and the right-hand side form is cached"""
+class Projector:
+    def __init__(self, expr, V, f = None):
+        #Save the right-hand side and the function to store the result
+        u = TrialFunction(V)
+        v = TestFunction(V)
+        self.L = inner(expr, v)*dx
+        self.b = PETScVector()
+        self.f = Function(V) if f is None else f
+        if(not isinstance(self.f, Function)):
+            raise ValueError("f must be an instance of Function")
+
+        #Assemble the mass matrix and set the solver
+        self.M = assemble(inner(u, v)*dx)
+        self.solver = LUSolver(self.M, "default") #The factorization is reused since the operator does not change
+
+
+    """Compute the projection"""
+    def project(self):
+        assemble(self.L, tensor = self.b)
+        self.solver.solve(self.f.vector(), self.b)
+        return self.f
+
+        assemble(self.L, tensor = self.b)
+        if(self.method == 'lumped'):
+            self.f.vector().set_local(self.b.get_local()/self.M_lumped.get_local())
+            self.f.vector().apply("insert")
+        else:
+            self.solver.solve(self.f.vector(), self.b)
+
+        self.key = key
+        return self.f
@@ -0,0 +1,25 @@
+import numpy as np
+
+"""Counterparts of the functions in 'Auxiliary_Functions' acting on arrays (dof vectors or values at quadrature points):
+   they do not need DOLFIN, so they can be employed also for the offline post-processing of saved snapshots"""
+
+"""Euclidean norm for the gradient (the components are along the last axis)"""
+def mgrad_np(grad_b):
+    grad_b = np.asarray(grad_b, dtype = float)
+    return np.sqrt(grad_b[..., 0]**2 + grad_b[..., 1]**2)
+
+
+"""Approximate sign function"""
+def signp_np(l, grad_l, eps):
+    l = np.asarray(l, dtype = float)
+    return l/np.sqrt(l*l + eps*eps*mgrad_np(grad_l)**2)
+
+"""'Continuous Heaviside approximation'"""
+def CHeaviside_np(psi, eps):
+    psi = np.asarray(psi, dtype = float)
+    return np.where(np.abs(psi) < eps, 0.5*(1.0 + psi/eps + 1/np.pi*np.sin(np.pi*psi/eps)), (np.sign(psi) + 1)/2.0)
+
+"""'Continuous Dirac's delta approximation'"""
+def CDelta_np(psi, eps):
+    psi = np.asarray(psi, dtype = float)
+    return np.where(np.abs(psi) < eps, 1.0/(2.0*eps)*(1.0 + np.cos(np.pi*psi/eps)), 0.0)
@@ -22,3 +22,21 @@ class FreeSlip_Boundary(SubDomain):
     #Override of the 'inside' function
     def inside(self, x, on_boundary):
         return near(x[0], 0.0) or near(x[0], self.base)
+
+
+#Identifiers of the boundaries in the facet markers
+NOSLIP_ID   = 1
+FREESLIP_ID = 2
+
+"""Mark the boundary facets of the box once: the subdomains are compiled, so no Python callback is evaluated"""
+def mark_boundaries(mesh, base, height):
+    markers = MeshFunction("size_t", mesh, mesh.topology().dim() - 1, 0)
+    CompiledSubDomain("on_boundary && (near(x[0], 0.0) || near(x[0], base))", base = base).mark(markers, FREESLIP_ID)
+    CompiledSubDomain("on_boundary && (near(x[1], 0.0) || near(x[1], height))", height = height).mark(markers, NOSLIP_ID)
+    return markers
+
+
+"""Boundary conditions for the velocity on the box: no-slip on the horizontal walls and free-slip on the vertical ones"""
+def box_velocity_bcs(V, markers):
+    return [DirichletBC(V, Constant((0.0,0.0)), markers, NOSLIP_ID), \
+            DirichletBC(V.sub(0), Constant(0.0), markers, FREESLIP_ID)]
@@ -1,9 +1,12 @@
 from TwoPhaseFlows import *
 from My_Parameters import My_Parameters
 from Boundary_Definition import *
+from Partitioning import *
+from Reference_Benchmark import *
 
 from sys import exit
 import os
+import time
 
 class BubbleMove(TwoPhaseFlows):
     """Class constructor"""
@@ -29,9 +32,8 @@ class BubbleMove(TwoPhaseFlows):
         self.comm = MPI.comm_world
         self.rank = MPI.rank(self.comm)
 
-        #Check coherence of dimensional choice
-        if(self.Param["Reference_Dimensionalization"] != 'Dimensional'):
-            raise ValueError("This instance of the problem 'BubbleMove' works in a dimensional framework")
+        #Check the options of the configuration
+        self.check_configuration('Bubble')
 
         try:
             self.rho1  = float(self.Param["Lighter_density"])
@@ -46,15 +48,6 @@ class BubbleMove(TwoPhaseFlows):
             print(str(e) +  "\nPlease check configuration file")
             exit(1)
 
-        #Check correctness of data read
-        if(self.rho1 < DOLFIN_EPS or self.rho2 < DOLFIN_EPS or self.mu1 < DOLFIN_EPS or self.mu2 < DOLFIN_EPS \
-           or self.dt < DOLFIN_EPS or self.t_end < DOLFIN_EPS or self.g < 0.0 or self.sigma < 0.0):
-            raise ValueError("Invalid parameter read in the configuration file (read a non positive value for some parameters)")
-        if(self.dt > self.t_end):
-            raise ValueError("Time-step greater than final time")
-        if(self.rho2 < self.rho1 and self.rank == 0):
-            warnings.warn("The heavier density is not greater than the lighter one")
-
         #Since this parameters are more related to the numeric part
         #rather than physics we set a default value
         #and so they are present for sure
@@ -63,18 +56,6 @@ class BubbleMove(TwoPhaseFlows):
         self.stab_method   = self.Param["Stabilization_Type"]
         self.NS_sol_method = self.Param["NS_Procedure"]
 
-        #Check correctness of Level-set method
-        if(self.stab_method not in self.stab_dict):
-            raise ValueError("Stabilization method not available")
-
-        #Check correctness of Navier-Stokes method
-        if(self.NS_sol_method not in self.NS_sol_dict):
-            raise ValueError("Solution method for Navier-Stokes not available")
-
-        #Check correctness of reinitialization method
-        if(self.reinit_method not in self.reinit_method_dict):
-            raise ValueError("Reinitialization method not available")
-
         #Set more adequate solvers in case of one core execution
         if(MPI.size(self.comm) == 1):
             if(self.reinit_method == 'Non_Conservative_Hyperbolic'):
@@ -107,9 +88,23 @@ class BubbleMove(TwoPhaseFlows):
         #Set parameter for standard output
         set_log_level(self.Param["Log_Level"] if self.rank == 0 else 1000)
 
-        #Detect properties for reconstrution step
-        self.tol_recon = self.Param["Tolerance_recon"]
-        self.max_subiters = self.Param["Maximum_subiters_recon"]
+        #Read the numerical options shared with the other problems
+        self.read_options()
+
+        #Detect the reference series (column=file) for the errors computed during the run and the error budget
+        self.reference_errors = None
+        if(self.Param["Reference_Series"] != 'None'):
+            references = {}
+            for item in self.Param["Reference_Series"].split(','):
+                (column, filename) = item.strip().split('=', 1)
+                references[column] = load_reference_series(filename)
+            self.reference_errors = RunningErrors(references)
+        self.error_budget = self.Param["Reference_Error_Budget"]
+        self.error_norm   = self.Param["Reference_Error_Norm"]
+
+        #Detect the format of the benchmark series
+        self.series_format = self.Param["Series_Format"]
+        self.series_file = 'benchmark_series.dat' if self.series_format == 'Text' else 'benchmark_series.bin'
 
 
     """Return the communicator"""
@@ -118,28 +113,47 @@ class BubbleMove(TwoPhaseFlows):
 
 
     """Build the mesh for the simulation"""
-    def build_mesh(self):
-        #Generate mesh
+    def build_mesh(self, mesh = None, spaces = None):
+        #Generate mesh (if it is not supplied)
         try:
             self.base   = float(self.Param["Base"])
             self.height = float(self.Param["Height"])
         except RuntimeError as e:
             print(str(e) +  "\nPlease check configuration file")
             exit(1)
-        self.mesh = RectangleMesh(Point(0.0, 0.0), Point(self.base, self.height), \
-                                  self.Param["Number_vertices_x"], self.Param["Number_vertices_y"])
-
-        #Define FE spaces
+        t_mesh = time.perf_counter()
+        self.hmin = None
+        if(mesh is None and self.mesh_cache is not None):
+            (self.mesh, self.hmin, self.mesh_loaded) = cached_rectangle_mesh(self.comm, self.base, self.height, \
+                                                                             self.resolution[0], self.resolution[1], \
+                                                                             self.mesh_cache)
+        elif(mesh is None):
+            self.mesh = RectangleMesh(Point(0.0, 0.0), Point(self.base, self.height), self.resolution[0], self.resolution[1])
+        else:
+            self.mesh = mesh
+        if(self.hmin is None):
+            self.hmin = MPI.min(self.comm, self.mesh.hmin())
+        self.t_mesh = time.perf_counter() - t_mesh
+
+        #Define FE spaces (unless they are shared with another simulation on the same mesh)
         if(self.deg == 0):
             raise ValueError("Invalid degree for polynomials employed in Navier-Stokes (the pair P1-P0 is not stable)")
-        Velem = VectorElement("Lagrange", self.mesh.ufl_cell(), self.deg + 1)
-        Pelem = FiniteElement("Lagrange", self.mesh.ufl_cell(), self.deg)
-        self.V  = FunctionSpace(self.mesh, Velem)
-        self.P  = FunctionSpace(self.mesh, Pelem)
-        if(self.NS_sol_method == 'Standard'):
-            self.W  = FunctionSpace(self.mesh, Velem*Pelem)
-        self.Q  = FunctionSpace(self.mesh, "CG", 2)
-        self.Q2 = VectorFunctionSpace(self.mesh, "CG", 1)
+        if(spaces is None):
+            Velem = VectorElement("Lagrange", self.mesh.ufl_cell(), self.deg + 1)
+            Pelem = FiniteElement("Lagrange", self.mesh.ufl_cell(), self.deg)
+            self.V  = FunctionSpace(self.mesh, Velem)
+            self.P  = FunctionSpace(self.mesh, Pelem)
+            if(self.NS_sol_method == 'Standard'):
+                self.W  = FunctionSpace(self.mesh, Velem*Pelem)
+            self.Q  = FunctionSpace(self.mesh, "CG", 2)
+            self.Q2 = VectorFunctionSpace(self.mesh, "CG", 1)
+        else:
+            self.V  = spaces['V']
+            self.P  = spaces['P']
+            if(self.NS_sol_method == 'Standard'):
+                self.W  = spaces['W']
+            self.Q  = spaces['Q']
+            self.Q2 = spaces['Q2']
 
         #Define trial and test functions
         if(self.NS_sol_method == 'Standard'):
@@ -160,12 +174,20 @@ class BubbleMove(TwoPhaseFlows):
         self.p_old    = Function(self.P)
         if(self.NS_sol_method == 'Standard'):
             self.w_curr = Function(self.W)
+            self.assigner_NS = FunctionAssigner([self.V, self.P], self.W) #Persistent, to extract velocity and pressure in place
         self.phi_curr = Function(self.Q)
         self.phi_old  = Function(self.Q)
 
         #Define function to store the normal
         self.n = Function(self.Q2)
 
+        #Define functions for the velocity transporting the level-set and for the state at the beginning
+        #of the macro step in case of sub-cycling
+        if(self.subcycling):
+            self.u_start   = Function(self.V)
+            self.u_LS      = Function(self.V)
+            self.phi_start = Function(self.Q)
+
         #Define useful functions for reinitialization
         self.phi0 = Function(self.Q)
         self.phi_intermediate = Function(self.Q) #This is fundamental in case on 'non-conservative'
@@ -176,7 +198,7 @@ class BubbleMove(TwoPhaseFlows):
 
         #Parameters for reinitialization steps
         if(self.reinit_method == 'Non_Conservative_Hyperbolic'):
-            hmin = MPI.min(self.comm, self.mesh.hmin())
+            hmin = self.hmin
             self.eps = self.Param["Interface_Thickness"]
             if(self.eps < DOLFIN_EPS):
                 raise  ValueError("Non-Positive value for the interface thickness")
@@ -198,7 +220,7 @@ class BubbleMove(TwoPhaseFlows):
                                                     (self.phi_curr, self.phi_intermediate, self.phi0, self.dt_reinit, \
                                                      self.max_subiters, self.tol_recon)}
         elif(self.reinit_method == 'Conservative'):
-            hmin = MPI.min(self.comm, self.mesh.hmin())
+            hmin = self.hmin
             self.dt_reinit = Constant(0.5*hmin**(1.1))
             self.eps = Constant(0.5*hmin**(0.9))
 
@@ -244,16 +266,18 @@ class BubbleMove(TwoPhaseFlows):
 
     """Assemble boundary condition"""
     def assembleBC(self):
+        #Mark the boundary facets only once (the boundary dofs are then found without Python callbacks)
+        self.boundary_markers = mark_boundaries(self.mesh, self.base, self.height)
+
         if(self.NS_sol_method == 'Standard'):
-            self.bcs = [DirichletBC(self.W.sub(0), Constant((0.0,0.0)),  NoSlip_Boundary(self.height)), \
-                        DirichletBC(self.W.sub(0).sub(0), Constant(0.0), FreeSlip_Boundary(self.base))]
+            self.bcs = [DirichletBC(self.W.sub(0), Constant((0.0,0.0)), self.boundary_markers, NOSLIP_ID), \
+                        DirichletBC(self.W.sub(0).sub(0), Constant(0.0), self.boundary_markers, FREESLIP_ID)]
 
             #Useful dictionaries for solver in order to avoid too many ifs
             self.switcher_NS_solve = {'Standard': self.solve_Standard_NS_system}
             self.switcher_arguments_NS_solve = {'Standard': (self.bcs, self.w_curr)}
         elif(self.NS_sol_method == 'ICT'):
-            self.bcs = [DirichletBC(self.V, Constant((0.0,0.0)),  NoSlip_Boundary(self.height)), \
-                        DirichletBC(self.V.sub(0), Constant(0.0), FreeSlip_Boundary(self.base))]
+            self.bcs = box_velocity_bcs(self.V, self.boundary_markers)
 
             #Useful dictionaries for solver in order to avoid too many ifs
             self.switcher_NS_solve = {'ICT': self.solve_ICT_NS_systems}
@@ -281,6 +305,12 @@ class BubbleMove(TwoPhaseFlows):
         return self.rho2*self.Appr_Heaviside(x,eps) + self.rho1*(1.0 - self.Appr_Heaviside(x,eps))
 
 
+    """Auxiliary function to compute density on arrays of level-set values"""
+    def rho_np(self, x, eps):
+        H = CHeaviside_np(x, eps) if self.reinit_method == 'Non_Conservative_Hyperbolic' else x
+        return self.rho2*H + self.rho1*(1.0 - H)
+
+
     """Auxiliary function to compute viscosity"""
     def mu(self, x, eps):
         return self.mu2*self.Appr_Heaviside(x,eps) + self.mu1*(1.0 - self.Appr_Heaviside(x,eps))
@@ -289,13 +319,34 @@ class BubbleMove(TwoPhaseFlows):
     """Set weak formulations"""
     def set_weak_forms(self):
         try:
+            #Set the measures for the bulk and the interface terms
+            self.set_integration_measures(self.mesh, self.Param["Bulk_Quadrature_Degree"])
+
             #Set variational problem for step 1 (Level-set)
-            self.LS_weak_form(self.phi, self.l, self.phi_old, self.u_old, self.DT, self.mesh, \
-                              self.stab_method, self.switcher_parameter[self.stab_method])
+            if(self.subcycling):
+                self.LS_weak_form(self.phi, self.l, self.phi_old, self.u_LS, self.DT_LS, self.mesh, \
+                                  self.stab_method, self.switcher_parameter[self.stab_method])
+            else:
+                self.LS_weak_form(self.phi, self.l, self.phi_old, self.u_old, self.DT, self.mesh, \
+                                  self.stab_method, self.switcher_parameter[self.stab_method])
 
             #Set variational problem for reinitialization
             self.switcher_reinit_varf[self.reinit_method](*self.switcher_arguments_reinit_varf[self.reinit_method])
 
+            #Set the projectors for the normal vector and for the density output (the mass matrices are assembled only once)
+            if(self.reinit_method == 'Conservative' or self.sigma > DOLFIN_EPS):
+                self.normal_projector = Projector(grad(self.phi_curr)/mgrad(self.phi_curr), self.Q2, self.n)
+            if(self.density_output == 'Projection'):
+                self.rho_projector = Projector(self.rho(self.phi_old, self.eps), self.Q, self.rho_interp)
+
+            #Set the indicators for adaptive reinitialization
+            if(self.reinit_policy == 'Adaptive'):
+                self.Reinit_indicator_forms(self.phi_curr, self.eps, self.reinit_method)
+
+            #Set the forms of the monitored and of the benchmark quantities
+            self.set_monitor_forms()
+            self.set_benchmark_forms()
+
             #Set variational problem for step 2 (Navier-Stokes)
             if(self.NS_sol_method == 'Standard'):
                 self.NS_weak_form(self.u, self.p, self.v, self.q, self.u_old, self.DT, self.rho, self.mu, \
@@ -305,6 +356,13 @@ class BubbleMove(TwoPhaseFlows):
                                      self.phi_curr, self.phi_old, self.eps, self.n, self.Appr_Delta, g = self.g, sigma = self.sigma)
                 self.ICT_weak_form_2(self.p, self.q, self.DT, self.p_old, self.u_curr, self.rho, self.phi_curr, self.eps)
                 self.ICT_weak_form_3(self.u, self.v, self.DT, self.u_curr, self.p_curr, self.p_old, self.rho, self.phi_curr, self.eps)
+
+                #Coarser rectangles for the multigrid (built only once, the transfer operators are rebuilt with the spaces)
+                if(self.multigrid_levels > 1):
+                    if(self.coarse_meshes is None):
+                        self.coarse_meshes = rectangle_hierarchy(self.comm, self.base, self.height, self.resolution[0], \
+                                                                 self.resolution[1], self.multigrid_levels)
+                    self.set_multigrid(lambda V: box_velocity_bcs(V, mark_boundaries(V.mesh(), self.base, self.height)))
         except ValueError as e:
             if(self.rank == 0):
                 print(str(e))
@@ -312,45 +370,220 @@ class BubbleMove(TwoPhaseFlows):
             exit(1)
 
 
+    """Forms of the benchmark quantities (built once, since the level-set and the velocity are updated in place):
+       area, first moments and momentum of the bubble, perimeter of the interface and L2 norm of grad(phi)"""
+    def set_benchmark_forms(self):
+        inside = conditional(lt(self.phi_old, self.interface_level), 1.0, 0.0)
+        x = SpatialCoordinate(self.mesh)
+        dx_perimeter = self.dx_interface if self.reinit_method == 'Non_Conservative_Hyperbolic' else dx
+        self.benchmark_forms = {'Vol': Form(inside*dx), 'Xc': Form(x[0]*inside*dx), 'Yc': Form(x[1]*inside*dx), \
+                                'Uc': Form(inner(self.u_old, self.e1)*inside*dx), 'Vc': Form(inner(self.u_old, self.e2)*inside*dx), \
+                                'Pb': Form(mgrad(self.phi_old)*self.Appr_Delta(self.phi_old, self.eps)*dx_perimeter), \
+                                'L2_gradphi': Form(inner(grad(self.phi_old), grad(self.phi_old))*dx)}
+
+
     """Save the current state for post-processing and compute benchmark quantities"""
     def plot_and_volume(self):
         #Save the actual state for visualization
-        if(self.n_iter % self.save_iters == 0):
-            self.vtkfile_u << (self.u_old, self.t)
-            self.rho_interp.assign(project(self.rho(self.phi_old,self.eps), self.Q))
-            self.vtkfile_rho << (self.rho_interp, self.t)
+        if(self.output_type != 'Interface' and self.n_iter % self.save_iters == 0):
+            self.save_fields(self.t)
+        if(self.output_type != 'Full'):
+            self.save_interface(self.phi_old, self.interface_level, self.t, \
+                                self.u_old if self.interface_velocity else None, self.band_delta)
 
         #Compute benchamrk quantities
-        if(self.reinit_method == 'Conservative'):
-            Vol = assemble(conditional(lt(self.phi_old, 0.5), 1.0, 0.0)*dx)
-            Pa = 2.0*sqrt(np.pi*Vol)
-            Pb = assemble(mgrad(self.phi_old)*self.Appr_Delta(self.phi_old,self.eps)*dx)
-            Chi = Pa/Pb
-            Xc = assemble(Expression("x[0]", degree = 1)*(conditional(lt(self.phi_old, 0.5), 1.0, 0.0))*dx)/Vol
-            Yc = assemble(Expression("x[1]", degree = 1)*(conditional(lt(self.phi_old, 0.5), 1.0, 0.0))*dx)/Vol
-            Uc = assemble(inner(self.u_old,self.e1)*(conditional(lt(self.phi_old, 0.5), 1.0, 0.0))*dx)/Vol
-            Vc = assemble(inner(self.u_old,self.e2)*(conditional(lt(self.phi_old, 0.5), 1.0, 0.0))*dx)/Vol
+        if(self.geometry_diagnostics == 'Contour'):
+            geometry = self.interface_geometry(self.phi_old, self.interface_level, self.u_old)
+            Vol = geometry['area']
+            Chi = geometry['circularity']
+            (Xc, Yc) = geometry['centroid']
+            (Uc, Vc) = geometry['means']
             timeseries_vec = [self.t,Vol,Chi,Xc,Yc,Uc,Vc]
-        elif(self.reinit_method == 'Non_Conservative_Hyperbolic'):
-            Vol = assemble(conditional(lt(self.phi_old, 0.0), 1.0, 0.0)*dx)
+            if(self.reinit_method == 'Non_Conservative_Hyperbolic'):
+                L2_gradphi = sqrt(assemble(self.benchmark_forms['L2_gradphi'])/(self.base*self.height))
+                timeseries_vec.append(L2_gradphi)
+            self.save_geometry(geometry, self.t)
+        else:
+            forms = self.benchmark_forms
+            Vol = assemble(forms['Vol'])
             Pa = 2.0*sqrt(np.pi*Vol)
-            Pb = assemble(mgrad(self.phi_old)*self.Appr_Delta(self.phi_old,self.eps)*dx)
+            if(self.reinit_method == 'Non_Conservative_Hyperbolic'):
+                self.update_band(self.phi_old, self.interface_level, float(self.eps))
+            Pb = assemble(forms['Pb'])
             Chi = Pa/Pb
-            Xc = assemble(Expression("x[0]", degree = 1)*(conditional(lt(self.phi_old, 0.0), 1.0, 0.0))*dx)/Vol
-            Yc = assemble(Expression("x[1]", degree = 1)*(conditional(lt(self.phi_old, 0.0), 1.0, 0.0))*dx)/Vol
-            Uc = assemble(inner(self.u_old,self.e1)*(conditional(lt(self.phi_old, 0.0), 1.0, 0.0))*dx)/Vol
-            Vc = assemble(inner(self.u_old,self.e2)*(conditional(lt(self.phi_old, 0.0), 1.0, 0.0))*dx)/Vol
-            L2_gradphi = sqrt(assemble(inner(grad(self.phi_old),grad(self.phi_old))*dx)/(self.base*self.height))
-            timeseries_vec = [self.t,Vol,Chi,Xc,Yc,Uc,Vc,L2_gradphi]
+            Xc = assemble(forms['Xc'])/Vol
+            Yc = assemble(forms['Yc'])/Vol
+            Uc = assemble(forms['Uc'])/Vol
+            Vc = assemble(forms['Vc'])/Vol
+            timeseries_vec = [self.t,Vol,Chi,Xc,Yc,Uc,Vc]
+            if(self.reinit_method == 'Non_Conservative_Hyperbolic'):
+                L2_gradphi = sqrt(assemble(forms['L2_gradphi'])/(self.base*self.height))
+                timeseries_vec.append(L2_gradphi)
+
+        #Update the errors with respect to the reference series and append them to the record
+        if(self.reference_errors is not None):
+            self.reference_errors.update(self.t, dict(zip(['t', 'Vol', 'chi', 'Xc', 'Yc', 'Uc', 'Vc'], timeseries_vec)))
+            timeseries_vec += self.reference_errors.row(self.t)[1 :]
+
+        #Update the in-memory series for the stopping criteria
+        self.Vc_series.append(Vc)
+        self.Chi_series.append(Chi)
+        if('Kinetic_energy' in self.stop_criteria):
+            self.Ek_series.append(assemble(self.kinetic_energy_form))
 
         if(self.rank == 0):
-            np.savetxt(self.timeseries, timeseries_vec)
+            if(self.series_format == 'Text'):
+                np.savetxt(self.timeseries, timeseries_vec)
+            else:
+                np.asarray(timeseries_vec, dtype = np.float64).tofile(self.timeseries)
+
+
+    """Check the stopping criteria and return the reason (None if the simulation has to go on)"""
+    def check_stopping_criteria(self):
+        reason = None
+        if(self.max_steps > 0 and self.n_iter >= self.max_steps):
+            reason = "maximum number of steps reached"
+        if('Walls' in self.stop_criteria):
+            sides = [self.wall_side(self.phi_old, dofs, self.interface_level) for dofs in self.wall_dofs]
+            if(sides != self.wall_sides):
+                reason = "the interface reached the walls"
+        if('Kinetic_energy' in self.stop_criteria and self.plateau_reached(self.Ek_series)):
+            reason = "kinetic energy reached a plateau (E_k = " + str(self.Ek_series[-1]) + ")"
+        if('Rise_velocity' in self.stop_criteria and \
+           self.plateau_reached(self.Vc_series) and self.plateau_reached(self.Chi_series)):
+            reason = "rise velocity and circularity reached a plateau (terminal velocity = " + str(self.Vc_series[-1]) + ")"
+        if(self.reference_errors is not None and self.error_budget > 0.0):
+            for column in self.reference_errors.columns:
+                error = self.reference_errors.error(column, self.error_norm)
+                if(error > self.error_budget):
+                    reason = "error on " + column + " with respect to the reference exceeded the budget (" + \
+                             self.error_norm + " error = " + str(error) + ")"
+        return reason
+
+
+    """Decide whether the level-set has to be reinitialized and return the reason (None if it is not needed)"""
+    def reinit_reason(self):
+        if(self.reinit_policy == 'Adaptive'):
+            return self.check_reinit_need(self.reinit_method, self.eps, self.tol_reinit_gradphi, \
+                                          self.tol_reinit_thickness, self.tol_reinit_volume)
+        if(self.n_LS_iter % self.reinit_iters == 0):
+            return "fixed frequency"
+        return None
+
+
+    """Solve the reinitialization step for the level-set"""
+    def solve_reinit(self, reason):
+        try:
+            begin(int(LogLevel.INFO) + 1,"Solving reinitialization (" + reason + ")")
+            if(self.reinit_method == 'Conservative'):
+                self.normal_projector.project() #Compute current normal vector
+                self.mark_changed(self.n)
+            self.switcher_reinit_solve[self.reinit_method](*self.switcher_arguments_reinit_solve[self.reinit_method])
+            if(self.reinit_policy == 'Adaptive'):
+                self.reset_reinit_indicators()
+            end()
+            self.n_reinit += 1
+        except Exception as e:
+            if(self.rank == 0):
+                print(str(e))
+                print("Aborting simulation...")
+            exit(1)
 
 
-    """Execute simulation"""
-    def run(self):
+    """Solve the Navier-Stokes part"""
+    def solve_NS(self):
+        #Restrict the surface tension term to the band where the approximate Dirac's delta does not vanish
+        #(with the conservative method the delta is replaced by 1, so the term is integrated over the whole domain)
+        if(self.reinit_method == 'Non_Conservative_Hyperbolic' and self.sigma > DOLFIN_EPS):
+            self.update_band(self.phi_curr, self.interface_level, float(self.eps))
+        self.switcher_NS_solve[self.NS_sol_method](*self.switcher_arguments_NS_solve[self.NS_sol_method])
+        if(self.NS_sol_method == 'Standard'):
+            self.assigner_NS.assign([self.u_curr, self.p_curr], self.w_curr)
+            self.mark_changed(self.u_curr, self.p_curr)
+
+
+    """Advance the coupled problem by one time-step"""
+    def time_step(self):
+        #Solve level-set
+        begin(int(LogLevel.INFO) + 1,"Solving Level-set")
+        self.solve_Levelset_system(self.phi_curr)
+        end()
+        self.n_LS_iter += 1
+
+        #Solve Level-set reinit
+        reason = self.reinit_reason()
+        if(reason is not None):
+            self.solve_reinit(reason)
+        if(self.sigma > DOLFIN_EPS):
+            self.normal_projector.project() #Compute normal vector
+            self.mark_changed(self.n)
+
+        #Solve Navier-Stokes
+        begin(int(LogLevel.INFO) + 1,"Solving Navier-Stokes")
+        self.solve_NS()
+        end()
+
+        #Prepare to next step assign previous-step solution (velocity and pressure are overwritten
+        #by the next solution, so their vectors can be swapped instead of copied)
+        self.swap_solutions(self.u_old, self.u_curr)
+        self.swap_solutions(self.p_old, self.p_curr)
+        self.phi_old.assign(self.phi_curr)
+        self.mark_changed(self.phi_old)
+
+
+    """Advance the coupled problem by one macro time-step using sub-cycling. With several Navier-Stokes sub-steps
+       these are solved first with the density frozen at the level-set of the beginning of the macro step, and then the
+       level-set sub-steps employ the velocity interpolated in time. With a single Navier-Stokes step the order of
+       'time_step' is kept: the level-set sub-steps employ the velocity of the beginning of the step and Navier-Stokes
+       employs the new level-set (so without level-set sub-steps the scheme is the one of 'time_step')"""
+    def time_step_subcycled(self):
+        if(self.NS_subcycles == 1):
+            #Advance the level-set first (the velocity is the one of the beginning of the step)
+            self.u_start.assign(self.u_old)
+            self.phi_start.assign(self.phi_old)
+            self.mark_changed(self.u_start)
+            self.advance_levelset_subcycled(self.u_start)
+
+            #Navier-Stokes employs the level-set at the beginning and at the end of the step, as in 'time_step'
+            self.phi_old.assign(self.phi_start)
+            self.mark_changed(self.phi_old)
+            if(self.sigma > DOLFIN_EPS):
+                self.normal_projector.project() #Compute normal vector
+                self.mark_changed(self.n)
+            begin(int(LogLevel.INFO) + 1,"Solving Navier-Stokes")
+            self.solve_NS()
+            end()
+            self.swap_solutions(self.u_old, self.u_curr)
+            self.swap_solutions(self.p_old, self.p_curr)
+            self.phi_old.assign(self.phi_curr)
+            self.mark_changed(self.phi_old)
+            return
+
+        #Advance Navier-Stokes keeping the interface frozen at the beginning of the macro step
+        self.u_start.assign(self.u_old)
+        self.phi_curr.assign(self.phi_old)
+        self.mark_changed(self.u_start, self.phi_curr)
+        if(self.sigma > DOLFIN_EPS):
+            self.normal_projector.project() #Compute normal vector
+            self.mark_changed(self.n)
+        for k in range(self.NS_subcycles):
+            begin(int(LogLevel.INFO) + 1,"Solving Navier-Stokes (sub-step " + str(k + 1) + ")")
+            self.solve_NS()
+            end()
+            self.u_old.assign(self.u_curr)
+            self.p_old.assign(self.p_curr)
+            self.mark_changed(self.u_old, self.p_old)
+
+        #Advance the level-set with a velocity interpolated in time between the beginning and the end of the macro step
+        self.advance_levelset_subcycled(self.u_curr)
+
+
+    """Prepare the simulation up to the initial state (mesh and spaces can be shared with another simulation)"""
+    def setup(self, mesh = None, spaces = None):
+        self.t_setup = time.perf_counter()
+
         #Build the mesh
-        self.build_mesh()
+        self.build_mesh(mesh, spaces)
 
         #Set the initial condition
         self.set_initial_condition()
@@ -361,73 +594,157 @@ class BubbleMove(TwoPhaseFlows):
         #Set weak formulations
         self.set_weak_forms()
 
+        #Compile the weak forms (or load them from the cache)
+        self.compile_forms()
+
+        #Repartition the mesh according to the initial position of the interface
+        if(self.partitioning == 'Interface_Weighted'):
+            self.repartition()
+
+        #Set the reference volume for adaptive reinitialization
+        if(self.reinit_policy == 'Adaptive'):
+            self.phi_curr.assign(self.phi_old)
+            self.reset_reinit_indicators()
+
+        #Set the monitor for the interface reaching the walls
+        if('Walls' in self.stop_criteria):
+            self.set_wall_monitor(self.phi_old, self.interface_level, self.height)
+
         #Time-stepping loop parameters
         self.t = 0.0
         self.n_iter = 0
+        self.n_LS_iter = 0
+        self.n_reinit = 0
+        self.stop_reason = None
         self.save_iters = self.Param["Saving_Frequency"]
-        reinit_iters = self.Param["Reinitialization_Frequency"]
+        self.reinit_iters = self.Param["Reinitialization_Frequency"]
 
         #File for plotting
-        self.vtkfile_u = File(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/u.pvd')
-        self.vtkfile_rho = File(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/rho.pvd')
-
-        #File for benchamrk comparisons
-        self.timeseries = open(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/benchmark_series.dat','wb')
+        if(self.output_type != 'Interface'):
+            self.field_writer = FieldWriter(os.getcwd() + '/' + self.Param["Saving_Directory"], self.comm, self.output_backend, \
+                                            self.output_fields, self.Param["Output_Compression"], self.Param["Output_Single_Precision"])
+
+        #Stream for the compact output of the interface (the velocity is saved in the band where the interface is smeared)
+        if(self.output_type != 'Full'):
+            self.interface_writer = InterfaceWriter(os.getcwd() + '/' + self.Param["Saving_Directory"], self.mesh.mpi_comm())
+            self.band_delta = 0.49 if self.reinit_method == 'Conservative' else float(self.eps)
+
+        #File for benchamrk comparisons (the names of its columns are saved apart, since they depend on the reinitialization
+        #and on the reference series, whose errors in time follow the benchmark quantities in each record)
+        self.timeseries = open(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/' + self.series_file,'wb')
+        if(self.rank == 0):
+            columns = ['t', 'Vol', 'chi', 'Xc', 'Yc', 'Uc', 'Vc'] + \
+                      (['L2_grad_phi'] if self.reinit_method == 'Non_Conservative_Hyperbolic' else []) + \
+                      (self.reference_errors.header()[1 :] if self.reference_errors is not None else [])
+            with open(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/benchmark_columns.dat', 'w') as f:
+                f.write(" ".join(columns) + "\n")
+
+        #Frames of the animation rendered during the run
+        if(self.render_iters > 0):
+            self.set_frame_renderer(os.getcwd() + '/' + self.Param["Saving_Directory"])
+
+        #File for the geometry of the extracted interface
+        if(self.geometry_diagnostics == 'Contour'):
+            self.geometry_file = os.getcwd() + '/' + self.Param["Saving_Directory"] + '/geometry_series.dat'
+            if(self.rank == 0):
+                open(self.geometry_file, 'w').close()
 
         #Save initial state and start loop
         self.plot_and_volume()
         self.timeseries.close() #Close for safety in case some system fails to reach convergence
-        self.t += self.dt
-        while self.t <= self.t_end:
-            begin(int(LogLevel.INFO) + 1,"t = " + str(self.t) + " s")
-            self.n_iter += 1
-
-            #Solve level-set
-            begin(int(LogLevel.INFO) + 1,"Solving Level-set")
-            self.solve_Levelset_system(self.phi_curr)
-            end()
+        if(self.render_iters > 0):
+            self.render_frame(self.t)
+        self.t += self.dt_macro
+        self.t_loop = time.perf_counter()
+        self.t_setup = self.t_loop - self.t_setup
+        if(self.rank == 0):
+            print("Startup time (mesh, compilation of the forms and initial state): " + "{:.3f}".format(self.t_setup) + " s")
+            print("Mesh setup time: " + "{:.3f}".format(self.t_mesh) + " s" + (" (loaded from the cache)" if self.mesh_loaded else ""))
 
-            #Solve Level-set reinit
-            if(self.n_iter % reinit_iters == 0):
-                try:
-                    begin(int(LogLevel.INFO) + 1,"Solving reinitialization")
-                    if(self.reinit_method == 'Conservative'):
-                        self.n.assign(project(grad(self.phi_curr)/mgrad(self.phi_curr), self.Q2)) #Compute current normal vector
-                    self.switcher_reinit_solve[self.reinit_method](*self.switcher_arguments_reinit_solve[self.reinit_method])
-                    end()
-                except Exception as e:
-                    if(self.rank == 0):
-                        print(str(e))
-                        print("Aborting simulation...")
-                    exit(1)
-            if(self.sigma > DOLFIN_EPS):
-                self.n.assign(project(grad(self.phi_curr)/mgrad(self.phi_curr), self.Q2)) #Compute normal vector
 
-            #Solve Navier-Stokes
-            begin(int(LogLevel.INFO) + 1,"Solving Navier-Stokes")
-            self.switcher_NS_solve[self.NS_sol_method](*self.switcher_arguments_NS_solve[self.NS_sol_method])
-            if(self.NS_sol_method == 'Standard'):
-                (self.u_curr, self.p_curr) = self.w_curr.split(True)
-            end()
+    """Check if the simulation is over (final time reached or stopping criterion met)"""
+    def finished(self):
+        return self.stop_reason is not None or self.t > self.t_end
 
-            #Prepare to next step assign previous-step solution
-            self.u_old.assign(self.u_curr)
-            self.p_old.assign(self.p_curr)
-            self.phi_old.assign(self.phi_curr)
 
-            #Save and compute benchmark quantities
-            begin(int(LogLevel.INFO) + 1,"Computing benchmark quantities")
-            self.timeseries = open(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/benchmark_series.dat','ab')
-            self.plot_and_volume()
-            self.timeseries.close() #Close for safety in case some system fails to reach convergence
-            end()
+    """Perform one (macro) time-step"""
+    def advance(self):
+        begin(int(LogLevel.INFO) + 1,"t = " + str(self.t) + " s")
+        self.n_iter += 1
 
-            end()
+        #Advance level-set and Navier-Stokes
+        if(self.subcycling):
+            self.time_step_subcycled()
+        else:
+            self.time_step()
 
-            self.t = self.t + self.dt if self.t + self.dt <= self.t_end or abs(self.t - self.t_end) < DOLFIN_EPS else self.t_end
+        #Save and compute benchmark quantities
+        begin(int(LogLevel.INFO) + 1,"Computing benchmark quantities")
+        self.timeseries = open(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/' + self.series_file,'ab')
+        self.plot_and_volume()
+        self.timeseries.close() #Close for safety in case some system fails to reach convergence
+        end()
+        if(self.render_iters > 0 and self.n_iter % self.render_iters == 0):
+            self.render_frame(self.t)
+
+        end()
+
+        #Check that no memory has been allocated by the time-step
+        self.check_allocations()
+
+        #Move to the fine mesh at the end of the coarse phase of the continuation
+        if(self.continuation and self.continuation_reached(self.t, self.u_old)):
+            self.refine_continuation()
+
+        #Rebalance the partition following the interface
+        if(self.partitioning == 'Interface_Weighted' and self.repartition_iters > 0 and self.n_iter % self.repartition_iters == 0):
+            self.repartition()
+
+        #Check the stopping criteria
+        self.stop_reason = self.check_stopping_criteria()
+        if(self.stop_reason is not None):
+            if(self.rank == 0):
+                print("Stopping simulation at t = " + str(self.t) + " s: " + self.stop_reason)
+            return
+
+        self.t = self.t + self.dt_macro if self.t + self.dt_macro <= self.t_end or abs(self.t - self.t_end) < DOLFIN_EPS else self.t_end
+
+
+    """Save the final state and write the reports"""
+    def finalize(self):
+        self.t_loop = time.perf_counter() - self.t_loop
 
         #Save the final state
-        if(self.n_iter % self.save_iters != 0):
-            self.vtkfile_u << (self.u_old, self.t_end)
-            self.rho_interp.assign(project(self.rho(self.phi_old,self.eps), self.Q))
-            self.vtkfile_rho << (self.rho_interp, self.t_end)
+        if(self.output_type != 'Interface' and self.n_iter % self.save_iters != 0):
+            t_final = self.t if self.stop_reason is not None else self.t_end
+            self.save_fields(t_final)
+
+        if(self.output_type != 'Interface'):
+            self.field_writer.close()
+
+        if(self.render_iters > 0):
+            self.frame_renderer.close()
+
+        #Report the reinitialization statistics
+        if(self.rank == 0):
+            print("Reinitialization performed " + str(self.n_reinit) + " times over " + str(self.n_LS_iter) + " level-set steps")
+
+        #Report the reuse of the assembled matrices
+        if(self.assembly_cache.enabled and self.rank == 0):
+            print("Assembly cache:\n" + self.assembly_cache.report())
+
+        #Write the profiling report
+        if(self.profiling):
+            spaces = {'V': self.V, 'P': self.P, 'Q': self.Q}
+            if(self.NS_sol_method == 'Standard'):
+                spaces['W'] = self.W
+            self.write_profile(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/profile_rank' + str(self.rank) + '.json', \
+                               spaces, self.t_setup, self.t_loop, self.n_iter)
+
+
+    """Execute simulation"""
+    def run(self):
+        self.setup()
+        while not self.finished():
+            self.advance()
+        self.finalize()
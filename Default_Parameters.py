@@ -0,0 +1,74 @@
+"""Default values of the numerical parameters (they are more related to the numeric part rather than physics,
+   so they can be omitted in the configuration file). The values are kept in a module which does not depend on DOLFIN,
+   so that they are shared by 'My_Parameters' and by the pre-flight checks in 'Preflight.py'"""
+DEFAULT_PARAMETERS = [
+    ("Polynomial_degree", 1),
+    ("Number_vertices_x", 80),
+    ("Number_vertices_y", 160),
+    ("Log_Level", 21), #more than INFO level by default
+    ("Reinit_Type", 'Non_Conservative_Hyperbolic'),
+    ("Stabilization_Type", 'SUPG'),
+    ("NS_Procedure", 'ICT'),
+    ("Interface_Thickness", 0.025),
+    ("Stabilization_Parameter", 0.01),
+    ("Reference_Dimensionalization", 'Dimensional'),
+    ("Settings_Type", 'Physical'),
+    ("Maximum_subiters_recon", 10),
+    ("Tolerance_recon", 1.0e-4),
+    ("Saving_Frequency", 50),
+    ("Reinitialization_Frequency", 1),
+    ("Saving_Directory", 'Sim'),
+    ("Interface_Perturbation_RT", 'Cos'),
+    ("Problem", 'Bubble'),
+    ("Levelset_Subcycles", 1),
+    ("NS_Subcycles", 1),
+    ("Levelset_Solver", 'Implicit'),
+    ("Levelset_CFL", 0.1),
+    ("Reinit_Policy", 'Fixed'),
+    ("Reinit_Tolerance_gradphi", 0.1),
+    ("Reinit_Tolerance_thickness", 0.2),
+    ("Reinit_Tolerance_volume", 1.0e-3),
+    ("Stopping_Criteria", 'None'),
+    ("Stopping_Window", 100),
+    ("Stopping_Tolerance", 1.0e-3),
+    ("Maximum_steps", 0),
+    ("Geometry_Diagnostics", 'Integral'),
+    ("Output_Type", 'Full'),
+    ("Interface_Velocity", False),
+    ("Output_Backend", 'VTK'),
+    ("Output_Fields", 'u,rho'),
+    ("Density_Output", 'Nodal'),
+    ("Output_Compression", False),
+    ("Output_Single_Precision", False),
+    ("Series_Format", 'Text'),
+    ("Reference_Series", 'None'),
+    ("Reference_Error_Budget", 0.0),
+    ("Reference_Error_Norm", 'L2'),
+    ("Profiling", False),
+    ("Debug_Allocations", False),
+    ("Assembly_Cache", False),
+    ("Solver_Tuning", 'Off'),
+    ("Solver_Tuning_Cache", 'solver_tuning.json'),
+    ("Multigrid_Levels", 1),
+    ("Bulk_Quadrature_Degree", 0),
+    ("Mesh_Cache_Directory", 'None'),
+    ("Continuation_Coarsening", 1),
+    ("Continuation_Time", 0.0),
+    ("Continuation_Velocity", 0.0),
+    ("Render_Frequency", 0),
+    ("Render_Field", 'phi'),
+    ("Partitioning_Type", 'Default'),
+    ("Repartition_Frequency", 0),
+    ("Partition_Interface_Weight", 4.0),
+    ("JIT_Cache_Directory", 'Default'),
+    ("Ensemble_Atwood_numbers", 'None'),
+    ("Ensemble_Reynolds_numbers", 'None')
+]
+
+
+"""Convert the text of a value in the configuration file to the type of its default value
+   (boolean values need a special treatment since bool('False') is True)"""
+def convert_value(default, text):
+    if(isinstance(default, bool)):
+        return text.strip() in {'True', 'true', 'Yes', 'yes', '1'}
+    return type(default)(text)
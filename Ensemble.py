@@ -0,0 +1,69 @@
+from Rayleigh_Taylor import *
+
+"""This class runs an ensemble of Rayleigh-Taylor simulations which differ only for the Atwood number
+   and the Reynolds number. The mesh and the function spaces are built once and shared, while the physical
+   parameters enter the weak forms as constants, so all the cases employ the same compiled forms.
+   The cases are advanced in an interleaved way in the same process (DOLFIN is not thread-safe)"""
+class RayleighTaylorEnsemble:
+    """Class constructor"""
+    def __init__(self, config_file):
+        #Read the values for the sweep
+        Param = My_Parameters(config_file).get_param()
+        self.comm = MPI.comm_world
+        self.rank = MPI.rank(self.comm)
+        check_options(Param, 'RT') #The lists of the ensemble are checked too (the warnings are issued by the cases)
+        Atwood_numbers   = self.read_values(Param["Ensemble_Atwood_numbers"])
+        Reynolds_numbers = self.read_values(Param["Ensemble_Reynolds_numbers"])
+        if(Atwood_numbers is None):
+            raise ValueError("No Atwood number specified for the ensemble")
+        if(Reynolds_numbers is None):
+            Reynolds_numbers = [float(Param["Reynolds_number"])]
+        if(len(Reynolds_numbers) == 1):
+            Reynolds_numbers = Reynolds_numbers*len(Atwood_numbers)
+
+        #Build a problem for each case, each one with its own saving directory
+        self.cases = []
+        for (k, (At, Re)) in enumerate(zip(Atwood_numbers, Reynolds_numbers)):
+            case_param = My_Parameters(config_file).get_param()
+            case_param["Settings_Type"] = 'Parameters'
+            for (key, value) in (("Atwood_number", At), ("Reynolds_number", Re)):
+                if(key in case_param.keys()):
+                    case_param[key] = str(value)
+                else:
+                    case_param.add(key, str(value))
+            case_param["Saving_Directory"] = case_param["Saving_Directory"] + '/case_' + str(k)
+            self.cases.append(RayleighTaylor(case_param))
+
+
+    """Read a comma separated list of values ('None' if not specified)"""
+    @staticmethod
+    def read_values(values):
+        if(values == 'None'):
+            return None
+        return [float(value) for value in values.split(',')]
+
+
+    """Return the communicator"""
+    def get_communicator(self):
+        return self.comm
+
+
+    """Execute the simulations"""
+    def run(self):
+        #The first case builds the mesh and the spaces, the others reuse them
+        self.cases[0].setup()
+        for case in self.cases[1:]:
+            case.setup(self.cases[0].mesh, self.cases[0].get_spaces())
+
+        #Advance the cases which are still running one step at a time
+        active = [case for case in self.cases if not case.finished()]
+        while active:
+            for case in active:
+                case.advance()
+            active = [case for case in active if not case.finished()]
+
+        #Save the final states and write the reports
+        for (k, case) in enumerate(self.cases):
+            if(self.rank == 0):
+                print("Case " + str(k) + " (At = " + str(case.At) + ", Re = " + str(case.Re) + "):")
+            case.finalize()
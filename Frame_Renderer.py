@@ -0,0 +1,110 @@
+import numpy as np
+import os
+import queue
+import threading
+import warnings
+
+#matplotlib is optional and employed only to render the frames (with the Agg canvas, so no display is needed)
+try:
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+except ImportError:
+    Figure = None
+
+"""Indices in the flattened (ny + 1) x (nx + 1) grid of the vertices of the structured mesh of the rectangle"""
+def grid_indices(coords, base, height, nx, ny):
+    coords = np.asarray(coords, dtype = float)
+    i = np.clip(np.rint(coords[:, 0]/base*nx).astype(int), 0, nx)
+    j = np.clip(np.rint(coords[:, 1]/height*ny).astype(int), 0, ny)
+    return j*(nx + 1) + i
+
+
+"""Rasterize the vertex values of the local part of the mesh and gather them on the first process, which returns
+   the (ny + 1) x (nx + 1) image (the other processes return None). The vertices of the structured mesh coincide
+   with the pixels, so no interpolation is needed and the shared vertices simply write the same value twice"""
+def rasterize_vertices(coords, values, base, height, nx, ny, comm):
+    idx = grid_indices(coords, base, height, nx, ny)
+    all_idx = comm.gather(idx, root = 0)
+    all_values = comm.gather(np.asarray(values, dtype = np.float64), root = 0)
+    if(comm.Get_rank() != 0):
+        return None
+    image = np.full((ny + 1)*(nx + 1), np.nan)
+    image[np.concatenate(all_idx)] = np.concatenate(all_values)
+    return image.reshape(ny + 1, nx + 1)
+
+
+"""In-situ rendering of PNG frames of a scalar field ('frames/frame_XXXXXX.png' in the saving directory) with the
+   iso-contour of the interface: the field is gathered on the first process, which draws and saves the frames
+   on a background thread, so the time loop waits only if more than 'max_pending' frames are still to be written"""
+class FrameRenderer:
+    def __init__(self, directory, comm, level, label, max_pending = 4, dpi = 100):
+        self.comm = comm
+        self.rank = comm.Get_rank()
+        self.level = level
+        self.label = label
+        self.dpi = dpi
+        self.directory = directory + '/frames'
+        self.n_frames = 0
+        self.enabled = Figure is not None
+        self.queue = None
+        self.worker = None
+
+        if(not self.enabled):
+            if(self.rank == 0):
+                warnings.warn("matplotlib not available: the frames will not be rendered")
+            return
+
+        #Create the directory and start the thread which writes the frames
+        if(self.rank == 0):
+            os.makedirs(self.directory, exist_ok = True)
+            self.queue = queue.Queue(maxsize = max_pending)
+            self.worker = threading.Thread(target = self.work, daemon = True)
+            self.worker.start()
+
+
+    """Gather the vertex values and queue the frame at time t (collective call)"""
+    def render(self, t, coords, values, base, height, nx, ny):
+        if(not self.enabled):
+            return
+        image = rasterize_vertices(coords, values, base, height, nx, ny, self.comm)
+        if(self.rank == 0):
+            self.queue.put((self.n_frames, t, image, (0.0, base, 0.0, height)))
+        self.n_frames += 1
+
+
+    """Draw and save the queued frames until the sentinel None is found"""
+    def work(self):
+        while True:
+            item = self.queue.get()
+            if(item is None):
+                break
+            (k, t, image, extent) = item
+            try:
+                self.draw(k, t, image, extent)
+            except Exception as e:
+                warnings.warn("Frame " + str(k) + " not rendered: " + str(e))
+
+
+    """Draw a frame (field and interface contour) and save it as PNG"""
+    def draw(self, k, t, image, extent):
+        (width, height) = (extent[1] - extent[0], extent[3] - extent[2])
+        fig = Figure(figsize = (6.0*width/max(width, height) + 1.5, 6.0*height/max(width, height) + 0.5))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        im = ax.imshow(image, origin = 'lower', extent = extent, cmap = 'viridis', interpolation = 'bilinear')
+        x = np.linspace(extent[0], extent[1], image.shape[1])
+        y = np.linspace(extent[2], extent[3], image.shape[0])
+        if(self.level is not None and np.nanmin(image) < self.level < np.nanmax(image)):
+            ax.contour(x, y, image, levels = [self.level], colors = 'white', linewidths = 1.0)
+        fig.colorbar(im, ax = ax, label = self.label)
+        ax.set_title("t = " + "{:.4f}".format(t))
+        ax.set_aspect('equal')
+        fig.savefig(self.directory + '/frame_%06d.png' % k, dpi = self.dpi)
+
+
+    """Wait until all the queued frames have been written and stop the thread"""
+    def close(self):
+        if(self.worker is not None):
+            self.queue.put(None)
+            self.worker.join()
+            self.worker = None
@@ -0,0 +1,95 @@
+import numpy as np
+
+"""Extraction of the interface as the iso-contour of the level-set by marching triangles: the level-set is
+   considered linear on each cell (vertex values), so the contour is a polygonal line with one segment for each
+   cut cell. All the operations are vectorized over the cells and DOLFIN is not needed (only arrays are employed)"""
+
+"""Compute the geometry of the region where f < level and of its boundary for the given cells.
+   coords --- coordinates of the vertices (n_vertices x 2)
+   cells  --- vertices of the cells (n_cells x 3)
+   f      --- values at the vertices
+   fields --- optional values at the vertices (n_vertices x m) to be integrated over the region
+   Return a dictionary with area, perimeter, first moments, integrals of the fields, bounding box of the contour
+   and the segments of the contour"""
+def extract_interface(coords, cells, f, level, fields = None):
+    coords = np.asarray(coords, dtype = float)
+    cells = np.asarray(cells, dtype = int)
+    f = np.asarray(f, dtype = float) - level
+
+    #Linear quantities to be integrated: the coordinates (for the centroid) and the optional fields
+    values = coords if fields is None else np.hstack([coords, np.asarray(fields, dtype = float).reshape(len(coords), -1)])
+    X = coords[cells]
+    G = values[cells]
+    F = f[cells]
+    inside = F < 0.0
+    n_inside = np.sum(inside, axis = 1)
+
+    #Area of the cells
+    A = 0.5*np.abs((X[:, 1, 0] - X[:, 0, 0])*(X[:, 2, 1] - X[:, 0, 1]) - (X[:, 2, 0] - X[:, 0, 0])*(X[:, 1, 1] - X[:, 0, 1]))
+
+    #Cells completely inside
+    full = n_inside == 3
+    area = np.sum(A[full])
+    integrals = np.sum(A[full, None]*np.mean(G[full], axis = 1), axis = 0)
+
+    #Cut cells: the lonely vertex is the one on the other side with respect to the other two
+    cut = np.logical_or(n_inside == 1, n_inside == 2)
+    idx = np.nonzero(cut)[0]
+    lonely = np.where(n_inside[idx] == 1, np.argmax(inside[idx], axis = 1), np.argmin(inside[idx], axis = 1))
+    j1 = (lonely + 1) % 3
+    j2 = (lonely + 2) % 3
+    f0 = F[idx, lonely]
+    t1 = f0/(f0 - F[idx, j1])
+    t2 = f0/(f0 - F[idx, j2])
+
+    #Points of the contour on the two cut edges and corner triangle around the lonely vertex
+    x0 = X[idx, lonely]
+    p1 = x0 + t1[:, None]*(X[idx, j1] - x0)
+    p2 = x0 + t2[:, None]*(X[idx, j2] - x0)
+    g0 = G[idx, lonely]
+    g1 = g0 + t1[:, None]*(G[idx, j1] - g0)
+    g2 = g0 + t2[:, None]*(G[idx, j2] - g0)
+    A_corner = A[idx]*t1*t2
+    I_corner = A_corner[:, None]*(g0 + g1 + g2)/3.0
+
+    #The corner is the inside part if the lonely vertex is inside, otherwise the inside part is its complement
+    lonely_inside = n_inside[idx] == 1
+    I_cells = A[idx, None]*np.mean(G[idx], axis = 1)
+    area += np.sum(np.where(lonely_inside, A_corner, A[idx] - A_corner))
+    integrals += np.sum(np.where(lonely_inside[:, None], I_corner, I_cells - I_corner), axis = 0)
+
+    #Perimeter and bounding box of the contour
+    segments = np.stack([p1, p2], axis = 1)
+    perimeter = np.sum(np.linalg.norm(p2 - p1, axis = 1))
+    if(len(idx) > 0):
+        points = segments.reshape(-1, 2)
+        bbox = np.array([np.min(points[:, 0]), np.max(points[:, 0]), np.min(points[:, 1]), np.max(points[:, 1])])
+    else:
+        bbox = np.array([np.inf, -np.inf, np.inf, -np.inf])
+
+    return {'area': area, 'perimeter': perimeter, 'moments': integrals[:2], 'integrals': integrals[2:], \
+            'bbox': bbox, 'segments': segments}
+
+
+"""Combine the partial geometries computed by several processes (each one on its own owned cells)"""
+def combine_geometries(partials):
+    area = sum(p['area'] for p in partials)
+    perimeter = sum(p['perimeter'] for p in partials)
+    moments = sum(p['moments'] for p in partials)
+    integrals = sum(p['integrals'] for p in partials)
+    bboxes = np.array([p['bbox'] for p in partials])
+    bbox = np.array([np.min(bboxes[:, 0]), np.max(bboxes[:, 1]), np.min(bboxes[:, 2]), np.max(bboxes[:, 3])])
+    return {'area': area, 'perimeter': perimeter, 'moments': moments, 'integrals': integrals, 'bbox': bbox}
+
+
+"""Derived quantities: circularity, centroid, mean values of the fields over the region and,
+   for the Rayleigh-Taylor instability, positions of the bubble tip (highest point) and of the spike tip (lowest point)"""
+def geometry_summary(geometry):
+    area = geometry['area']
+    perimeter = geometry['perimeter']
+    summary = {'area': area, 'perimeter': perimeter, \
+               'circularity': 2.0*np.sqrt(np.pi*area)/perimeter if perimeter > 0.0 else 0.0, \
+               'centroid': geometry['moments']/area if area > 0.0 else np.full(2, np.nan), \
+               'means': geometry['integrals']/area if area > 0.0 else np.full(len(geometry['integrals']), np.nan), \
+               'bbox': geometry['bbox'], 'bubble_tip': geometry['bbox'][3], 'spike_tip': geometry['bbox'][2]}
+    return summary
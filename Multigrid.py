@@ -0,0 +1,117 @@
+from dolfin import *
+import ufl
+
+#petsc4py is needed only to set up the multigrid preconditioner
+try:
+    from petsc4py import PETSc
+except ImportError:
+    PETSc = None
+
+"""Nested hierarchy of rectangle meshes for the geometric multigrid: the number of cells is halved in both directions
+   at each level (the coarsest mesh comes first and the fine mesh is not included)"""
+def rectangle_hierarchy(comm, base, height, nx, ny, n_levels):
+    factor = 2**(n_levels - 1)
+    if(nx % factor != 0 or ny % factor != 0):
+        raise ValueError("The number of cells in each direction must be divisible by 2^(Multigrid_Levels - 1)")
+    return [RectangleMesh(comm, Point(0.0, 0.0), Point(base, height), nx//2**k, ny//2**k) for k in range(n_levels - 1, 0, -1)]
+
+
+"""Rediscretize a bilinear form on a coarser mesh: the arguments are replaced by the ones of the coarse space,
+   the functions by their coarse counterparts (given in the mapping) and the integration domain by the coarse mesh"""
+def coarse_form(form, space, mapping):
+    (test, trial) = form.arguments()
+    mapping = dict(mapping)
+    mapping[test] = TestFunction(space)
+    mapping[trial] = TrialFunction(space)
+    form = ufl.replace(form, mapping)
+    domain = space.mesh().ufl_domain()
+    return ufl.Form([integral.reconstruct(domain = domain) for integral in form.integrals()])
+
+
+"""Krylov solver preconditioned by a geometric multigrid V-cycle on a nested hierarchy of meshes.
+   The transfer operators between consecutive levels are computed once, while the coarse operators
+   are rediscretized each time the operator is set, with the current coefficients (e.g. the level-set for the density)
+   interpolated on the coarse meshes. The smoothers are Chebyshev iterations preconditioned by Jacobi and the coarsest
+   level is solved directly. It has the same interface of the DOLFIN solvers ('set_operator' and 'solve'),
+   and it can be further configured through the PETSc options with the given prefix"""
+class MultigridSolver:
+    def __init__(self, form, space, coarse_meshes, bcs = None, method = 'gmres', singular = False, prefix = 'mg_'):
+        if(PETSc is None):
+            raise ValueError("petsc4py is needed for the multigrid preconditioner")
+
+        #Build the coarse levels: space, coarse copies of the functions in the form, rediscretized form and boundary conditions
+        functions = [f for f in form.coefficients() if isinstance(f, Function)]
+        self.levels = []
+        for mesh in coarse_meshes:
+            V = FunctionSpace(mesh, space.ufl_element())
+            pairs = [(f, Function(FunctionSpace(mesh, f.function_space().ufl_element()))) for f in functions]
+            self.levels.append({'space': V, 'functions': pairs, 'form': coarse_form(form, V, pairs), \
+                                'matrix': PETScMatrix(), 'bcs': bcs(V) if bcs is not None else []})
+
+        #Interpolation operators between consecutive levels (the restriction is their transpose)
+        spaces = [level['space'] for level in self.levels] + [space]
+        self.transfers = [PETScDMCollection.create_transfer_matrix(spaces[k], spaces[k + 1]) for k in range(len(self.levels))]
+
+        #Basis of the constants for the singular systems (pure Neumann problems), one for each level
+        self.nullspaces = None
+        if(singular):
+            self.nullspaces = []
+            for V in spaces:
+                c = Function(V).vector()
+                c[:] = 1.0
+                c *= 1.0/c.norm("l2")
+                self.nullspaces.append(VectorSpaceBasis([c]))
+
+        #Set up the Krylov solver with the multigrid preconditioner
+        self.ksp = PETSc.KSP().create(space.mesh().mpi_comm())
+        self.ksp.setOptionsPrefix(prefix)
+        self.ksp.setType(method)
+        pc = self.ksp.getPC()
+        pc.setType('mg')
+        pc.setMGLevels(len(spaces))
+        pc.setMGType(PETSc.PC.MGType.MULTIPLICATIVE)
+        pc.setMGCycleType(PETSc.PC.MGCycleType.V)
+        for (k, P) in enumerate(self.transfers):
+            pc.setMGInterpolation(k + 1, P.mat())
+        for k in range(1, len(spaces)):
+            smoother = pc.getMGSmoother(k)
+            smoother.setType('chebyshev')
+            smoother.getPC().setType('jacobi')
+        options = PETSc.Options()
+        options[prefix + "mg_coarse_ksp_type"] = "preonly"
+        options[prefix + "mg_coarse_pc_type"] = "lu"
+        if(MPI.size(space.mesh().mpi_comm()) > 1):
+            options[prefix + "mg_coarse_pc_factor_mat_solver_type"] = "mumps"
+        if(singular):
+            options[prefix + "mg_coarse_pc_factor_shift_type"] = "nonzero"
+        self.ksp.setFromOptions()
+        self.pc = pc
+
+
+    """Set the fine operator and rediscretize the coarse ones"""
+    def set_operator(self, A):
+        A = as_backend_type(A)
+        if(self.nullspaces is not None):
+            A.set_nullspace(self.nullspaces[-1])
+        for (k, level) in enumerate(self.levels):
+            for (f, f_coarse) in level['functions']:
+                LagrangeInterpolator.interpolate(f_coarse, f)
+            assemble(level['form'], tensor = level['matrix'])
+            for bc in level['bcs']:
+                bc.apply(level['matrix'])
+            if(self.nullspaces is not None):
+                level['matrix'].set_nullspace(self.nullspaces[k])
+            self.pc.getMGSmoother(k).setOperators(level['matrix'].mat())
+        self.ksp.setOperators(A.mat())
+
+
+    """Solve the system (the right-hand side of a singular system is made consistent)"""
+    def solve(self, x, b):
+        if(self.nullspaces is not None):
+            self.nullspaces[-1].orthogonalize(b)
+        x = as_backend_type(x)
+        self.ksp.solve(as_backend_type(b).vec(), x.vec())
+        if(self.ksp.getConvergedReason() < 0):
+            raise RuntimeError("Multigrid solver did not converge (reason " + str(self.ksp.getConvergedReason()) + ")")
+        x.update_ghost_values()
+        return self.ksp.getIterationNumber()
@@ -1,4 +1,5 @@
 from dolfin import Parameters
+from Default_Parameters import *
 
 
 """This class reads parameter files specific for the problem.
@@ -14,24 +15,8 @@ class My_Parameters:
         #Since these parameters are more related to the numeric part
         #rather than physics we choose to set a default value in order to
         #avoid problems in case they will not present in the file
-        self.Param.add("Polynomial_degree", 1)
-        self.Param.add("Number_vertices_x", 80)
-        self.Param.add("Number_vertices_y", 160)
-        self.Param.add("Log_Level", 21) #more than INFO level by default
-        self.Param.add("Reinit_Type", 'Non_Conservative_Hyperbolic')
-        self.Param.add("Stabilization_Type", 'SUPG')
-        self.Param.add("NS_Procedure", 'ICT')
-        self.Param.add("Interface_Thickness", 0.025)
-        self.Param.add("Stabilization_Parameter", 0.01)
-        self.Param.add("Reference_Dimensionalization", 'Dimensional')
-        self.Param.add("Settings_Type", 'Physical')
-        self.Param.add("Maximum_subiters_recon", 10)
-        self.Param.add("Tolerance_recon", 1.0e-4)
-        self.Param.add("Saving_Frequency", 50)
-        self.Param.add("Reinitialization_Frequency", 1)
-        self.Param.add("Saving_Directory", 'Sim')
-        self.Param.add("Interface_Perturbation_RT", 'Cos')
-        self.Param.add("Problem", 'Bubble')
+        for (key, value) in DEFAULT_PARAMETERS:
+            self.Param.add(key, value)
 
         try:
             self.file = open(param_name, "r")
@@ -69,7 +54,7 @@ class My_Parameters:
                 idx_eq = line.find(' = ')
                 if(idx_eq != -1):
                     if(line[0 : idx_eq] in self.Param.keys()):
-                        self.Param[line[0 : idx_eq]] = type(self.Param[line[0 : idx_eq]])(line[idx_eq + 3 :])
+                        self.Param[line[0 : idx_eq]] = convert_value(self.Param[line[0 : idx_eq]], line[idx_eq + 3 :])
                     else:
                         self.Param.add(line[0 : idx_eq],line[idx_eq + 3 :])
                 else:
@@ -0,0 +1,217 @@
+import os
+import math
+
+"""Validation of the options of a configuration without DOLFIN: the rules are shared by the problem classes,
+   which check their options at startup, and by the pre-flight checks in 'Preflight.py'"""
+
+#Admissible values of the options with a fixed set of choices
+OPTION_VALUES = {'Stabilization_Type': {'IP', 'SUPG', 'None'},
+                 'NS_Procedure': {'Standard', 'ICT'},
+                 'Reinit_Type': {'Non_Conservative_Hyperbolic', 'Conservative'},
+                 'Reinit_Policy': {'Fixed', 'Adaptive'},
+                 'Stopping_Criteria': {'Rise_velocity', 'Kinetic_energy', 'Walls'},
+                 'Partitioning_Type': {'Default', 'Interface_Weighted'},
+                 'Levelset_Solver': {'Implicit', 'SSP_RK2', 'SSP_RK3'},
+                 'Geometry_Diagnostics': {'Integral', 'Contour'},
+                 'Output_Type': {'Full', 'Interface', 'Both'},
+                 'Output_Fields': {'u', 'p', 'phi', 'rho'},
+                 'Output_Backend': {'VTK', 'XDMF'},
+                 'Density_Output': {'Nodal', 'Projection'},
+                 'Render_Field': {'phi', 'rho'},
+                 'Series_Format': {'Text', 'Binary'},
+                 'Reference_Error_Norm': {'L1', 'L2', 'Linf'},
+                 'Solver_Tuning': {'Off', 'Auto'}}
+
+#Names of the quantities of the benchmark series which can have a reference series
+REFERENCE_COLUMNS = {'Vol', 'chi', 'Xc', 'Yc', 'Uc', 'Vc'}
+
+"""Read the physical options which must be supplied as floats: return the values and the missing or invalid options"""
+def read_floats(param, keys):
+    values = {}
+    errors = []
+    for key in keys:
+        if(key not in param):
+            errors.append("Option '" + key + "' not found")
+            continue
+        try:
+            values[key] = float(param[key])
+        except ValueError:
+            errors.append("Invalid value for option '" + key + "'")
+    return (values, errors)
+
+
+"""Physical quantities of a run: density and viscosity ratios, final time and time-step of the equations
+   (non-dimensional for the Rayleigh-Taylor instability)"""
+def physical_quantities(param, values):
+    quantities = {'dt': values['Time_step'], 't_end': values['End_time']}
+    if(param["Problem"] == 'RT'):
+        g = values['Gravity']
+        if(param["Settings_Type"] == 'Parameters'):
+            At = float(param["Atwood_number"])
+        else:
+            At = (values['Heavier_density'] - values['Lighter_density'])/(values['Heavier_density'] + values['Lighter_density'])
+        quantities['At'] = At
+        quantities['t_end'] = values['End_time']*math.sqrt(At*g) #Non-dimensional final time (reference time 1/sqrt(At*g))
+        quantities['rho_ratio'] = (1.0 + At)/(1.0 - At) if At < 1.0 else math.inf
+    else:
+        quantities['rho_ratio'] = values['Heavier_density']/values['Lighter_density']
+    quantities['mu_ratio'] = values['Viscosity_heavier_fluid']/values['Viscosity_lighter_fluid']
+    return quantities
+
+
+"""Validate the options of a configuration (a dictionary or a DOLFIN 'Parameters') for the given problem
+   ('Bubble' or 'RT'; by default the one of the configuration): return the list of errors (empty if the
+   configuration is valid) and the list of warnings"""
+def validate_options(param, problem = None):
+    param = {key: param[key] for key in param.keys()}
+    if(problem is not None):
+        param["Problem"] = problem
+    errors = []
+    warnings = []
+    def check(condition, message):
+        if(not condition):
+            errors.append(message)
+
+    #Problem and physical options
+    problem = param["Problem"]
+    if(problem not in {'Bubble', 'RT'}):
+        return (["Unknown problem type. Please check configuration file"], warnings)
+    keys = ['Viscosity_lighter_fluid', 'Viscosity_heavier_fluid', 'Gravity', 'Time_step', 'End_time', 'Base', 'Height']
+    if(problem == 'Bubble'):
+        check(param["Reference_Dimensionalization"] == 'Dimensional', \
+              "This instance of the problem 'BubbleMove' works in a dimensional framework")
+        keys += ['Lighter_density', 'Heavier_density', 'Surface_tension', 'x_center', 'y_center', 'Radius']
+    else:
+        check(param["Reference_Dimensionalization"] == 'Non_Dimensional', \
+              "This instance of the problem 'RayleighTaylor' works in a non-dimensional framework")
+        if(param["Settings_Type"] not in {'Physical', 'Parameters'}):
+            errors.append("Unknown value for settings values")
+        elif(param["Settings_Type"] == 'Physical'):
+            keys += ['Lighter_density', 'Heavier_density']
+        else:
+            keys += ['Atwood_number', 'Reynolds_number']
+        check(param["Interface_Perturbation_RT"] in {'Cos', 'Tanh'}, "Invalid parameter for initial perturbation for RT instability")
+    (values, missing) = read_floats(param, keys)
+    errors += missing
+    if(missing):
+        return (errors, warnings)
+    positive = ['Viscosity_lighter_fluid', 'Viscosity_heavier_fluid', 'Time_step', 'End_time', 'Base', 'Height']
+    if(problem == 'Bubble'):
+        positive += ['Lighter_density', 'Heavier_density']
+        check(values['Gravity'] >= 0.0 and values['Surface_tension'] >= 0.0, \
+              "Invalid parameter read in the configuration file (read a non positive value for some parameters)")
+    else:
+        positive += ['Gravity'] + (['Lighter_density', 'Heavier_density'] if param["Settings_Type"] == 'Physical' else [])
+        if(param["Settings_Type"] == 'Parameters'):
+            check(0.0 <= values['Atwood_number'] <= 1.0, "Invalid Atwood number")
+            check(values['Reynolds_number'] >= 1.0, "Invalid Reynolds number")
+    if(any(values[key] <= 0.0 for key in positive)):
+        return (errors + ["Invalid parameter in the configuration file (read a non positive value for some parameters)"], warnings)
+    check(values['Time_step'] <= values['End_time'], "Time-step greater than final time")
+    if('Lighter_density' in values and values['Heavier_density'] < values['Lighter_density']):
+        warnings.append("The heavier density is not greater than the lighter one")
+    if(problem == 'RT' and param["Settings_Type"] == 'Physical'):
+        At = (values['Heavier_density'] - values['Lighter_density'])/(values['Heavier_density'] + values['Lighter_density'])
+        check(At > 0.0 and values['Lighter_density']*math.sqrt(At*values['Gravity'])/values['Viscosity_lighter_fluid'] > 1.0, \
+              "Invalid Reynolds number computed")
+    if(errors):
+        return (errors, warnings)
+    quantities = physical_quantities(param, values)
+
+    #Discretization
+    check(param["Polynomial_degree"] >= 1, "Invalid degree for polynomials employed in Navier-Stokes (the pair P1-P0 is not stable)")
+    check(param["Number_vertices_x"] >= 1 and param["Number_vertices_y"] >= 1, "Invalid number of cells (it must be a positive integer)")
+    check(param["Stabilization_Type"] in OPTION_VALUES['Stabilization_Type'], "Stabilization method not available")
+    check(param["NS_Procedure"] in OPTION_VALUES['NS_Procedure'], "Solution method for Navier-Stokes not available")
+    check(param["Reinit_Type"] in OPTION_VALUES['Reinit_Type'], "Reinitialization method not available")
+    if(param["Reinit_Type"] == 'Non_Conservative_Hyperbolic'):
+        check(param["Interface_Thickness"] > 0.0, "Non-Positive value for the interface thickness")
+
+    #Time stepping, level-set and reinitialization
+    check(param["Levelset_Subcycles"] >= 1 and param["NS_Subcycles"] >= 1, "Invalid number of sub-cycles (it must be a positive integer)")
+    check(param["NS_Subcycles"]*quantities['dt'] <= quantities['t_end'], "Time-step of the sub-cycling greater than final time")
+    check(param["Levelset_Solver"] in OPTION_VALUES['Levelset_Solver'], "Level-set solver not available")
+    check(param["Levelset_CFL"] > 0.0, "Non-Positive value for the CFL number of the explicit level-set solver")
+    check(param["Reinit_Policy"] in OPTION_VALUES['Reinit_Policy'], "Reinitialization policy not available")
+    check(min(param["Reinit_Tolerance_gradphi"], param["Reinit_Tolerance_thickness"], param["Reinit_Tolerance_volume"]) > 0.0, \
+          "Non-Positive value for the tolerances of the adaptive reinitialization")
+    check(param["Reinitialization_Frequency"] >= 1, "Invalid frequency for reinitialization (it must be a positive integer)")
+    check(param["Saving_Frequency"] >= 1, "Invalid saving frequency (it must be a positive integer)")
+
+    #Stopping criteria
+    criteria = set() if param["Stopping_Criteria"].strip() == 'None' else {c.strip() for c in param["Stopping_Criteria"].split(',')}
+    for c in criteria:
+        check(c in OPTION_VALUES['Stopping_Criteria'], "Stopping criterion(" + c + ") not available")
+    if(problem == 'RT'):
+        check('Rise_velocity' not in criteria, "Stopping criterion 'Rise_velocity' is available only for the problem 'BubbleMove'")
+    check(param["Stopping_Window"] >= 1, "Invalid window for the stopping criteria (it must be a positive integer)")
+    check(param["Stopping_Tolerance"] > 0.0, "Non-Positive value for the tolerance of the stopping criteria")
+    check(param["Maximum_steps"] >= 0, "Invalid maximum number of steps (it must be a non negative integer)")
+
+    #Diagnostics and output
+    check(param["Geometry_Diagnostics"] in OPTION_VALUES['Geometry_Diagnostics'], "Type of geometry diagnostics not available")
+    check(param["Output_Type"] in OPTION_VALUES['Output_Type'], "Output type not available")
+    check(param["Output_Backend"] in OPTION_VALUES['Output_Backend'], "Output backend not available")
+    check({name.strip() for name in param["Output_Fields"].split(',')} <= OPTION_VALUES['Output_Fields'], \
+          "Unknown field in the list of output fields")
+    check(param["Density_Output"] in OPTION_VALUES['Density_Output'], "Computation of the density output not available")
+    check(param["Render_Frequency"] >= 0, "Invalid frequency for rendering the frames (it must be a non negative integer)")
+    check(param["Render_Field"] in OPTION_VALUES['Render_Field'], "Field to be rendered not available")
+    if(problem == 'Bubble'):
+        check(param["Series_Format"] in OPTION_VALUES['Series_Format'], "Format of the benchmark series not available")
+        check(param["Reference_Error_Norm"] in OPTION_VALUES['Reference_Error_Norm'], "Unknown norm for the error budget")
+        check(param["Reference_Error_Budget"] >= 0.0, "Invalid error budget (it must be non negative)")
+        if(param["Reference_Series"] != 'None'):
+            for item in param["Reference_Series"].split(','):
+                (column, _, filename) = item.strip().partition('=')
+                check(column in REFERENCE_COLUMNS, "Unknown quantity for the reference series (" + column + ")")
+                check(os.path.isfile(filename), "Reference series '" + filename + "' not found")
+
+    #Solvers and performance options
+    check(param["Solver_Tuning"] in OPTION_VALUES['Solver_Tuning'], "Unknown value for the tuning of the solvers")
+    levels = param["Multigrid_Levels"]
+    check(levels >= 1, "Invalid number of multigrid levels (it must be a positive integer)")
+    if(levels > 1):
+        #The hierarchy is built on the coarse mesh when the run starts with the continuation
+        factor = max(param["Continuation_Coarsening"], 1)
+        check(param["NS_Procedure"] == 'ICT', "Geometric multigrid is available only for the ICT method")
+        check((param["Number_vertices_x"]//factor) % 2**(levels - 1) == 0 and (param["Number_vertices_y"]//factor) % 2**(levels - 1) == 0, \
+              "The number of cells in each direction (of the coarse phase with continuation) must be divisible by 2^(Multigrid_Levels - 1)")
+    check(param["Bulk_Quadrature_Degree"] >= 0, "Invalid quadrature degree for the bulk terms (it must be a non negative integer)")
+    check(param["Partitioning_Type"] in OPTION_VALUES['Partitioning_Type'], "Partitioning type not available")
+    check(param["Repartition_Frequency"] >= 0, "Invalid frequency for repartitioning (it must be a non negative integer)")
+    check(param["Partition_Interface_Weight"] >= 1.0, "The weight of interface cells for partitioning must be at least 1")
+
+    #Coarse-to-fine continuation
+    factor = param["Continuation_Coarsening"]
+    check(factor >= 1, "Invalid coarsening factor for the continuation (it must be a positive integer)")
+    if(factor > 1):
+        check(param["Number_vertices_x"] % factor == 0 and param["Number_vertices_y"] % factor == 0, \
+              "The number of cells in each direction must be divisible by the coarsening factor of the continuation")
+        check(param["Continuation_Time"] > 0.0 or param["Continuation_Velocity"] > 0.0, \
+              "No trigger for the end of the coarse phase of the continuation")
+
+    #Ensemble of Rayleigh-Taylor simulations
+    if(problem == 'RT' and param["Ensemble_Atwood_numbers"] != 'None'):
+        try:
+            n_At = len([float(v) for v in param["Ensemble_Atwood_numbers"].split(',')])
+            if(param["Ensemble_Reynolds_numbers"] != 'None'):
+                n_Re = len([float(v) for v in param["Ensemble_Reynolds_numbers"].split(',')])
+                check(n_Re in {1, n_At}, "The number of Reynolds numbers differs from the number of Atwood numbers in the ensemble")
+            else:
+                check(param["Settings_Type"] == 'Parameters', "No Reynolds number specified for the ensemble")
+        except ValueError:
+            errors.append("Invalid value in the lists of the ensemble")
+        check(param["Partitioning_Type"] == 'Default', \
+              "Partitioning type must be 'Default' for an ensemble (the mesh is shared among the cases)")
+
+    return (errors, warnings)
+
+
+"""Validate the options of a configuration as 'validate_options', but raise a ValueError with all the errors;
+   return the warnings, which are issued by the caller"""
+def check_options(param, problem = None):
+    (errors, warnings) = validate_options(param, problem)
+    if(errors):
+        raise ValueError("\n".join(errors))
+    return warnings
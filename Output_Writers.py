@@ -0,0 +1,167 @@
+import numpy as np
+import os
+import warnings
+import xml.etree.ElementTree as ET
+
+#DOLFIN is needed only to write the fields, while the readers work on the saved files
+try:
+    from dolfin import File, XDMFFile, MPI, Function
+except ImportError:
+    pass
+
+#h5py is optional and employed only to repack the XDMF/HDF5 output with compression or single precision
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+"""Compact output of the interface: the segments of the extracted iso-contour (and optionally the velocity at the vertices
+   of the interface band) of each step are appended as float64 records to one binary file ('interface.bin'),
+   while a text file ('interface_index.dat') stores for each step the time, the offset in bytes of the record,
+   the number of segments (4 values each: x1 y1 x2 y2) and the number of velocity points (4 values each: x y u v)"""
+class InterfaceWriter:
+    def __init__(self, directory, comm):
+        self.comm = comm
+        self.rank = comm.Get_rank()
+        self.data_file  = directory + '/interface.bin'
+        self.index_file = directory + '/interface_index.dat'
+
+        #Create (or truncate) the files
+        if(self.rank == 0):
+            os.makedirs(directory, exist_ok = True)
+            open(self.data_file, 'wb').close()
+            with open(self.index_file, 'w') as f:
+                f.write("# t offset n_segments n_velocity_points\n")
+
+
+    """Gather the local segments (and velocity points) on the first process and append them to the stream"""
+    def write(self, t, segments, velocity_points = None):
+        all_segments = self.comm.gather(np.asarray(segments, dtype = np.float64).reshape(-1, 4), root = 0)
+        all_points = self.comm.gather(None if velocity_points is None else \
+                                      np.asarray(velocity_points, dtype = np.float64).reshape(-1, 4), root = 0)
+        if(self.rank == 0):
+            segments = np.concatenate(all_segments)
+            points = np.concatenate(all_points) if velocity_points is not None else np.empty((0, 4))
+            offset = os.path.getsize(self.data_file)
+            with open(self.data_file, 'ab') as f:
+                segments.tofile(f)
+                points.tofile(f)
+            with open(self.index_file, 'a') as f:
+                f.write("%.12e %d %d %d\n" % (t, offset, len(segments), len(points)))
+
+
+"""Read the compact interface stream saved in a directory: return the times and a function which gives the segments
+   (n_segments x 2 x 2) and the velocity points (n_points x 4) of the k-th record (the binary file is memory-mapped)"""
+def read_interface_stream(directory):
+    index = np.loadtxt(directory + '/interface_index.dat', ndmin = 2)
+    data = np.memmap(directory + '/interface.bin', dtype = np.float64, mode = 'r') \
+           if os.path.getsize(directory + '/interface.bin') > 0 else np.empty(0)
+
+    def record(k):
+        start = int(index[k, 1])//8
+        n_segments = int(index[k, 2])
+        n_points = int(index[k, 3])
+        segments = np.asarray(data[start : start + 4*n_segments]).reshape(-1, 2, 2)
+        points = np.asarray(data[start + 4*n_segments : start + 4*(n_segments + n_points)]).reshape(-1, 4)
+        return (segments, points)
+
+    return (index[:, 0], record)
+
+
+"""Output of the fields: with the 'VTK' backend each field is saved in a .pvd collection (one file per process
+   and per snapshot), with the 'XDMF' backend each field is saved in a single XDMF/HDF5 pair with the mesh written only once.
+   The XDMF output can be repacked at the end with gzip compression and/or single precision for the values of the fields"""
+class FieldWriter:
+    def __init__(self, directory, comm, backend, fields, compression = False, single_precision = False):
+        self.comm = comm
+        self.backend = backend
+        self.fields = fields
+        self.compression = compression
+        self.single_precision = single_precision
+        self.rewrite_mesh = False
+        self.aliases = {}
+
+        #Open one file for each field
+        self.files = {}
+        for name in fields:
+            if(backend == 'VTK'):
+                self.files[name] = File(directory + '/' + name + '.pvd')
+            elif(backend == 'XDMF'):
+                self.files[name] = XDMFFile(comm, directory + '/' + name + '.xdmf')
+                self.files[name].parameters["flush_output"] = True
+                self.files[name].parameters["functions_share_mesh"] = True
+                self.files[name].parameters["rewrite_function_mesh"] = False
+            else:
+                raise ValueError("Output backend not available")
+        self.directory = directory
+
+        if(backend == 'XDMF' and (compression or single_precision) and h5py is None and MPI.rank(comm) == 0):
+            warnings.warn("h5py not available: the XDMF output will not be compressed nor converted to single precision")
+
+
+    """The mesh of the functions has changed (e.g. after a repartitioning), so it has to be written again"""
+    def mesh_changed(self):
+        self.rewrite_mesh = True
+
+
+    """Function sharing the vector of f with the name of the field, so the name of f is not changed
+       (it is rebuilt only when f is replaced, e.g. after a repartition)"""
+    def alias(self, name, f):
+        if(name not in self.aliases or self.aliases[name][0] is not f):
+            g = Function(f.function_space(), f.vector())
+            g.rename(name, name)
+            self.aliases[name] = (f, g)
+        return self.aliases[name][1]
+
+
+    """Save the selected fields among the available ones"""
+    def write(self, functions, t):
+        for name in self.fields:
+            f = self.alias(name, functions[name])
+            if(self.backend == 'VTK'):
+                self.files[name] << (f, t)
+            else:
+                self.files[name].parameters["rewrite_function_mesh"] = self.rewrite_mesh
+                self.files[name].write(f, t)
+                self.files[name].parameters["rewrite_function_mesh"] = False
+        self.rewrite_mesh = False
+
+
+    """Close the files and repack the XDMF output (if required)"""
+    def close(self):
+        if(self.backend != 'XDMF'):
+            return
+        for name in self.fields:
+            self.files[name].close()
+        if((self.compression or self.single_precision) and h5py is not None):
+            MPI.barrier(self.comm)
+            if(MPI.rank(self.comm) == 0):
+                for name in self.fields:
+                    repack_xdmf(self.directory + '/' + name + '.xdmf', self.compression, self.single_precision)
+            MPI.barrier(self.comm)
+
+
+"""Rewrite the HDF5 file of an XDMF output with gzip compression and/or the values of the functions in single precision
+   (the mesh is kept in double precision); the precision declared in the XDMF file is updated accordingly"""
+def repack_xdmf(xdmf_name, compression, single_precision):
+    h5_name = os.path.splitext(xdmf_name)[0] + '.h5'
+    tmp_name = h5_name + '.tmp'
+    with h5py.File(h5_name, 'r') as src, h5py.File(tmp_name, 'w') as dst:
+        def copy(path, item):
+            if(isinstance(item, h5py.Dataset)):
+                data = item[()]
+                if(single_precision and path.startswith('VisualisationVector') and data.dtype == np.float64):
+                    data = data.astype(np.float32)
+                dst.create_dataset(path, data = data, compression = 'gzip' if compression else None)
+                for (key, value) in item.attrs.items():
+                    dst[path].attrs[key] = value
+        src.visititems(copy)
+    os.replace(tmp_name, h5_name)
+
+    if(single_precision):
+        ET.register_namespace('xi', 'http://www.w3.org/2001/XInclude')
+        tree = ET.parse(xdmf_name)
+        for item in tree.iter('DataItem'):
+            if(item.text is not None and ':/VisualisationVector/' in item.text and item.get('Precision') == '8'):
+                item.set('Precision', '4')
+        tree.write(xdmf_name)
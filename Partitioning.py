@@ -0,0 +1,90 @@
+from dolfin import *
+import numpy as np
+import os
+
+"""Weights of the rows of cells of a structured rectangle mesh: each owned cell contributes 1
+   or 'weight' if it belongs to the interface band (the sum is taken over all the processes)"""
+def interface_row_weights(mesh, interface_flags, height, ny, weight):
+    n_owned = mesh.topology().ghost_offset(mesh.topology().dim())
+    midpoints_y = np.mean(mesh.coordinates()[mesh.cells()[:n_owned]][:, :, 1], axis = 1)
+    rows = np.clip(np.floor(midpoints_y/height*ny).astype(int), 0, ny - 1)
+    cell_weights = np.where(interface_flags[:n_owned], weight, 1.0)
+    return mesh.mpi_comm().allreduce(np.bincount(rows, weights = cell_weights, minlength = ny))
+
+
+"""Split the rows in n_parts slabs of contiguous rows with (approximately) the same weight:
+   return the index of the first row of each slab"""
+def weighted_slab_partition(row_weights, n_parts):
+    ny = len(row_weights)
+    if(ny < n_parts):
+        raise ValueError("The number of rows of cells is smaller than the number of processes")
+    cumulative = np.cumsum(row_weights)
+    targets = cumulative[-1]*np.arange(1, n_parts)/n_parts
+    first_rows = [0] + list(np.searchsorted(cumulative, targets) + 1)
+
+    #Each slab must contain at least one row
+    for k in range(1, n_parts):
+        first_rows[k] = int(min(max(first_rows[k], first_rows[k - 1] + 1), ny - (n_parts - k)))
+    return first_rows
+
+
+"""Build the rectangle mesh distributed in slabs of rows: the serial mesh is written by the first process
+   together with the cell partition and then read by all the processes"""
+def build_partitioned_mesh(comm, base, height, nx, ny, first_rows, filename):
+    if(MPI.rank(comm) == 0):
+        os.makedirs(os.path.dirname(filename), exist_ok = True)
+        serial_mesh = RectangleMesh(MPI.comm_self, Point(0.0, 0.0), Point(base, height), nx, ny)
+
+        #The cells of the rectangle mesh are numbered row by row, so each slab is a contiguous range of cells
+        midpoints_y = np.mean(serial_mesh.coordinates()[serial_mesh.cells()][:, :, 1], axis = 1)
+        rows = np.clip(np.floor(midpoints_y/height*ny).astype(int), 0, ny - 1)
+        assert np.all(np.diff(rows) >= 0), "Cells of the rectangle mesh are not ordered by rows"
+        offsets = [int(i) for i in np.searchsorted(rows, first_rows)]
+
+        hdf = HDF5File(MPI.comm_self, filename, 'w')
+        hdf.write(serial_mesh, '/mesh')
+        hdf.attributes('/mesh/topology')['partition'] = offsets
+        hdf.close()
+    MPI.barrier(comm)
+
+    #Read the mesh using the partition saved in the file
+    mesh = Mesh(comm)
+    hdf = HDF5File(comm, filename, 'r')
+    hdf.read(mesh, '/mesh', True)
+    hdf.close()
+    return mesh
+
+
+"""Load the rectangle mesh with its partition from the cache directory (the file is keyed by the geometry,
+   the resolution and the number of processes) or build it and save it in the cache for the next runs.
+   The minimum cell size is stored as an attribute, so no reduction is needed when the mesh is loaded.
+   Return the mesh, the minimum cell size and whether the mesh has been loaded"""
+def cached_rectangle_mesh(comm, base, height, nx, ny, cache_dir):
+    key = "rectangle_{:.12g}x{:.12g}_{:d}x{:d}_np{:d}".format(base, height, nx, ny, MPI.size(comm))
+    filename = cache_dir + '/' + key + '.h5'
+    found = comm.bcast(os.path.isfile(filename) if MPI.rank(comm) == 0 else None, root = 0)
+
+    if(found):
+        mesh = Mesh(comm)
+        hdf = HDF5File(comm, filename, 'r')
+        hdf.read(mesh, '/mesh', True)
+        hmin = hdf.attributes('/mesh')['hmin']
+        hdf.close()
+        return (mesh, hmin, True)
+
+    #Build the mesh and write it to a temporary file, which is renamed only when complete
+    mesh = RectangleMesh(comm, Point(0.0, 0.0), Point(base, height), nx, ny)
+    hmin = MPI.min(comm, mesh.hmin())
+    if(MPI.rank(comm) == 0):
+        os.makedirs(cache_dir, exist_ok = True)
+    MPI.barrier(comm)
+    tmp_name = filename + '.' + str(os.getpid()) + '.tmp' if MPI.rank(comm) == 0 else None
+    tmp_name = comm.bcast(tmp_name, root = 0)
+    hdf = HDF5File(comm, tmp_name, 'w')
+    hdf.write(mesh, '/mesh')
+    hdf.attributes('/mesh')['hmin'] = hmin
+    hdf.close()
+    MPI.barrier(comm)
+    if(MPI.rank(comm) == 0):
+        os.replace(tmp_name, filename)
+    return (mesh, hmin, False)
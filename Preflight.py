@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import math
+import argparse
+import importlib.util
+
+from Default_Parameters import *
+from Option_Validation import *
+
+"""Pre-flight checks of configuration files without DOLFIN: the files are parsed with the same rules of 'My_Parameters',
+   the options are validated with the rules shared with the problem classes and the size and the cost of the runs
+   (dofs of each space, nonzeros of the matrices, memory footprint, number of steps and wall time) are estimated"""
+
+#Cost coefficients (seconds per unit of work on one process) employed when no calibration is available:
+#assembly is measured in nonzeros of the assembled matrices, solution in nonzeros of the iterative systems
+#and in nonzeros of the factors of the direct ones
+DEFAULT_COEFFICIENTS = {'assembly': 5.0e-8, 'solve': 2.0e-7, 'factorization': 5.0e-8}
+
+"""Read a configuration file as a dictionary with the same rules of 'My_Parameters' (the options with a default value
+   are converted to the type of the default, while the others are kept as strings)"""
+def read_parameters(filename):
+    param = dict(DEFAULT_PARAMETERS)
+    with open(filename, "r") as f:
+        for line in f.read().splitlines():
+            if line.strip():
+                idx_eq = line.find(' = ')
+                if(idx_eq == -1):
+                    raise ValueError("Invalid format to read parameters (you need a space before and after the equal): " + line)
+                key = line[0 : idx_eq]
+                param[key] = convert_value(param[key], line[idx_eq + 3 :]) if key in param else line[idx_eq + 3 :]
+    return param
+
+
+"""Validate the options of a configuration: return the list of errors (empty if the configuration is valid)
+   and the list of warnings. The rules are the ones of the problem classes ('Option_Validation'), so a valid
+   configuration does not fail at startup because of its options"""
+def validate(param):
+    (errors, warnings) = validate_options(param)
+    if(not errors and param["Render_Frequency"] > 0 and importlib.util.find_spec('matplotlib') is None):
+        warnings.append("matplotlib not available: the frames will not be rendered")
+    return (errors, warnings)
+
+
+"""Entities of the structured triangular mesh of the rectangle (each rectangle is split in two triangles)"""
+def mesh_entities(nx, ny):
+    return {'cells': 2*nx*ny, 'edges': nx*(ny + 1) + ny*(nx + 1) + nx*ny, 'vertices': (nx + 1)*(ny + 1)}
+
+
+"""Lagrange element of degree k on triangles with bs components: dofs on each cell, on each closed edge and on each vertex,
+   and dofs in the interior of each edge and of each cell"""
+def lagrange_element(k, bs = 1):
+    return {'cell': bs*(k + 1)*(k + 2)//2, 'closed_edge': bs*(k + 1), 'vertex': bs, \
+            'edge_interior': bs*(k - 1), 'cell_interior': bs*(k - 1)*(k - 2)//2}
+
+
+"""Number of dofs of a (mixed) space given as a list of elements"""
+def space_dofs(entities, elements):
+    return sum(entities['vertices']*e['vertex'] + entities['edges']*e['edge_interior'] + \
+               entities['cells']*e['cell_interior'] for e in elements)
+
+
+"""Nonzeros of the matrix of a (mixed) space given as a list of elements: the pairs of dofs sharing a cell, counted as
+   cell pairs minus the pairs counted twice on the interior edges plus the vertex pairs removed once too much
+   (exact up to the boundary entities); with interior penalty also the pairs of dofs of neighbouring cells couple"""
+def matrix_nonzeros(entities, elements, interior_facets = False):
+    nnz = 0
+    for a in elements:
+        for b in elements:
+            nnz += entities['cells']*a['cell']*b['cell'] - entities['edges']*a['closed_edge']*b['closed_edge'] + \
+                   entities['vertices']*a['vertex']*b['vertex']
+            if(interior_facets):
+                nnz += 2*entities['edges']*(a['cell'] - a['closed_edge'])*(b['cell'] - b['closed_edge'])
+    return nnz
+
+
+"""Nonzeros of the factors of a direct solver on a planar mesh (nested dissection: O(N log N))"""
+def factor_nonzeros(dofs, nnz):
+    return int(31.0/8.0*dofs*math.log2(max(dofs, 2))*(nnz/max(dofs, 1))/5.0)
+
+
+"""Estimate the size and the cost of a run: dofs of each space, nonzeros of each linear system, memory footprint
+   (matrices, factors and vectors), number of steps and wall time with the given cost coefficients and processes"""
+def estimate_cost(param, nproc, coefficients):
+    (values, _) = read_floats(param, ['Time_step', 'End_time', 'Base', 'Height', 'Gravity', 'Viscosity_lighter_fluid', \
+                                      'Viscosity_heavier_fluid'] + \
+                                     (['Lighter_density', 'Heavier_density'] if param["Settings_Type"] == 'Physical' or \
+                                      param["Problem"] == 'Bubble' else []))
+    quantities = physical_quantities(param, values)
+    entities = mesh_entities(param["Number_vertices_x"], param["Number_vertices_y"])
+    k = param["Polynomial_degree"]
+    V = [lagrange_element(k + 1, 2)]
+    P = [lagrange_element(k)]
+    Q = [lagrange_element(2)]
+    spaces = {'V': V, 'P': P, 'Q': Q}
+    if(param["NS_Procedure"] == 'Standard'):
+        spaces['W'] = V + P
+    if(param["Reinit_Type"] == 'Conservative' or (param["Problem"] == 'Bubble' and float(param["Surface_tension"]) > 0.0)):
+        spaces['Q2'] = [lagrange_element(1, 2)]
+    dofs = {name: space_dofs(entities, elements) for (name, elements) in spaces.items()}
+
+    #Linear systems of each step: (name, space, iterative solver, times per step)
+    n_reinit = param["Maximum_subiters_recon"]/param["Reinitialization_Frequency"]
+    systems = []
+    if(param["Levelset_Solver"] == 'Implicit'):
+        systems.append(('Levelset', 'Q', True, param["Levelset_Subcycles"]))
+    systems.append(('Reinit', 'Q', param["Reinit_Type"] == 'Non_Conservative_Hyperbolic', param["Levelset_Subcycles"]*n_reinit))
+    if(param["NS_Procedure"] == 'Standard'):
+        systems.append(('Standard_NS', 'W', False, param["NS_Subcycles"]))
+    else:
+        systems += [('ICT_1', 'V', True, param["NS_Subcycles"]), ('ICT_2', 'P', True, param["NS_Subcycles"]), \
+                    ('ICT_3', 'V', True, param["NS_Subcycles"])]
+    ip = param["Stabilization_Type"] == 'IP'
+    nnz = {}
+    work = {'assembly': 0.0, 'solve': 0.0, 'factorization': 0.0}
+    memory = 0
+    for (name, space, iterative, times) in systems:
+        nnz[name] = matrix_nonzeros(entities, spaces[space], interior_facets = ip and name in {'Levelset', 'Reinit'})
+        work['assembly'] += times*nnz[name]
+        memory += 12*nnz[name] + 4*dofs[space] #Values and column indices of the nonzeros and row offsets
+        if(iterative):
+            work['solve'] += times*nnz[name]
+        else:
+            n_factor = factor_nonzeros(dofs[space], nnz[name])
+            work['factorization'] += times*n_factor
+            memory += 12*n_factor
+    memory += 8*(6*dofs['V'] + 4*dofs['P'] + 6*dofs['Q'] + 2*dofs.get('W', 0) + 2*dofs.get('Q2', 0)) #Functions and vectors
+
+    #Steps and wall time (the maximum number of steps, if given, limits the run)
+    n_steps = int(math.ceil(quantities['t_end']/(param["NS_Subcycles"]*quantities['dt']) - 1.0e-9))
+    if(param["Maximum_steps"] > 0):
+        n_steps = min(n_steps, param["Maximum_steps"])
+    step_time = sum(coefficients[key]*work[key] for key in work)/nproc
+    wall_time = n_steps*step_time
+
+    #With the continuation the steps before the given time are computed on the coarse mesh
+    #(the velocity trigger cannot be predicted, so in that case all the steps are accounted on the fine mesh)
+    factor = param["Continuation_Coarsening"]
+    if(factor > 1 and param["Continuation_Time"] > 0.0):
+        t_continuation = param["Continuation_Time"]*quantities['t_end']/values['End_time']
+        coarse_steps = min(n_steps, int(math.ceil(t_continuation/(param["NS_Subcycles"]*quantities['dt']) - 1.0e-9)))
+        coarse_param = dict(param)
+        coarse_param.update({"Number_vertices_x": param["Number_vertices_x"]//factor, \
+                             "Number_vertices_y": param["Number_vertices_y"]//factor, "Continuation_Coarsening": 1})
+        coarse_step_time = estimate_cost(coarse_param, nproc, coefficients)['step_time']
+        wall_time = coarse_steps*coarse_step_time + (n_steps - coarse_steps)*step_time
+    return {'dofs': dofs, 'nnz': nnz, 'memory': memory/nproc, 'steps': n_steps, 'step_time': step_time, \
+            'wall_time': wall_time, 'work': work, 'rho_ratio': quantities['rho_ratio']}
+
+
+"""Calibrate the cost coefficients with the profiling reports of a run ('Profiling = True') of the given configuration:
+   the times of the slowest process are divided by the work estimated by the model (the factorization,
+   if any, is accounted in the solution time in the same proportion of the default coefficients)"""
+def calibrate(param, profile_dir):
+    reports = []
+    for filename in sorted(os.listdir(profile_dir)):
+        if(filename.startswith('profile_rank') and filename.endswith('.json')):
+            with open(profile_dir + '/' + filename, "r") as f:
+                reports.append(json.load(f))
+    if(not reports or reports[0]['steps'] == 0):
+        raise ValueError("No profiling report with completed steps found in '" + profile_dir + "'")
+    nproc = reports[0]['size']
+    n_steps = reports[0]['steps']
+    work = estimate_cost(param, nproc, DEFAULT_COEFFICIENTS)['work']
+    assembly = max(r['timings']['assembly'] for r in reports)/n_steps
+    solve = max(r['timings']['solve'] for r in reports)/n_steps
+    coefficients = {'assembly': assembly*nproc/work['assembly']}
+    model_solve = DEFAULT_COEFFICIENTS['solve']*work['solve'] + DEFAULT_COEFFICIENTS['factorization']*work['factorization']
+    scale = solve*nproc/model_solve if model_solve > 0.0 else 1.0
+    coefficients['solve'] = scale*DEFAULT_COEFFICIENTS['solve']
+    coefficients['factorization'] = scale*DEFAULT_COEFFICIENTS['factorization']
+    return coefficients
+
+
+"""Format the report of a configuration"""
+def format_report(filename, errors, warnings, estimate):
+    lines = [filename + ": " + ("valid" if not errors else "INVALID")]
+    lines += ["  error: " + e for e in errors]
+    lines += ["  warning: " + w for w in warnings]
+    if(estimate is not None):
+        lines.append("  dofs: " + ", ".join(name + " = " + str(n) for (name, n) in sorted(estimate['dofs'].items())))
+        lines.append("  nonzeros: " + ", ".join(name + " = " + str(n) for (name, n) in estimate['nnz'].items()))
+        lines.append("  memory per process: " + "{:.1f}".format(estimate['memory']/2**20) + " MB")
+        lines.append("  steps: " + str(estimate['steps']) + ", time per step (fine mesh): " + "{:.3g}".format(estimate['step_time']) + \
+                     " s, wall time: " + "{:.3g}".format(estimate['wall_time']) + " s (" + \
+                     "{:.2f}".format(estimate['wall_time']/3600.0) + " h)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Validate configuration files and estimate the cost of the runs without DOLFIN")
+    parser.add_argument("config_files", nargs = '+', help = "configuration files to be checked")
+    parser.add_argument("--nproc", type = int, default = 1, help = "number of processes of the runs (1 by default)")
+    parser.add_argument("--calibration", default = 'preflight_calibration.json', \
+                        help = "file with the calibrated cost coefficients ('preflight_calibration.json' by default)")
+    parser.add_argument("--calibrate", nargs = 2, metavar = ('CONFIG', 'PROFILE_DIR'), default = None, \
+                        help = "calibrate the cost coefficients with the profiling reports of a run of the configuration")
+    args = parser.parse_args()
+
+    #Calibrate the coefficients (and save them) or read the saved ones
+    coefficients = dict(DEFAULT_COEFFICIENTS)
+    if(args.calibrate is not None):
+        coefficients = calibrate(read_parameters(args.calibrate[0]), args.calibrate[1])
+        with open(args.calibration, "w") as f:
+            json.dump(coefficients, f, indent = 2)
+        print("Cost coefficients saved in '" + args.calibration + "': " + \
+              ", ".join(key + " = " + "{:.3e}".format(value) for (key, value) in coefficients.items()))
+    elif(os.path.isfile(args.calibration)):
+        with open(args.calibration, "r") as f:
+            coefficients.update(json.load(f))
+
+    #Check each configuration
+    n_invalid = 0
+    for filename in args.config_files:
+        try:
+            param = read_parameters(filename)
+            (errors, warnings) = validate(param)
+        except (IOError, ValueError) as e:
+            (param, errors, warnings) = (None, [str(e)], [])
+        estimate = estimate_cost(param, args.nproc, coefficients) if not errors else None
+        print(format_report(filename, errors, warnings, estimate))
+        n_invalid += 1 if errors else 0
+    sys.exit(1 if n_invalid > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
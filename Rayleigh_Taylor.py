@@ -1,9 +1,11 @@
 from TwoPhaseFlows import *
 from My_Parameters import My_Parameters
 from Boundary_Definition import *
+from Partitioning import *
 
 from sys import exit
 import os
+import time
 
 class RayleighTaylor(TwoPhaseFlows):
     """Class constructor"""
@@ -28,9 +30,8 @@ class RayleighTaylor(TwoPhaseFlows):
         #Start with the specific problem settings
         self.Param = param_handler
 
-        #Check coherence of dimensional choice
-        if(self.Param["Reference_Dimensionalization"] != 'Non_Dimensional'):
-            raise ValueError("This instance of the problem 'RayleighTaylor' works in a non-dimensional framework")
+        #Check the options of the configuration
+        self.check_configuration('RT')
 
         try:
             self.set_type = self.Param["Settings_Type"]
@@ -44,16 +45,6 @@ class RayleighTaylor(TwoPhaseFlows):
                 print(str(e) +  "\nPlease check configuration file")
             exit(1)
 
-        if(self.set_type not in {'Physical', 'Parameters'}):
-            raise ValueError("Unknown value for settings values")
-
-        #Check correctness of data read
-        if(self.dt < DOLFIN_EPS or self.t_end < DOLFIN_EPS or self.mu1 < DOLFIN_EPS or \
-           self.mu2 < DOLFIN_EPS or self.g < DOLFIN_EPS):
-            raise ValueError("Invalid parameter in the configuration file (read a non positive value for some parameters)")
-        if(self.dt > self.t_end):
-            raise ValueError("Time-step greater than final time")
-
         #Since this parameters are more related to the numeric part
         #rather than physics we set a default value
         #and so they are present for sure
@@ -62,18 +53,6 @@ class RayleighTaylor(TwoPhaseFlows):
         self.stab_method   = self.Param["Stabilization_Type"]
         self.NS_sol_method = self.Param["NS_Procedure"]
 
-        #Check correctness of Level-set method
-        if(self.stab_method not in self.stab_dict):
-            raise ValueError("Stabilization method not available")
-
-        #Check correctness of Navier-Stokes method
-        if(self.NS_sol_method not in self.NS_sol_dict):
-            raise ValueError("Solution method for Navier-Stokes not available")
-
-        #Check correctness of reinitialization method
-        if(self.reinit_method not in self.reinit_method_dict):
-            raise ValueError("Reinitialization method not available")
-
         #Set more adequate solvers in case of one core execution
         if(MPI.size(self.comm) == 1):
             if(self.reinit_method == 'Non_Conservative_Hyperbolic'):
@@ -92,10 +71,7 @@ class RayleighTaylor(TwoPhaseFlows):
                 self.rho1 = float(self.Param["Lighter_density"])
                 self.rho2 = float(self.Param["Heavier_density"])
                 self.At = (self.rho2 - self.rho1)/(self.rho2 + self.rho1)
-                if(self.rho2 < self.rho1 and self.rank == 0):
-                    warnings.warn("The heavier density is not greater than the lighter one")
                 self.Re = self.rho1*self.L0*np.sqrt(self.At*self.L0*self.g)/self.mu1
-                assert self.Re > 1.0, "Invalid Reynolds number computed"
             except RuntimeError as e:
                 if(self.rank == 0):
                     print(str(e) +  "\nPlease check configuration file")
@@ -103,11 +79,7 @@ class RayleighTaylor(TwoPhaseFlows):
         elif(self.set_type == 'Parameters'):
             try:
                 self.At = float(self.Param["Atwood_number"])
-                if(self.At < 0.0 or self.At > 1.0):
-                    raise ValueError("Invalid Atwood number")
                 self.Re = float(self.Param["Reynolds_number"])
-                if(self.Re < 1.0):
-                    raise ValueError("Invalid Reynolds number")
                 self.rho1 = self.Re*self.mu1/(self.L0*np.sqrt(self.At*self.L0*self.g))
                 self.rho2 = self.rho1*(1.0 + self.At)/(1.0 - self.At)
             except RuntimeError as e:
@@ -140,14 +112,17 @@ class RayleighTaylor(TwoPhaseFlows):
             self.switcher_parameter['SUPG'] = self.scaling
 
         #Convert useful constants to constant FENICS functions
-        self.DT = Constant(self.dt)
+        self.DT        = Constant(self.dt)
+        self.RHO2_RHO1 = Constant(self.rho2_rho1)
+        self.MU2_MU1   = Constant(self.mu2_mu1)
+        self.RE        = Constant(self.Re)
+        self.FR        = Constant(np.sqrt(self.At))
 
         #Set parameter for standard output (only rank 0 will print)
         set_log_level(self.Param["Log_Level"] if self.rank == 0 else 1000)
 
-        #Detect properties for reconstrution step
-        self.tol_recon = self.Param["Tolerance_recon"]
-        self.max_subiters = self.Param["Maximum_subiters_recon"]
+        #Read the numerical options shared with the other problems
+        self.read_options()
 
 
     """Return the communicator"""
@@ -155,9 +130,14 @@ class RayleighTaylor(TwoPhaseFlows):
         return self.comm
 
 
+    """Dimensional time (the equations are solved with the non-dimensional one)"""
+    def physical_time(self, t):
+        return t*self.t0
+
+
     """Build the mesh for the simulation"""
-    def build_mesh(self):
-        #Generate mesh
+    def build_mesh(self, mesh = None, spaces = None):
+        #Generate mesh (if it is not supplied)
         try:
             self.base   = float(self.Param["Base"])
             self.height = float(self.Param["Height"])
@@ -165,19 +145,37 @@ class RayleighTaylor(TwoPhaseFlows):
             if(self.rank == 0):
                 print(str(e) +  "\nPlease check configuration file")
             exit(1)
-        self.mesh = RectangleMesh(Point(0.0, 0.0), Point(self.base, self.height), \
-                                  self.Param["Number_vertices_x"], self.Param["Number_vertices_y"])
-
-        #Define FE spaces
+        t_mesh = time.perf_counter()
+        self.hmin = None
+        if(mesh is None and self.mesh_cache is not None):
+            (self.mesh, self.hmin, self.mesh_loaded) = cached_rectangle_mesh(self.comm, self.base, self.height, \
+                                                                             self.resolution[0], self.resolution[1], \
+                                                                             self.mesh_cache)
+        elif(mesh is None):
+            self.mesh = RectangleMesh(Point(0.0, 0.0), Point(self.base, self.height), self.resolution[0], self.resolution[1])
+        else:
+            self.mesh = mesh
+        if(self.hmin is None):
+            self.hmin = MPI.min(self.comm, self.mesh.hmin())
+        self.t_mesh = time.perf_counter() - t_mesh
+
+        #Define FE spaces (unless they are shared with another simulation on the same mesh)
         if(self.deg == 0):
             raise ValueError("Invalid degree for polynomials employed in Navier-Stokes (the pair P1-P0 is not stable)")
-        Velem = VectorElement("Lagrange", self.mesh.ufl_cell(), self.deg + 1)
-        Pelem = FiniteElement("Lagrange", self.mesh.ufl_cell(), self.deg)
-        self.V  = FunctionSpace(self.mesh, Velem)
-        self.P  = FunctionSpace(self.mesh, Pelem)
-        if(self.NS_sol_method == 'Standard'):
-            self.W  = FunctionSpace(self.mesh, Velem*Pelem)
-        self.Q  = FunctionSpace(self.mesh, "CG", 2)
+        if(spaces is None):
+            Velem = VectorElement("Lagrange", self.mesh.ufl_cell(), self.deg + 1)
+            Pelem = FiniteElement("Lagrange", self.mesh.ufl_cell(), self.deg)
+            self.V  = FunctionSpace(self.mesh, Velem)
+            self.P  = FunctionSpace(self.mesh, Pelem)
+            if(self.NS_sol_method == 'Standard'):
+                self.W  = FunctionSpace(self.mesh, Velem*Pelem)
+            self.Q  = FunctionSpace(self.mesh, "CG", 2)
+        else:
+            self.V  = spaces['V']
+            self.P  = spaces['P']
+            if(self.NS_sol_method == 'Standard'):
+                self.W  = spaces['W']
+            self.Q  = spaces['Q']
 
         #Define trial and test functions
         if(self.NS_sol_method == 'Standard'):
@@ -198,6 +196,7 @@ class RayleighTaylor(TwoPhaseFlows):
         self.p_old    = Function(self.P)
         if(self.NS_sol_method == 'Standard'):
             self.w_curr = Function(self.W)
+            self.assigner_NS = FunctionAssigner([self.V, self.P], self.W) #Persistent, to extract velocity and pressure in place
         self.phi_curr = Function(self.Q)
         self.phi_old  = Function(self.Q)
 
@@ -211,13 +210,20 @@ class RayleighTaylor(TwoPhaseFlows):
 
         #Declare function for normal vector (in case of conservative level-set method)
         if(self.reinit_method == 'Conservative'):
-            self.Q2 = VectorFunctionSpace(self.mesh, "CG", 1)
+            self.Q2 = VectorFunctionSpace(self.mesh, "CG", 1) if spaces is None else spaces['Q2']
             self.n = Function(self.Q2)
 
+        #Define functions for the velocity transporting the level-set and for the state at the beginning
+        #of the macro step in case of sub-cycling
+        if(self.subcycling):
+            self.u_start   = Function(self.V)
+            self.u_LS      = Function(self.V)
+            self.phi_start = Function(self.Q)
+
 
         #Parameters for reinitialization steps
         if(self.reinit_method == 'Non_Conservative_Hyperbolic'):
-            hmin = MPI.min(self.comm, self.mesh.hmin())
+            hmin = self.hmin
             self.eps = self.Param["Interface_Thickness"]
             if(self.eps < DOLFIN_EPS):
                 raise ValueError("Non-Positive value for the interface thickness")
@@ -239,7 +245,7 @@ class RayleighTaylor(TwoPhaseFlows):
                                                     (self.phi_curr, self.phi_intermediate, self.phi0, self.dt_reinit, \
                                                      self.max_subiters, self.tol_recon)}
         elif(self.reinit_method == 'Conservative'):
-            hmin = MPI.min(self.comm, self.mesh.hmin())
+            hmin = self.hmin
             self.dt_reinit = Constant(0.5*hmin**(1.1))
             self.eps = Constant(0.5*hmin**(0.9))
 
@@ -286,16 +292,18 @@ class RayleighTaylor(TwoPhaseFlows):
 
     """Assemble boundary condition"""
     def assembleBC(self):
+        #Mark the boundary facets only once (the boundary dofs are then found without Python callbacks)
+        self.boundary_markers = mark_boundaries(self.mesh, self.base, self.height)
+
         if(self.NS_sol_method == 'Standard'):
-            self.bcs = [DirichletBC(self.W.sub(0), Constant((0.0,0.0)),  NoSlip_Boundary(self.height)), \
-                        DirichletBC(self.W.sub(0).sub(0), Constant(0.0), FreeSlip_Boundary(self.base))]
+            self.bcs = [DirichletBC(self.W.sub(0), Constant((0.0,0.0)), self.boundary_markers, NOSLIP_ID), \
+                        DirichletBC(self.W.sub(0).sub(0), Constant(0.0), self.boundary_markers, FREESLIP_ID)]
 
             #Useful dictionary for solver in order to avoid too many ifs
             self.switcher_NS_solve = {'Standard': self.solve_Standard_NS_system}
             self.switcher_arguments_NS_solve = {'Standard': (self.bcs, self.w_curr)}
         elif(self.NS_sol_method == 'ICT'):
-            self.bcs = [DirichletBC(self.V, Constant((0.0,0.0)),  NoSlip_Boundary(self.height)), \
-                        DirichletBC(self.V.sub(0), Constant(0.0), FreeSlip_Boundary(self.base))]
+            self.bcs = box_velocity_bcs(self.V, self.boundary_markers)
 
             #Useful dictionary for solver in order to avoid too many ifs
             self.switcher_NS_solve = {'ICT': self.solve_ICT_NS_systems}
@@ -320,33 +328,66 @@ class RayleighTaylor(TwoPhaseFlows):
 
     """Auxiliary function to compute density"""
     def rho(self, x, eps):
-        return self.rho2_rho1*self.Appr_Heaviside(x,eps) + (1.0 - self.Appr_Heaviside(x,eps))
+        return self.RHO2_RHO1*self.Appr_Heaviside(x,eps) + (1.0 - self.Appr_Heaviside(x,eps))
+
+
+    """Auxiliary function to compute density on arrays of level-set values"""
+    def rho_np(self, x, eps):
+        H = CHeaviside_np(x, eps) if self.reinit_method == 'Non_Conservative_Hyperbolic' else x
+        return self.rho2_rho1*H + (1.0 - H)
 
 
     """Auxiliary function to compute viscosity"""
     def mu(self, x, eps):
-        return self.mu2_mu1*self.Appr_Heaviside(x,eps) + (1.0 - self.Appr_Heaviside(x,eps))
+        return self.MU2_MU1*self.Appr_Heaviside(x,eps) + (1.0 - self.Appr_Heaviside(x,eps))
 
 
     """Set weak formulations"""
     def set_weak_forms(self):
         try:
+            #Set the measures for the bulk and the interface terms
+            self.set_integration_measures(self.mesh, self.Param["Bulk_Quadrature_Degree"])
+
             #Set variational problem for step 1 (Level-set)
-            self.LS_weak_form(self.phi, self.l, self.phi_old, self.u_old, self.DT, self.mesh, \
-                              self.stab_method, self.switcher_parameter[self.stab_method])
+            if(self.subcycling):
+                self.LS_weak_form(self.phi, self.l, self.phi_old, self.u_LS, self.DT_LS, self.mesh, \
+                                  self.stab_method, self.switcher_parameter[self.stab_method])
+            else:
+                self.LS_weak_form(self.phi, self.l, self.phi_old, self.u_old, self.DT, self.mesh, \
+                                  self.stab_method, self.switcher_parameter[self.stab_method])
 
             #Set variational problem for reinitialization
             self.switcher_reinit_varf[self.reinit_method](*self.switcher_arguments_reinit_varf[self.reinit_method])
 
+            #Set the projectors for the normal vector and for the density output (the mass matrices are assembled only once)
+            if(self.reinit_method == 'Conservative'):
+                self.normal_projector = Projector(grad(self.phi_curr)/mgrad(self.phi_curr), self.Q2, self.n)
+            if(self.density_output == 'Projection'):
+                self.rho_projector = Projector(self.rho(self.phi_old, self.eps), self.Q, self.rho_interp)
+
+            #Set the indicators for adaptive reinitialization
+            if(self.reinit_policy == 'Adaptive'):
+                self.Reinit_indicator_forms(self.phi_curr, self.eps, self.reinit_method)
+
+            #Set the forms of the monitored quantities
+            self.set_monitor_forms()
+
             #Set variational problem for step 2 (Navier-Stokes)
             if(self.NS_sol_method == 'Standard'):
                 self.NS_weak_form(self.u, self.p, self.v, self.q, self.u_old, self.DT, self.rho, self.mu, \
-                                  self.phi_curr, self.phi_old, self.eps, Re = self.Re, Fr = np.sqrt(self.At), We = 0.0)
+                                  self.phi_curr, self.phi_old, self.eps, Re = self.RE, Fr = self.FR, We = 0.0)
             elif(self.NS_sol_method == 'ICT'):
                 self.ICT_weak_form_1(self.u, self.v, self.u_old, self.p_old, self.DT, self.rho, self.mu, \
-                                     self.phi_curr, self.phi_old, self.eps, Re = self.Re, Fr = np.sqrt(self.At), We = 0.0)
+                                     self.phi_curr, self.phi_old, self.eps, Re = self.RE, Fr = self.FR, We = 0.0)
                 self.ICT_weak_form_2(self.p, self.q, self.DT, self.p_old, self.u_curr, self.rho, self.phi_curr, self.eps)
                 self.ICT_weak_form_3(self.u, self.v, self.DT, self.u_curr, self.p_curr, self.p_old, self.rho, self.phi_curr, self.eps)
+
+                #Coarser rectangles for the multigrid (built only once, the transfer operators are rebuilt with the spaces)
+                if(self.multigrid_levels > 1):
+                    if(self.coarse_meshes is None):
+                        self.coarse_meshes = rectangle_hierarchy(self.comm, self.base, self.height, self.resolution[0], \
+                                                                 self.resolution[1], self.multigrid_levels)
+                    self.set_multigrid(lambda V: box_velocity_bcs(V, mark_boundaries(V.mesh(), self.base, self.height)))
         except ValueError as e:
             if(self.rank == 0):
                 print(str(e))
@@ -357,15 +398,149 @@ class RayleighTaylor(TwoPhaseFlows):
     """Save the actual state for post-processing"""
     def plot_and_save(self):
         #Save the actual state for visualization
-        self.vtkfile_u << (self.u_old, self.t*self.t0)
-        self.rho_interp.assign(project(self.rho(self.phi_old,self.eps), self.Q))
-        self.vtkfile_rho << (self.rho_interp, self.t*self.t0)
+        if(self.output_type != 'Interface'):
+            self.save_fields(self.t*self.t0)
+
+
+    """Append the interface to the compact stream"""
+    def save_interface_step(self):
+        if(self.output_type != 'Full'):
+            self.save_interface(self.phi_old, self.interface_level, self.t*self.t0, \
+                                self.u_old if self.interface_velocity else None, self.band_delta)
+
+
+    """Check the stopping criteria and return the reason (None if the simulation has to go on)"""
+    def check_stopping_criteria(self):
+        reason = None
+        if(self.max_steps > 0 and self.n_iter >= self.max_steps):
+            reason = "maximum number of steps reached"
+        if('Walls' in self.stop_criteria):
+            sides = [self.wall_side(self.phi_old, dofs, self.interface_level) for dofs in self.wall_dofs]
+            if(sides != self.wall_sides):
+                reason = "the interface reached the walls"
+        if('Kinetic_energy' in self.stop_criteria and self.plateau_reached(self.Ek_series)):
+            reason = "kinetic energy reached a plateau (E_k = " + str(self.Ek_series[-1]) + ")"
+        return reason
+
+
+    """Compute the quantities monitored by the stopping criteria"""
+    def compute_monitors(self):
+        if(self.geometry_diagnostics == 'Contour'):
+            self.save_geometry(self.interface_geometry(self.phi_old, self.interface_level), self.t*self.t0)
+        if('Kinetic_energy' in self.stop_criteria):
+            self.Ek_series.append(assemble(self.kinetic_energy_form))
+
+
+    """Decide whether the level-set has to be reinitialized and return the reason (None if it is not needed)"""
+    def reinit_reason(self):
+        if(self.reinit_policy == 'Adaptive'):
+            return self.check_reinit_need(self.reinit_method, self.eps, self.tol_reinit_gradphi, \
+                                          self.tol_reinit_thickness, self.tol_reinit_volume)
+        if(self.n_LS_iter % self.reinit_iters == 0):
+            return "fixed frequency"
+        return None
+
+
+    """Solve the reinitialization step for the level-set"""
+    def solve_reinit(self, reason):
+        try:
+            begin(int(LogLevel.INFO) + 1,"Solving reinitialization (" + reason + ")")
+            if(self.reinit_method == 'Conservative'):
+                self.normal_projector.project()
+                self.mark_changed(self.n)
+            self.switcher_reinit_solve[self.reinit_method](*self.switcher_arguments_reinit_solve[self.reinit_method])
+            if(self.reinit_policy == 'Adaptive'):
+                self.reset_reinit_indicators()
+            end()
+            self.n_reinit += 1
+        except Exception as e:
+            if(self.rank == 0):
+                print(str(e))
+                print("Aborting simulation...")
+            exit(1)
 
 
-    """Execute simulation"""
-    def run(self):
+    """Solve the Navier-Stokes part"""
+    def solve_NS(self):
+        self.switcher_NS_solve[self.NS_sol_method](*self.switcher_arguments_NS_solve[self.NS_sol_method])
+        if(self.NS_sol_method == 'Standard'):
+            self.assigner_NS.assign([self.u_curr, self.p_curr], self.w_curr)
+            self.mark_changed(self.u_curr, self.p_curr)
+
+
+    """Advance the coupled problem by one time-step"""
+    def time_step(self):
+        #Solve level-set
+        begin(int(LogLevel.INFO) + 1,"Solving Level-set")
+        self.solve_Levelset_system(self.phi_curr)
+        end()
+        self.n_LS_iter += 1
+
+        #Solve Level-set reinit
+        reason = self.reinit_reason()
+        if(reason is not None):
+            self.solve_reinit(reason)
+
+        #Solve Navier-Stokes
+        begin(int(LogLevel.INFO) + 1,"Solving Navier-Stokes")
+        self.solve_NS()
+        end()
+
+        #Prepare to next step assign previous-step solution (velocity and pressure are overwritten
+        #by the next solution, so their vectors can be swapped instead of copied)
+        self.swap_solutions(self.u_old, self.u_curr)
+        self.swap_solutions(self.p_old, self.p_curr)
+        self.phi_old.assign(self.phi_curr)
+        self.mark_changed(self.phi_old)
+
+
+    """Advance the coupled problem by one macro time-step using sub-cycling. With several Navier-Stokes sub-steps
+       these are solved first with the density frozen at the level-set of the beginning of the macro step, and then the
+       level-set sub-steps employ the velocity interpolated in time. With a single Navier-Stokes step the order of
+       'time_step' is kept: the level-set sub-steps employ the velocity of the beginning of the step and Navier-Stokes
+       employs the new level-set (so without level-set sub-steps the scheme is the one of 'time_step')"""
+    def time_step_subcycled(self):
+        if(self.NS_subcycles == 1):
+            #Advance the level-set first (the velocity is the one of the beginning of the step)
+            self.u_start.assign(self.u_old)
+            self.phi_start.assign(self.phi_old)
+            self.mark_changed(self.u_start)
+            self.advance_levelset_subcycled(self.u_start)
+
+            #Navier-Stokes employs the level-set at the beginning and at the end of the step, as in 'time_step'
+            self.phi_old.assign(self.phi_start)
+            self.mark_changed(self.phi_old)
+            begin(int(LogLevel.INFO) + 1,"Solving Navier-Stokes")
+            self.solve_NS()
+            end()
+            self.swap_solutions(self.u_old, self.u_curr)
+            self.swap_solutions(self.p_old, self.p_curr)
+            self.phi_old.assign(self.phi_curr)
+            self.mark_changed(self.phi_old)
+            return
+
+        #Advance Navier-Stokes keeping the interface frozen at the beginning of the macro step
+        self.u_start.assign(self.u_old)
+        self.phi_curr.assign(self.phi_old)
+        self.mark_changed(self.u_start, self.phi_curr)
+        for k in range(self.NS_subcycles):
+            begin(int(LogLevel.INFO) + 1,"Solving Navier-Stokes (sub-step " + str(k + 1) + ")")
+            self.solve_NS()
+            end()
+            self.u_old.assign(self.u_curr)
+            self.p_old.assign(self.p_curr)
+            self.mark_changed(self.u_old, self.p_old)
+
+        #Advance the level-set with a velocity interpolated in time between the beginning and the end of the macro step
+        self.advance_levelset_subcycled(self.u_curr)
+
+
+    """Prepare the simulation up to the initial state (mesh and spaces can be shared with another simulation)"""
+    def setup(self, mesh = None, spaces = None):
+        self.t_setup = time.perf_counter()
+
         #Build the mesh
-        self.build_mesh()
+        self.build_mesh(mesh, spaces)
 
         #Set the initial condition
         self.set_initial_condition()
@@ -376,64 +551,148 @@ class RayleighTaylor(TwoPhaseFlows):
         #Set weak formulations
         self.set_weak_forms()
 
+        #Compile the weak forms (or load them from the cache)
+        self.compile_forms()
+
+        #Repartition the mesh according to the initial position of the interface
+        if(self.partitioning == 'Interface_Weighted'):
+            self.repartition()
+
+        #Set the reference volume for adaptive reinitialization
+        if(self.reinit_policy == 'Adaptive'):
+            self.phi_curr.assign(self.phi_old)
+            self.reset_reinit_indicators()
+
+        #Set the monitor for the interface reaching the walls
+        if('Walls' in self.stop_criteria):
+            self.set_wall_monitor(self.phi_old, self.interface_level, self.height)
+
         #Time-stepping loop parameters
         self.t = 0.0
         self.n_iter = 0
-        reinit_iters = self.Param["Reinitialization_Frequency"]
-        save_iters = self.Param["Saving_Frequency"]
+        self.n_LS_iter = 0
+        self.n_reinit = 0
+        self.stop_reason = None
+        self.reinit_iters = self.Param["Reinitialization_Frequency"]
+        self.save_iters = self.Param["Saving_Frequency"]
 
         #File for plotting
-        self.vtkfile_u = File(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/u.pvd')
-        self.vtkfile_rho = File(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/rho.pvd')
+        if(self.output_type != 'Interface'):
+            self.field_writer = FieldWriter(os.getcwd() + '/' + self.Param["Saving_Directory"], self.comm, self.output_backend, \
+                                            self.output_fields, self.Param["Output_Compression"], self.Param["Output_Single_Precision"])
+
+        #Stream for the compact output of the interface (the velocity is saved in the band where the interface is smeared)
+        if(self.output_type != 'Full'):
+            self.interface_writer = InterfaceWriter(os.getcwd() + '/' + self.Param["Saving_Directory"], self.mesh.mpi_comm())
+            self.band_delta = 0.49 if self.reinit_method == 'Conservative' else float(self.eps)
+
+        #Frames of the animation rendered during the run
+        if(self.render_iters > 0):
+            self.set_frame_renderer(os.getcwd() + '/' + self.Param["Saving_Directory"])
+
+        #File for the geometry of the extracted interface (bubble and spike tips are the extrema of the bounding box)
+        if(self.geometry_diagnostics == 'Contour'):
+            self.geometry_file = os.getcwd() + '/' + self.Param["Saving_Directory"] + '/geometry_series.dat'
+            if(self.rank == 0):
+                open(self.geometry_file, 'w').close()
 
         #Save initial state and start loop
         self.plot_and_save()
-        self.t += self.dt
-        while self.t <= self.t_stop:
-            begin(int(LogLevel.INFO) + 1,"t = " + str(self.t*self.t0) + " s")
-            self.n_iter += 1
-
-            #Solve level-set
-            begin(int(LogLevel.INFO) + 1,"Solving Level-set")
-            self.solve_Levelset_system(self.phi_curr)
+        self.save_interface_step()
+        if(self.render_iters > 0):
+            self.render_frame(self.t*self.t0)
+        self.compute_monitors()
+        self.t += self.dt_macro
+        self.t_loop = time.perf_counter()
+        self.t_setup = self.t_loop - self.t_setup
+        if(self.rank == 0):
+            print("Startup time (mesh, compilation of the forms and initial state): " + "{:.3f}".format(self.t_setup) + " s")
+            print("Mesh setup time: " + "{:.3f}".format(self.t_mesh) + " s" + (" (loaded from the cache)" if self.mesh_loaded else ""))
+
+
+    """Check if the simulation is over (final time reached or stopping criterion met)"""
+    def finished(self):
+        return self.stop_reason is not None or self.t > self.t_stop
+
+
+    """Perform one (macro) time-step"""
+    def advance(self):
+        begin(int(LogLevel.INFO) + 1,"t = " + str(self.t*self.t0) + " s")
+        self.n_iter += 1
+
+        #Advance level-set and Navier-Stokes
+        if(self.subcycling):
+            self.time_step_subcycled()
+        else:
+            self.time_step()
+
+        #Save and compute benchmark quantities
+        if(self.n_iter % self.save_iters == 0):
+            begin(int(LogLevel.INFO) + 1,"Saving data")
+            self.plot_and_save()
             end()
+        self.save_interface_step()
+        if(self.render_iters > 0 and self.n_iter % self.render_iters == 0):
+            self.render_frame(self.t*self.t0)
 
-            #Solve Level-set reinit
-            if(self.n_iter % reinit_iters == 0):
-                try:
-                    begin(int(LogLevel.INFO) + 1,"Solving reinitialization")
-                    if(self.reinit_method == 'Conservative'):
-                        self.n.assign(project(grad(self.phi_curr)/mgrad(self.phi_curr), self.Q2))
-                    self.switcher_reinit_solve[self.reinit_method](*self.switcher_arguments_reinit_solve[self.reinit_method])
-                    end()
-                except Exception as e:
-                    if(self.rank == 0):
-                        print(str(e))
-                        print("Aborting simulation...")
-                    exit(1)
-
-            #Solve Navier-Stokes
-            begin(int(LogLevel.INFO) + 1,"Solving Navier-Stokes")
-            self.switcher_NS_solve[self.NS_sol_method](*self.switcher_arguments_NS_solve[self.NS_sol_method])
-            if(self.NS_sol_method == 'Standard'):
-                (self.u_curr, self.p_curr) = self.w_curr.split(True)
-            end()
+        end()
 
-            #Prepare to next step assign previous-step solution
-            self.u_old.assign(self.u_curr)
-            self.p_old.assign(self.p_curr)
-            self.phi_old.assign(self.phi_curr)
+        #Check that no memory has been allocated by the time-step
+        self.check_allocations()
 
-            #Save and compute benchmark quantities
-            if(self.n_iter % save_iters == 0):
-                begin(int(LogLevel.INFO) + 1,"Saving data")
-                self.plot_and_save()
-                end()
+        #Move to the fine mesh at the end of the coarse phase of the continuation
+        if(self.continuation and self.continuation_reached(self.t, self.u_old)):
+            self.refine_continuation()
 
-            end()
+        #Rebalance the partition following the interface
+        if(self.partitioning == 'Interface_Weighted' and self.repartition_iters > 0 and self.n_iter % self.repartition_iters == 0):
+            self.repartition()
+
+        #Check the stopping criteria
+        self.compute_monitors()
+        self.stop_reason = self.check_stopping_criteria()
+        if(self.stop_reason is not None):
+            if(self.rank == 0):
+                print("Stopping simulation at t = " + str(self.t*self.t0) + " s: " + self.stop_reason)
+            return
 
-            self.t = self.t + self.dt if self.t + self.dt <= self.t_stop or abs(self.t - self.t_stop) < DOLFIN_EPS else self.t_stop
+        self.t = self.t + self.dt_macro if self.t + self.dt_macro <= self.t_stop or abs(self.t - self.t_stop) < DOLFIN_EPS else self.t_stop
+
+
+    """Save the final state and write the reports"""
+    def finalize(self):
+        self.t_loop = time.perf_counter() - self.t_loop
 
         #Save the final state
-        if(self.n_iter % save_iters != 0):
+        if(self.n_iter % self.save_iters != 0):
             self.plot_and_save()
+
+        if(self.output_type != 'Interface'):
+            self.field_writer.close()
+
+        if(self.render_iters > 0):
+            self.frame_renderer.close()
+
+        #Report the reinitialization statistics
+        if(self.rank == 0):
+            print("Reinitialization performed " + str(self.n_reinit) + " times over " + str(self.n_LS_iter) + " level-set steps")
+
+        #Report the reuse of the assembled matrices
+        if(self.assembly_cache.enabled and self.rank == 0):
+            print("Assembly cache:\n" + self.assembly_cache.report())
+
+        #Write the profiling report
+        if(self.profiling):
+            spaces = {'V': self.V, 'P': self.P, 'Q': self.Q}
+            if(self.NS_sol_method == 'Standard'):
+                spaces['W'] = self.W
+            self.write_profile(os.getcwd() + '/' + self.Param["Saving_Directory"] + '/profile_rank' + str(self.rank) + '.json', \
+                               spaces, self.t_setup, self.t_loop, self.n_iter)
+
+
+    """Execute simulation"""
+    def run(self):
+        self.setup()
+        while not self.finished():
+            self.advance()
+        self.finalize()
@@ -0,0 +1,91 @@
+import numpy as np
+
+"""Reference values of the rising bubble benchmark (Hysing et al., 'Quantitative benchmark computations of two-dimensional
+   bubble dynamics', 2009, results of the group TP2D). Test case 1 has density ratio 10 and viscosity ratio 10,
+   test case 2 (the one of 'test_Bubble.cfg') has density ratio 1000 and viscosity ratio 100"""
+BENCHMARK_QUANTITIES = {
+    'Hysing_1': {'circularity_min': 0.9013, 't_circularity_min': 1.9000,
+                 'rise_velocity_max': 0.2417, 't_rise_velocity_max': 0.9213,
+                 'yc_final': 1.0813, 't_final': 3.0},
+    'Hysing_2': {'circularity_min': 0.5144, 't_circularity_min': 3.0000,
+                 'rise_velocity_max': 0.2502, 't_rise_velocity_max': 0.7317,
+                 'yc_final': 1.1376, 't_final': 3.0}
+}
+
+
+"""Load a reference time series saved as two columns (time and value)"""
+def load_reference_series(filename):
+    data = np.loadtxt(filename, ndmin = 2)
+    return (data[:, 0], data[:, 1])
+
+
+"""Relative errors in the discrete L1, L2 and Linf norms in time of a series with respect to a reference series:
+   the series is linearly interpolated at the reference times inside the common time interval"""
+def error_norms(t, values, t_ref, values_ref):
+    t = np.asarray(t, dtype = float)
+    t_ref = np.asarray(t_ref, dtype = float)
+    values_ref = np.asarray(values_ref, dtype = float)
+    mask = np.logical_and(t_ref >= t[0], t_ref <= t[-1])
+    if(not np.any(mask)):
+        return {'L1': np.nan, 'L2': np.nan, 'Linf': np.nan}
+    ref = values_ref[mask]
+    err = np.interp(t_ref[mask], t, values) - ref
+    return {'L1': np.sum(np.abs(err))/np.sum(np.abs(ref)), \
+            'L2': np.sqrt(np.sum(err*err)/np.sum(ref*ref)), \
+            'Linf': np.max(np.abs(err))/np.max(np.abs(ref))}
+
+
+"""Relative deviations of the quantities of a rising bubble run from the reference values of a benchmark"""
+def benchmark_deviations(quantities, benchmark):
+    ref = BENCHMARK_QUANTITIES[benchmark]
+    return {key: (quantities[key] - ref[key])/ref[key] for key in ('circularity_min', 'rise_velocity_max', 'yc_final') \
+            if key in quantities}
+
+
+"""Relative errors in the discrete L1, L2 and Linf norms in time with respect to reference series, updated
+   incrementally at each new sample (the reference is linearly interpolated at the time of the sample and
+   only the samples inside the time interval of the reference are considered)"""
+class RunningErrors:
+    def __init__(self, references):
+        self.references = references
+        self.columns = sorted(references.keys())
+        self.sums = {column: np.zeros(6) for column in self.columns} #sum|e|, sum e^2, max|e|, sum|r|, sum r^2, max|r|
+
+
+    """Update the errors with the values of a new sample (dictionary column --> value)"""
+    def update(self, t, values):
+        for column in self.columns:
+            (t_ref, values_ref) = self.references[column]
+            if(t < t_ref[0] or t > t_ref[-1]):
+                continue
+            ref = np.interp(t, t_ref, values_ref)
+            err = abs(values[column] - ref)
+            acc = self.sums[column]
+            acc[0] += err
+            acc[1] += err*err
+            acc[2] = max(acc[2], err)
+            acc[3] += abs(ref)
+            acc[4] += ref*ref
+            acc[5] = max(acc[5], abs(ref))
+
+
+    """Current relative error of a column in the given norm"""
+    def error(self, column, norm):
+        acc = self.sums[column]
+        if(acc[3] == 0.0):
+            return 0.0
+        if(norm == 'L1'):
+            return acc[0]/acc[3]
+        elif(norm == 'L2'):
+            return np.sqrt(acc[1]/acc[4])
+        return acc[2]/acc[5]
+
+
+    """Names of the columns of the row returned by 'row'"""
+    def header(self):
+        return ['t'] + [column + '_' + norm for column in self.columns for norm in ('L1', 'L2', 'Linf')]
+
+
+    """Row with the time and the current errors of all the columns in all the norms"""
+    def row(self, t):
+        return [t] + [self.error(column, norm) for column in self.columns for norm in ('L1', 'L2', 'Linf')]
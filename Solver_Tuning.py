@@ -0,0 +1,51 @@
+from dolfin import *
+import json
+import os
+
+"""Candidate pairs (solver, preconditioner) for the automatic tuning: LU solvers and Krylov methods
+   (cg only for symmetric systems) with the preconditioners available in the current installation"""
+def solver_candidates(symmetric, nproc):
+    candidates = [(method, "default") for method in ("mumps", "umfpack", "superlu_dist") \
+                  if has_lu_solver_method(method) and (nproc == 1 or method != "umfpack")]
+    methods = ("cg", "gmres") if symmetric else ("gmres", "bicgstab")
+    precons = ("hypre_amg", "ilu", "icc", "sor", "jacobi", "default")
+    for method in methods:
+        for precon in precons:
+            if(not has_krylov_solver_method(method) or not has_krylov_solver_preconditioner(precon)):
+                continue
+            if(precon in {"ilu", "icc"} and nproc > 1):
+                continue #Available in PETSc only for serial runs
+            if(precon == "icc" and not symmetric):
+                continue
+            candidates.append((method, precon))
+    return candidates
+
+
+"""Build the signature of a problem from the settings which affect the linear systems"""
+def problem_signature(param, nproc):
+    keys = ("Problem", "NS_Procedure", "Reinit_Type", "Stabilization_Type", "Levelset_Solver", "Multigrid_Levels", "Polynomial_degree", \
+            "Number_vertices_x", "Number_vertices_y", "Time_step", "Lighter_density", "Heavier_density", \
+            "Viscosity_lighter_fluid", "Viscosity_heavier_fluid", "Atwood_number", "Reynolds_number")
+    return ";".join(key + "=" + str(param[key]) for key in keys if key in param.keys()) + ";nproc=" + str(nproc)
+
+
+"""Read the choices saved in the tuning cache for a signature (empty if not available)"""
+def load_tuning_choices(filename, signature):
+    if(not os.path.isfile(filename)):
+        return {}
+    with open(filename, "r") as f:
+        cache = json.load(f)
+    return {name: tuple(choice) for (name, choice) in cache.get(signature, {}).items()}
+
+
+"""Save the choice for a system in the tuning cache (the choices of the other signatures are preserved)"""
+def save_tuning_choice(filename, signature, name, choice):
+    cache = {}
+    if(os.path.isfile(filename)):
+        with open(filename, "r") as f:
+            cache = json.load(f)
+    cache.setdefault(signature, {})[name] = list(choice)
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok = True)
+    with open(filename, "w") as f:
+        json.dump(cache, f, indent = 2)
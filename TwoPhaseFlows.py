@@ -1,15 +1,42 @@
 from Auxiliary_Functions import *
-
+from Interface_Extraction import *
+from Output_Writers import *
+from Assembly_Cache import *
+from Solver_Tuning import *
+from Multigrid import *
+from Frame_Renderer import *
+from Partitioning import *
+from Option_Validation import *
+
+import os
 import warnings
+import tracemalloc
+import time
+import json
+from collections import deque
+from contextlib import contextmanager
 
 class TwoPhaseFlows():
     """Default constructor"""
     def __init__(self):
         #Define auxiliary dictionaries to set proper stabilization,
-        #solution method for Navier-Stokes and reinitialization
-        self.stab_dict = {'IP', 'SUPG', 'None'}
-        self.NS_sol_dict = {'Standard', 'ICT'}
-        self.reinit_method_dict = {'Non_Conservative_Hyperbolic', 'Conservative'}
+        #solution method for Navier-Stokes and reinitialization (the admissible values are shared with the validation)
+        self.stab_dict = OPTION_VALUES['Stabilization_Type']
+        self.NS_sol_dict = OPTION_VALUES['NS_Procedure']
+        self.reinit_method_dict = OPTION_VALUES['Reinit_Type']
+        self.reinit_policy_dict = OPTION_VALUES['Reinit_Policy']
+        self.stop_criteria_dict = OPTION_VALUES['Stopping_Criteria']
+        self.partitioning_dict = OPTION_VALUES['Partitioning_Type']
+        self.LS_solver_dict = OPTION_VALUES['Levelset_Solver']
+        self.geometry_diagnostics_dict = OPTION_VALUES['Geometry_Diagnostics']
+        self.output_type_dict = OPTION_VALUES['Output_Type']
+        self.output_fields_dict = OPTION_VALUES['Output_Fields']
+
+        #Coefficients of the explicit SSP Runge-Kutta schemes for the level-set in Shu-Osher form:
+        #each stage computes phi = a*phi_n + (1 - a)*(phi + dt*L(phi))
+        self.SSP_RK_coefficients = {'SSP_RK2': (0.0, 0.5), 'SSP_RK3': (0.0, 0.75, 1.0/3.0)}
+        self.LS_solver = 'Implicit'
+        self.LS_CFL = 0.1
 
         #Save solvers and preconditioners settings; in this way we prepare ourselves
         #in case the option to pass it through configuration file will be added in a future version
@@ -30,6 +57,432 @@ class TwoPhaseFlows():
         self.e1 = Constant((1.0, 0.0))
         self.e2 = Constant((0.0, 1.0))
 
+        #Linear solvers (created once for each system) and forms for the increments of the reinitialization
+        self.linear_solvers = {}
+        self.reinit_error_forms = {}
+
+        #Levels of the geometric multigrid for the velocity and pressure systems of the ICT method (1 means no multigrid)
+        self.multigrid_levels = 1
+        self.coarse_meshes = None
+
+        #Coarse-to-fine continuation (disabled by default): triggers for the end of the coarse phase
+        self.continuation = False
+        self.continuation_time = 0.0
+        self.continuation_velocity = 0.0
+
+        #Measures for the bulk terms and for the interface terms of Navier-Stokes (they are set on the mesh
+        #by 'set_integration_measures'; by default the usual measure with automatic quadrature degree)
+        self.dx_bulk = dx
+        self.dx_interface = dx
+        self.band_markers = None
+
+        #Automatic tuning of the linear solvers (disabled by default): systems with symmetric matrices and choices made
+        self.solver_tuning = False
+        self.symmetric_systems = {'Reinit', 'ICT_2', 'ICT_3'}
+        self.solver_choices = {}
+
+        #In-situ rendering of the frames of the animation (disabled by default): frequency in steps and rendered field
+        self.render_iters = 0
+        self.render_field = 'phi'
+
+        #Cache for the assembly of the matrices (disabled by default)
+        self.assembly_cache = AssemblyCache(False)
+
+        #Check of the memory allocated by the time-steps (disabled by default): baseline of the Python memory
+        #and of the PETSc matrices
+        self.debug_allocations = False
+        self.allocation_baseline = None
+        self.solver_modules = ('TwoPhaseFlows.py', 'Bubble_move.py', 'Rayleigh_Taylor.py', 'Auxiliary_Functions.py', \
+                               'Auxiliary_Functions_NumPy.py', 'Assembly_Cache.py', 'Solver_Tuning.py', 'Multigrid.py', \
+                               'Interface_Extraction.py', 'Partitioning.py')
+
+        #Accumulated times for assembly, solution and waiting at the synchronization after each phase (load imbalance,
+        #only when profiling is active; the ghost updates and the reductions are part of the assembly and solution times)
+        self.profiling = False
+        self.timings = {'assembly': 0.0, 'solve': 0.0, 'wait': 0.0}
+
+
+    """Check the options of the configuration with the rules shared with the pre-flight checks ('Option_Validation'):
+       a ValueError reports all the errors, while the warnings are issued only by the first process"""
+    def check_configuration(self, problem):
+        for message in check_options(self.Param, problem):
+            if(self.rank == 0):
+                warnings.warn(message)
+
+
+    """Read the numerical options shared by the problems (they have already been checked by 'check_configuration');
+       'self.dt' and the reference time of 'physical_time' must be set"""
+    def read_options(self):
+        #Detect properties for reconstrution step
+        self.tol_recon = self.Param["Tolerance_recon"]
+        self.max_subiters = self.Param["Maximum_subiters_recon"]
+
+        #Detect properties for sub-cycling: the level-set can be advanced with several sub-steps
+        #for each Navier-Stokes step or, viceversa, Navier-Stokes with several sub-steps for each level-set step
+        self.LS_subcycles = self.Param["Levelset_Subcycles"]
+        self.NS_subcycles = self.Param["NS_Subcycles"]
+        self.subcycling = (self.LS_subcycles > 1 or self.NS_subcycles > 1)
+        self.dt_macro = self.NS_subcycles*self.dt
+        self.DT_LS = Constant(self.dt_macro/self.LS_subcycles)
+
+        #Detect properties for the level-set solver (implicit or explicit SSP Runge-Kutta with lumped mass matrix)
+        self.LS_solver = self.Param["Levelset_Solver"]
+        self.LS_CFL = self.Param["Levelset_CFL"]
+
+        #Detect properties for the reinitialization policy
+        self.reinit_policy = self.Param["Reinit_Policy"]
+        self.tol_reinit_gradphi   = self.Param["Reinit_Tolerance_gradphi"]
+        self.tol_reinit_thickness = self.Param["Reinit_Tolerance_thickness"]
+        self.tol_reinit_volume    = self.Param["Reinit_Tolerance_volume"]
+
+        #Detect properties for early termination
+        self.read_stopping_criteria(self.Param["Stopping_Criteria"], self.Param["Stopping_Window"], self.Param["Stopping_Tolerance"])
+        self.interface_level = 0.5 if self.reinit_method == 'Conservative' else 0.0
+        self.max_steps = self.Param["Maximum_steps"]
+
+        #Detect how the geometry of the interface is computed: smeared integrals or extraction of the iso-contour
+        self.geometry_diagnostics = self.Param["Geometry_Diagnostics"]
+
+        #Detect the output type: full fields (at the saving frequency) and/or the compact interface stream (at each step)
+        self.output_type = self.Param["Output_Type"]
+        self.interface_velocity = self.Param["Interface_Velocity"]
+        self.output_backend = self.Param["Output_Backend"]
+        self.output_fields = [name.strip() for name in self.Param["Output_Fields"].split(',')]
+        self.density_output = self.Param["Density_Output"]
+
+        #Detect the in-situ rendering of the frames of the animation
+        self.render_iters = self.Param["Render_Frequency"]
+        self.render_field = self.Param["Render_Field"]
+
+        #Detect the automatic tuning of the linear solvers: the choices of a previous run with the same settings are reused
+        if(self.Param["Solver_Tuning"] == 'Auto'):
+            self.tuning_cache = os.path.abspath(self.Param["Solver_Tuning_Cache"])
+            self.tuning_signature = problem_signature(self.Param, MPI.size(self.comm))
+            self.solver_choices = load_tuning_choices(self.tuning_cache, self.tuning_signature)
+            self.solver_tuning = True
+
+        #Detect the coarse-to-fine continuation: the run starts on the mesh coarsened by the given factor
+        #and moves to the fine mesh when the time (given in the units of the output) or the velocity reach the given values
+        factor = self.Param["Continuation_Coarsening"]
+        self.continuation = factor > 1
+        self.continuation_time = self.Param["Continuation_Time"]/self.physical_time(1.0)
+        self.continuation_velocity = self.Param["Continuation_Velocity"]
+        self.resolution = (self.Param["Number_vertices_x"]//factor, self.Param["Number_vertices_y"]//factor)
+
+        #Detect the levels of the geometric multigrid (available only for the velocity and pressure systems of the ICT method)
+        self.multigrid_levels = self.Param["Multigrid_Levels"]
+        if(self.multigrid_levels > 1 and not has_petsc4py()):
+            raise ValueError("petsc4py is needed for the geometric multigrid")
+
+        #Directory of the cache of the meshes (with their partition) shared among runs with the same geometry
+        self.mesh_cache = None if self.Param["Mesh_Cache_Directory"] == 'None' else os.path.abspath(self.Param["Mesh_Cache_Directory"])
+        self.mesh_loaded = False
+
+        #Enable the cache which skips the assembly of the matrices whose coefficients did not change
+        self.assembly_cache.enabled = self.Param["Assembly_Cache"]
+
+        #Enable the check that the time-steps after the first one do not allocate new Python memory
+        self.debug_allocations = self.Param["Debug_Allocations"]
+
+        #Enable profiling (synchronization after each timed phase and final report)
+        self.profiling = self.Param["Profiling"]
+
+        #Detect properties for the partitioning of the mesh
+        self.partitioning = self.Param["Partitioning_Type"]
+        self.repartition_iters = self.Param["Repartition_Frequency"]
+        self.partition_weight  = self.Param["Partition_Interface_Weight"]
+
+
+    """Accumulate the elapsed time of a phase; when profiling is active the processes are then synchronized
+       and the waiting time (load imbalance of the phase) is accounted separately"""
+    @contextmanager
+    def timed(self, phase):
+        t_start = time.perf_counter()
+        yield
+        t_stop = time.perf_counter()
+        self.timings[phase] += t_stop - t_start
+        if(self.profiling):
+            MPI.barrier(self.comm)
+            self.timings['wait'] += time.perf_counter() - t_stop
+
+
+    """Write the profiling report of the current process (dofs of each space and accumulated timings)"""
+    def write_profile(self, filename, spaces, setup_time, loop_time, n_steps):
+        report = {'rank': MPI.rank(self.comm), 'size': MPI.size(self.comm), 'steps': n_steps, \
+                  'setup_time': setup_time, 'loop_time': loop_time, 'timings': dict(self.timings), 'dofs': {}}
+        for (name, space) in spaces.items():
+            index_map = space.dofmap().index_map()
+            bs = index_map.block_size()
+            report['dofs'][name] = {'owned': bs*index_map.size(IndexMap.MapSize.OWNED), \
+                                    'ghost': bs*index_map.size(IndexMap.MapSize.UNOWNED)}
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent = 2)
+
+
+    """Evaluate the density at the dofs of the level-set by vectorized evaluation (phi and rho_interp
+       must belong to the same space; no form assembly and no communication are needed)"""
+    def interpolate_rho(self, phi, rho_interp, eps):
+        rho_interp.vector().set_local(self.rho_np(phi.vector().get_local(), float(eps)))
+        rho_interp.vector().apply('insert')
+
+
+    """Solve a linear system with a solver created only once for each system (the free function 'solve'
+       would build a new solver at each call)"""
+    def solve_linear(self, name, A, x, b, method, precon):
+        #Use the tuned choice (benchmarking the candidates the first time if the tuning is active)
+        if(name in self.solver_choices):
+            (method, precon) = self.solver_choices[name]
+        elif(self.solver_tuning and name not in self.linear_solvers):
+            self.tune_solver(name, A, x, b, method, precon)
+            return
+
+        if(name not in self.linear_solvers):
+            if(has_lu_solver_method(method)):
+                self.linear_solvers[name] = PETScLUSolver(A.mpi_comm(), method)
+            else:
+                self.linear_solvers[name] = PETScKrylovSolver(method, precon)
+        solver = self.linear_solvers[name]
+        solver.set_operator(A)
+        solver.solve(x, b)
+
+
+    """Solve the system with all the candidate solvers (the current one first), keep the solution of the fastest
+       converging one and save the choice in the tuning cache (times are maximized over the processes, so that
+       all of them take the same decision)"""
+    def tune_solver(self, name, A, x, b, method, precon):
+        candidates = [(method, precon)] + [c for c in solver_candidates(name in self.symmetric_systems, MPI.size(self.comm)) \
+                                           if c != (method, precon)]
+        x0 = x.copy()
+        best = None
+        for (cand_method, cand_precon) in candidates:
+            x.zero()
+            x.axpy(1.0, x0)
+            t_start = time.perf_counter()
+            try:
+                if(has_lu_solver_method(cand_method)):
+                    solver = PETScLUSolver(A.mpi_comm(), cand_method)
+                else:
+                    solver = PETScKrylovSolver(cand_method, cand_precon)
+                solver.set_operator(A)
+                solver.solve(x, b)
+                failed = 0.0
+            except RuntimeError:
+                failed = 1.0
+            elapsed = MPI.max(self.comm, time.perf_counter() - t_start)
+            if(MPI.max(self.comm, failed) == 0.0 and (best is None or elapsed < best[0])):
+                best = (elapsed, (cand_method, cand_precon), x.copy())
+        if(best is None):
+            raise RuntimeError("No candidate solver converged for the system " + name)
+
+        #Keep the best solution and save the choice
+        x.zero()
+        x.axpy(1.0, best[2])
+        self.solver_choices[name] = best[1]
+        if(MPI.rank(self.comm) == 0):
+            print("Solver tuning for " + name + ": " + best[1][0] + " with preconditioner " + best[1][1] + \
+                  " (" + "{:.4f}".format(best[0]) + " s)")
+            save_tuning_choice(self.tuning_cache, self.tuning_signature, name, best[1])
+
+
+    """Mark the given functions as changed (the matrices depending on them will be assembled again)"""
+    def mark_changed(self, *functions):
+        self.assembly_cache.touch(*functions)
+
+
+    """Copy the current solution into the previous-step one swapping the vectors in place: the current function
+       then holds the old values, so this is allowed only if it is overwritten before being read again"""
+    def swap_solutions(self, f_old, f_curr):
+        if(has_petsc4py()):
+            as_backend_type(f_old.vector()).vec().swap(as_backend_type(f_curr.vector()).vec())
+            f_old.vector().update_ghost_values()
+            f_curr.vector().update_ghost_values()
+        else:
+            f_old.assign(f_curr)
+        self.mark_changed(f_old, f_curr)
+
+
+    """Size of the caches which are allowed to grow during the run: solvers and forms created the first time a system
+       is solved, assembly states and monitored series (bounded by the stopping window)"""
+    def cache_state(self):
+        return (len(self.linear_solvers), len(self.solver_choices), len(self.reinit_error_forms), \
+                len(self.assembly_cache.versions), len(self.assembly_cache.misses), \
+                len(self.Vc_series), len(self.Chi_series), len(self.Ek_series))
+
+
+    """Allocated nonzeros, memory and number of mallocs during assembly of the PETSc matrices of the systems
+       (None if petsc4py is not available); the matrices not assembled yet are not included"""
+    def petsc_state(self):
+        if(not has_petsc4py()):
+            return None
+        state = {}
+        for name in ('A1', 'A1_reinit', 'A2', 'A2_bis', 'A2_tris'):
+            A = getattr(self, name, None)
+            if(A is not None and A.size(0) > 0):
+                info = as_backend_type(A).mat().getInfo()
+                state[name] = (info['nz_allocated'], info['memory'], info['mallocs'])
+        return state
+
+
+    """Check that a time-step does not allocate memory (it is active only with the debug option): the first call sets
+       the baseline, then the net growth of the Python memory between two calls must be zero and the PETSc matrices must
+       keep their storage. If one of the known caches grew (e.g. a system solved for the first time), the step is not
+       checked and the baseline is reset. Only the allocations made by the solver modules are counted: the buffers of
+       the output writers and the frames of the renderer (drawn on a background thread) are allowed to grow"""
+    def check_allocations(self):
+        if(not self.debug_allocations):
+            return
+        if(not tracemalloc.is_tracing()):
+            tracemalloc.start(25) #Whole call stacks, so that the allocations can be attributed to the calling module
+        filters = [tracemalloc.Filter(True, '*/' + module, all_frames = True) for module in self.solver_modules] + \
+                  [tracemalloc.Filter(False, '*/' + module, all_frames = True) for module in ('Output_Writers.py', 'Frame_Renderer.py')] + \
+                  [tracemalloc.Filter(False, tracemalloc.__file__)]
+        snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+        cache_state = self.cache_state()
+        petsc_state = self.petsc_state()
+        if(self.allocation_baseline is not None and cache_state == self.allocation_baseline[0]):
+            stats = snapshot.compare_to(self.allocation_snapshot, 'lineno')
+            growth = sum(stat.size_diff for stat in stats)
+            if(growth != 0):
+                raise AssertionError("Memory allocated during the time-step: " + str(growth) + " bytes\n" + \
+                                     "\n".join(str(stat) for stat in stats[:5]))
+            petsc_baseline = self.allocation_baseline[1]
+            if(petsc_state is not None and petsc_baseline is not None):
+                changed = [name for name in petsc_state if name in petsc_baseline and petsc_state[name] != petsc_baseline[name]]
+                if(changed):
+                    raise AssertionError("PETSc memory allocated during the time-step by the matrices " + ", ".join(changed))
+        self.allocation_snapshot = snapshot
+        self.allocation_baseline = (cache_state, petsc_state)
+
+
+    """Form of the kinetic energy monitored by the stopping criterion 'Kinetic_energy' (built once with the weak forms)"""
+    def set_monitor_forms(self):
+        if('Kinetic_energy' in self.stop_criteria):
+            self.kinetic_energy_form = Form(0.5*self.rho(self.phi_old, self.eps)*inner(self.u_old, self.u_old)*dx)
+
+
+    """Time in the units of the output (the problems with non-dimensional time override it)"""
+    def physical_time(self, t):
+        return t
+
+
+    """Move the simulation to a new mesh of the same domain transferring the current state"""
+    def remesh(self, mesh):
+        #Save the current state and the quantities that have to survive the rebuild
+        (u_old, p_old, phi_old) = (self.u_old, self.p_old, self.phi_old)
+        Vol_reinit = self.Vol_reinit if self.reinit_policy == 'Adaptive' else None
+
+        #Rebuild spaces, functions, boundary conditions and weak forms on the new mesh: the caches hold objects
+        #of the old mesh (and the keys by id() of the forms could be reused by the new objects), so they are emptied
+        self.assembly_cache.clear()
+        self.reinit_error_forms.clear()
+        self.linear_solvers.clear()
+        self.build_mesh(mesh)
+        LagrangeInterpolator.interpolate(self.u_old, u_old)
+        LagrangeInterpolator.interpolate(self.p_old, p_old)
+        LagrangeInterpolator.interpolate(self.phi_old, phi_old)
+        self.u_curr.assign(self.u_old)
+        self.p_curr.assign(self.p_old)
+        self.phi_curr.assign(self.phi_old)
+        self.assembleBC()
+        self.set_weak_forms()
+
+        #The fields are saved on the new mesh
+        if(getattr(self, 'field_writer', None) is not None):
+            self.field_writer.mesh_changed()
+
+        #Restore the monitors
+        if(self.reinit_policy == 'Adaptive'):
+            self.Vol_reinit = Vol_reinit
+        if(self.wall_sides is not None):
+            self.set_wall_monitor(self.phi_old, self.interface_level, self.height, self.wall_sides)
+
+
+    """Repartition the mesh weighting the cells close to the interface"""
+    def repartition(self):
+        if(MPI.size(self.comm) == 1):
+            return
+        begin(int(LogLevel.INFO) + 1,"Repartitioning the mesh")
+        delta = 0.49 if self.reinit_method == 'Conservative' else self.eps
+        flags = self.interface_cells(self.phi_old, self.interface_level, delta)
+        row_weights = interface_row_weights(self.mesh, flags, self.height, self.resolution[1], self.partition_weight)
+        first_rows = weighted_slab_partition(row_weights, MPI.size(self.comm))
+        mesh = build_partitioned_mesh(self.comm, self.base, self.height, self.resolution[0], self.resolution[1], first_rows, \
+                                      os.getcwd() + '/' + self.Param["Saving_Directory"] + '/partitioned_mesh.h5')
+        self.remesh(mesh)
+        end()
+
+
+    """End the coarse phase of the continuation: move the state to the fine mesh and reinitialize the level-set
+       (the interface smeared by the coarse mesh is restored to the profile of the fine one)"""
+    def refine_continuation(self):
+        if(self.rank == 0):
+            print("Continuation: moving to the fine mesh at t = " + str(self.physical_time(self.t)) + " s")
+        self.continuation = False
+        self.resolution = (self.Param["Number_vertices_x"], self.Param["Number_vertices_y"])
+        self.coarse_meshes = None
+        if(self.mesh_cache is not None):
+            (mesh, _, _) = cached_rectangle_mesh(self.comm, self.base, self.height, self.resolution[0], self.resolution[1], \
+                                                 self.mesh_cache)
+        else:
+            mesh = RectangleMesh(self.comm, Point(0.0, 0.0), Point(self.base, self.height), self.resolution[0], self.resolution[1])
+        self.remesh(mesh)
+        self.solve_reinit("continuation")
+        self.phi_old.assign(self.phi_curr)
+        self.mark_changed(self.phi_old)
+        if(self.partitioning == 'Interface_Weighted'):
+            self.repartition()
+
+        #The new mesh is a legitimate allocation
+        self.allocation_baseline = None
+
+
+    """Check whether the coarse phase of the continuation is over: the given time has been reached or the maximum
+       component of the velocity exceeds the threshold (each trigger is disabled if its value is not positive)"""
+    def continuation_reached(self, t, u):
+        if(self.continuation_time > 0.0 and t >= self.continuation_time - DOLFIN_EPS):
+            return True
+        return self.continuation_velocity > 0.0 and u.vector().norm('linf') >= self.continuation_velocity
+
+
+    """Form of the squared L2 norm of the increment of the reinitialization (built once for each pair of functions)"""
+    def reinit_error_form(self, phi_intermediate, phi0, dt_reinit):
+        key = (id(phi_intermediate), id(phi0))
+        if(key not in self.reinit_error_forms):
+            self.reinit_error_forms[key] = Form((((phi_intermediate - phi0)/dt_reinit)**2)*dx)
+        return self.reinit_error_forms[key]
+
+
+    """Save the selected fields (the density is evaluated, or projected, only if it is required)"""
+    def save_fields(self, t):
+        if('rho' in self.field_writer.fields):
+            if(self.density_output == 'Projection'):
+                self.rho_projector.project()
+            else:
+                self.interpolate_rho(self.phi_old, self.rho_interp, self.eps)
+        self.field_writer.write({'u': self.u_old, 'p': self.p_old, 'phi': self.phi_old, 'rho': self.rho_interp}, t)
+
+
+    """Create the renderer of the frames of the animation (the contour is drawn at the value of the field on the interface)"""
+    def set_frame_renderer(self, directory):
+        level = self.interface_level
+        if(self.render_field == 'rho'):
+            level = float(self.rho_np(np.array([level]), float(self.eps))[0])
+        self.frame_renderer = FrameRenderer(directory, self.mesh.mpi_comm(), level, self.render_field)
+
+
+    """Render a frame of the animation from the vertex values of the level-set (no field is written to disk)"""
+    def render_frame(self, t):
+        mesh = self.phi_old.function_space().mesh()
+        values = self.phi_old.compute_vertex_values(mesh)
+        if(self.render_field == 'rho'):
+            values = self.rho_np(values, float(self.eps))
+        self.frame_renderer.render(t, mesh.coordinates(), values, self.base, self.height, *self.resolution)
+
+
+    """Return the function spaces (to share them with another simulation on the same mesh)"""
+    def get_spaces(self):
+        return {name: getattr(self, name) for name in ('V', 'P', 'W', 'Q', 'Q2') if hasattr(self, name)}
+
 
     """Weak formulation for Navier-Stokes"""
     def NS_weak_form(self, u, p, v, q, u_old, dt, rho, mu, phi_curr, phi_old, eps, n_gamma = None, CDelta = None, **kwargs):
@@ -49,37 +502,38 @@ class TwoPhaseFlows():
             assert 'sigma' in kwargs, "Error in the parameters for dimensional version of NS: 'sigma' not found (check function call)"
             g = kwargs.get('g')
             sigma = kwargs.get('sigma')
-            F2 = (1.0/dt)*inner(rho(phi_curr, eps)*u - rho(phi_old, eps)*u_old, v)*dx \
-               + inner(rho(phi_curr, eps)*dot(u_old, nabla_grad(u)), v)*dx \
-               + Constant(2.0)*inner(mu(phi_curr, eps)*D(u), D(v))*dx \
-               - p*div(v)*dx \
-               + div(u)*q*dx \
-               + g*inner(rho(phi_curr, eps)*self.e2, v)*dx
+            F2 = (1.0/dt)*inner(rho(phi_curr, eps)*u - rho(phi_old, eps)*u_old, v)*self.dx_bulk \
+               + inner(rho(phi_curr, eps)*dot(u_old, nabla_grad(u)), v)*self.dx_bulk \
+               + Constant(2.0)*inner(mu(phi_curr, eps)*D(u), D(v))*self.dx_bulk \
+               - p*div(v)*self.dx_bulk \
+               + div(u)*q*self.dx_bulk \
+               + g*inner(rho(phi_curr, eps)*self.e2, v)*self.dx_bulk
             if(sigma > DOLFIN_EPS):
                 if(not callable(CDelta)):
                     raise ValueError("The function to compute the approximation of Dirac's delta must be a callable object")
                 if(not isinstance(n_gamma, Function)):
                     raise ValueError("n(the unit normal to the interface) must be an instance of Function")
-                F2 += Constant(sigma)*mgrad(phi_curr)*inner((Identity(self.n_dim) - outer(n_gamma, n_gamma)), D(v))*CDelta(phi_curr, eps)*dx
+                F2 += Constant(sigma)*mgrad(phi_curr)*inner((Identity(self.n_dim) - outer(n_gamma, n_gamma)), D(v))*CDelta(phi_curr, eps)*self.dx_interface
         elif(len(kwargs) == 3):
             assert 'Re' in kwargs, "Error in the parameters for non-dimensional version of NS: 'Re' not found (check function call)"
             assert 'Fr' in kwargs, "Error in the parameters for non-dimensional version of NS: 'Fr' not found (check function call)"
             assert 'We' in kwargs, "Error in the parameters for non-dimensional version of NS: 'We' not found (check function call)"
-            Re = kwargs.get('Re')
-            Fr = kwargs.get('Fr')
-            We = kwargs.get('We')
-            F2 = (1.0/dt)*inner(rho(phi_curr, eps)*u - rho(phi_old, eps)*u_old, v)*dx \
-               + inner(rho(phi_curr, eps)*dot(u_old, nabla_grad(u)), v)*dx \
-               + Constant(2.0/Re)*inner(mu(phi_curr, eps)*D(u), D(v))*dx \
-               - p*div(v)*dx \
-               + div(u)*q*dx \
-               + Constant(1.0/(Fr*Fr))*inner(rho(phi_curr, eps)*self.e2, v)*dx
-            if(We > DOLFIN_EPS):
+            #The parameters can be either numbers or Constant (the latter allow to share the compiled forms among simulations)
+            Re = kwargs.get('Re') if isinstance(kwargs.get('Re'), Constant) else Constant(kwargs.get('Re'))
+            Fr = kwargs.get('Fr') if isinstance(kwargs.get('Fr'), Constant) else Constant(kwargs.get('Fr'))
+            We = kwargs.get('We') if isinstance(kwargs.get('We'), Constant) else Constant(kwargs.get('We'))
+            F2 = (1.0/dt)*inner(rho(phi_curr, eps)*u - rho(phi_old, eps)*u_old, v)*self.dx_bulk \
+               + inner(rho(phi_curr, eps)*dot(u_old, nabla_grad(u)), v)*self.dx_bulk \
+               + (2.0/Re)*inner(mu(phi_curr, eps)*D(u), D(v))*self.dx_bulk \
+               - p*div(v)*self.dx_bulk \
+               + div(u)*q*self.dx_bulk \
+               + (1.0/(Fr*Fr))*inner(rho(phi_curr, eps)*self.e2, v)*self.dx_bulk
+            if(float(We) > DOLFIN_EPS):
                 if(not callable(CDelta)):
                     raise ValueError("The function to compute the approximation of Dirac's delta must be a callable object")
                 if(not isinstance(n_gamma, Function)):
                     raise ValueError("n(the unit normal to the interface) must be an instance of Function")
-                F2 += Constant(1.0/We)*mgrad(phi_curr)*inner((Identity(self.n_dim) - outer(n_gamma, n_gamma)), D(v))*CDelta(phi_curr, eps)*dx
+                F2 += (1.0/We)*mgrad(phi_curr)*inner((Identity(self.n_dim) - outer(n_gamma, n_gamma)), D(v))*CDelta(phi_curr, eps)*self.dx_interface
         else:
             raise ValueError("Wrong number of arguments in Standard NS weak form setting (check function call)")
 
@@ -89,6 +543,7 @@ class TwoPhaseFlows():
 
         self.A2 = PETScMatrix()
         self.b2 = PETScVector()
+        self.NS_assembler = None #Built at the first assembly, when the boundary conditions are available
 
 
     """Weak formulation for tentative velocity"""
@@ -111,35 +566,36 @@ class TwoPhaseFlows():
             assert 'sigma' in kwargs, "Error in the parameters for dimensional version of NS: 'sigma' not found (check function call)"
             g = kwargs.get('g')
             sigma = kwargs.get('sigma')
-            F2 = (1.0/dt)*inner(rho(phi_curr, eps)*u - rho(phi_old, eps)*u_old, v)*dx \
-               + inner(rho(phi_curr, eps)*dot(u_old, nabla_grad(u)), v)*dx \
-               + Constant(2.0)*inner(mu(phi_curr, eps)*D(u), D(v))*dx \
-               - p_old*div(v)*dx \
-               + g*inner(rho(phi_curr, eps)*self.e2, v)*dx
+            F2 = (1.0/dt)*inner(rho(phi_curr, eps)*u - rho(phi_old, eps)*u_old, v)*self.dx_bulk \
+               + inner(rho(phi_curr, eps)*dot(u_old, nabla_grad(u)), v)*self.dx_bulk \
+               + Constant(2.0)*inner(mu(phi_curr, eps)*D(u), D(v))*self.dx_bulk \
+               - p_old*div(v)*self.dx_bulk \
+               + g*inner(rho(phi_curr, eps)*self.e2, v)*self.dx_bulk
             if(sigma > DOLFIN_EPS):
                 if(not callable(CDelta)):
                     raise ValueError("The function to compute the approximation of Dirac's delta must be a callable object")
                 if(not isinstance(n_gamma, Function)):
                     raise ValueError("n(the unit normal to the interface) must be an instance of Function")
-                F2 += Constant(sigma)*mgrad(phi_curr)*inner((Identity(self.n_dim) - outer(n_gamma, n_gamma)), D(v))*CDelta(phi_curr, eps)*dx
+                F2 += Constant(sigma)*mgrad(phi_curr)*inner((Identity(self.n_dim) - outer(n_gamma, n_gamma)), D(v))*CDelta(phi_curr, eps)*self.dx_interface
         elif(len(kwargs) == 3):
             assert 'Re' in kwargs, "Error in the parameters for non-dimensional version of NS: 'Re' not found (check function call)"
             assert 'Fr' in kwargs, "Error in the parameters for non-dimensional version of NS: 'Fr' not found (check function call)"
             assert 'We' in kwargs, "Error in the parameters for non-dimensional version of NS: 'We' not found (check function call)"
-            Re = kwargs.get('Re')
-            Fr = kwargs.get('Fr')
-            We = kwargs.get('We')
-            F2 = (1.0/dt)*inner(rho(phi_curr, eps)*u - rho(phi_old, eps)*u_old, v)*dx \
-               + inner(rho(phi_curr, eps)*dot(u_old, nabla_grad(u)), v)*dx \
-               + Constant(2.0/Re)*inner(mu(phi_curr, eps)*D(u), D(v))*dx \
-               - p_old*div(v)*dx \
-               + Constant(1.0/(Fr*Fr))*inner(rho(phi_curr, eps)*self.e2, v)*dx
-            if(We > DOLFIN_EPS):
+            #The parameters can be either numbers or Constant (the latter allow to share the compiled forms among simulations)
+            Re = kwargs.get('Re') if isinstance(kwargs.get('Re'), Constant) else Constant(kwargs.get('Re'))
+            Fr = kwargs.get('Fr') if isinstance(kwargs.get('Fr'), Constant) else Constant(kwargs.get('Fr'))
+            We = kwargs.get('We') if isinstance(kwargs.get('We'), Constant) else Constant(kwargs.get('We'))
+            F2 = (1.0/dt)*inner(rho(phi_curr, eps)*u - rho(phi_old, eps)*u_old, v)*self.dx_bulk \
+               + inner(rho(phi_curr, eps)*dot(u_old, nabla_grad(u)), v)*self.dx_bulk \
+               + (2.0/Re)*inner(mu(phi_curr, eps)*D(u), D(v))*self.dx_bulk \
+               - p_old*div(v)*self.dx_bulk \
+               + (1.0/(Fr*Fr))*inner(rho(phi_curr, eps)*self.e2, v)*self.dx_bulk
+            if(float(We) > DOLFIN_EPS):
                 if(not callable(CDelta)):
                     raise ValueError("The function to compute the approximation of Dirac's delta must be a callable object")
                 if(not isinstance(n_gamma, Function)):
                     raise ValueError("n(the unit normal to the interface) must be an instance of Function")
-                F2 += Constant(1.0/We)*mgrad(phi_curr)*inner((Identity(self.n_dim) - outer(n_gamma, n_gamma)), D(v))*CDelta(phi_curr, eps)*dx
+                F2 += (1.0/We)*mgrad(phi_curr)*inner((Identity(self.n_dim) - outer(n_gamma, n_gamma)), D(v))*CDelta(phi_curr, eps)*self.dx_interface
         else:
             raise ValueError("Wrong number of arguments in ICT-Step 1 weak form setting (check function call)")
 
@@ -149,6 +605,7 @@ class TwoPhaseFlows():
 
         self.A2 = PETScMatrix()
         self.b2 = PETScVector()
+        self.NS_assembler = None #Built at the first assembly, when the boundary conditions are available
 
 
     """Weak formulation for pressure correction"""
@@ -164,9 +621,9 @@ class TwoPhaseFlows():
             raise ValueError("The function to compute the density must be a callable object")
 
         #Define variational problem for step 2 of ICT
-        self.a2_bis = (1.0/rho(phi_curr, eps))*inner(grad(p), grad(q))*dx
-        self.L2_bis = (1.0/rho(phi_curr, eps))*inner(grad(p_old), grad(q))*dx - \
-                      (1.0/dt)*div(u_curr)*q*dx
+        self.a2_bis = (1.0/rho(phi_curr, eps))*inner(grad(p), grad(q))*self.dx_bulk
+        self.L2_bis = (1.0/rho(phi_curr, eps))*inner(grad(p_old), grad(q))*self.dx_bulk - \
+                      (1.0/dt)*div(u_curr)*q*self.dx_bulk
 
         #Declare matrix and vector for the linear system solution
         self.A2_bis = PETScMatrix()
@@ -187,16 +644,38 @@ class TwoPhaseFlows():
         if(not callable(rho)):
             raise ValueError("The function to compute the density must be a callable object")
 
-        #Define variational problem for step 3 of ICT
-        self.a2_tris = inner(u, v)*dx
-        self.L2_tris = inner(u_curr, v)*dx - \
-                       dt*inner(grad(p_curr - p_old), v)/rho(phi_curr, eps)*dx
+        #Define variational problem for step 3 of ICT (both sides with the bulk measure, so that the velocity
+        #correction is consistent when the quadrature degree of the bulk terms is set)
+        self.a2_tris = inner(u, v)*self.dx_bulk
+        self.L2_tris = inner(u_curr, v)*self.dx_bulk - \
+                       dt*inner(grad(p_curr - p_old), v)/rho(phi_curr, eps)*self.dx_bulk
 
         #Save matrix (that will not change during the computations) and declare vector
         self.A2_tris = assemble(self.a2_tris)
         self.b2_tris = PETScVector()
 
 
+    """Employ the geometric multigrid solvers for the velocity and the pressure systems of the ICT method
+       (to be called after the weak forms have been set, since the coarse forms are derived from the fine ones)"""
+    def set_multigrid(self, velocity_bcs):
+        self.linear_solvers['ICT_1'] = MultigridSolver(self.a2, self.V, self.coarse_meshes, velocity_bcs, 'gmres', \
+                                                       prefix = 'mg_velocity_')
+        self.linear_solvers['ICT_2'] = MultigridSolver(self.a2_bis, self.P, self.coarse_meshes, None, 'cg', \
+                                                       singular = True, prefix = 'mg_pressure_')
+
+
+    """Generate (or load from the cache) the code of all the weak forms declared so far,
+       so that the compilation is done before starting the time loop (the forms already compiled are skipped)"""
+    def compile_forms(self):
+        for name in ('a1', 'L1', 'L1_explicit', 'a1_reinit', 'L1_reinit', 'a2', 'L2', 'a2_bis', 'L2_bis', 'L2_tris', \
+                     'band_indicator', 'gradphi_indicator', 'thickness_indicator', 'perimeter_indicator', 'volume_indicator'):
+            if(isinstance(getattr(self, name, None), ufl.Form)):
+                Form(getattr(self, name))
+        if(getattr(self, 'F1_reinit', None) is not None):
+            Form(self.F1_reinit, form_compiler_parameters = {"optimize": True})
+            Form(self.J1_reinit, form_compiler_parameters = {"optimize": True})
+
+
     """Interior penalty method"""
     def IP(self, phi, l, mesh, alpha = 0.1):
         #Extract cell diameter and facets's normal
@@ -234,6 +713,13 @@ class TwoPhaseFlows():
         #Save the dimension of the problem
         self.n_dim = mesh.geometry().dim()
 
+        #Explicit transport needs only the action of the advection and stabilization operators
+        if(self.LS_solver != 'Implicit'):
+            self.a1 = None
+            self.L1 = None
+            self.LS_explicit_weak_form(l, phi_old, u_old, dt, mesh, method, param)
+            return
+
         #Declare weak formulation
         F1 = ((phi - phi_old)/dt + inner(u_old, grad(phi)))*l*dx
 
@@ -262,6 +748,46 @@ class TwoPhaseFlows():
         self.b1 = PETScVector()
 
 
+    """Level-set explicit weak formulation (right-hand side and lumped mass matrix)"""
+    def LS_explicit_weak_form(self, l, phi_old, u_old, dt, mesh, method, param = None):
+        #Save the quantities needed by the time-stepping
+        Q = phi_old.function_space()
+        self.phi_stage = Function(Q)
+        self.phi_n_LS  = Function(Q)
+        self.phi_old_LS = phi_old
+        self.u_transport_LS = u_old
+        self.dt_transport_LS = dt
+
+        #Declare the right-hand side evaluated at the current stage
+        F1 = -inner(u_old, grad(self.phi_stage))*l*dx
+
+        #Add stabilization term (if specified): for SUPG only the stationary part of the residual is kept
+        if(method == 'SUPG'):
+            assert param is not None, \
+            "Stabilization parameter not available in order to use SUPG stabilization (check the call of the function)"
+            h = CellDiameter(mesh)
+            F1 -= param*h/ufl.Max(2.0*sqrt(inner(u_old, u_old)),1.0e-3/h)* \
+                  inner(u_old, grad(self.phi_stage))*inner(u_old, grad(l))*dx
+        elif(method == 'IP'):
+            assert param is not None, \
+            "Stabilization parameter not available in order to use IP stabilization (check the call of the function)"
+            F1 -= self.IP(self.phi_stage, l, mesh, param)
+        self.L1_explicit = F1
+
+        #HRZ lumped mass matrix (row-sum lumping gives zero masses at the vertices of P2 triangles): on affine cells
+        #the scaling of the diagonal which preserves the mass of each cell is the same for all cells, so it is global
+        M = assemble(TrialFunction(Q)*l*dx)
+        self.ML_inv = Function(Q).vector()
+        M.get_diagonal(self.ML_inv)
+        self.ML_inv *= assemble(Constant(1.0)*dx(domain = mesh))/self.ML_inv.sum()
+        self.ML_inv.set_local(1.0/self.ML_inv.get_local())
+        self.ML_inv.apply('insert')
+
+        #Declare the vector for the right-hand side and save the minimum mesh size for the CFL condition
+        self.b1 = PETScVector()
+        self.h_min = MPI.min(mesh.mpi_comm(), mesh.hmin())
+
+
     """Weak form non-conservative reinitialization (hyperbolic version)"""
     def NCLSM_hyperbolic_weak_form(self, phi, l, phi0, phi_curr, dt_reinit, gamma_reinit, beta_reinit):
         #Check correctness of types
@@ -295,16 +821,276 @@ class TwoPhaseFlows():
         self.F1_reinit = (phi_intermediate - phi0)/dt_reinit*l*dx \
                        - phi_intermediate*(1.0 - phi_intermediate)*inner(grad(l), n_gamma)*dx \
                        + eps_reinit*inner(grad(phi_intermediate), n_gamma)*inner(grad(l), n_gamma)*dx
+        self.J1_reinit = derivative(self.F1_reinit, phi_intermediate)
+
+        #Build the nonlinear solver only once
+        problem = NonlinearVariationalProblem(self.F1_reinit, phi_intermediate, J = self.J1_reinit, \
+                                              form_compiler_parameters = {"optimize": True})
+        self.solver_reinit = NonlinearVariationalSolver(problem)
+        self.solver_reinit.parameters["newton_solver"].update({"linear_solver": self.solver_recon, "preconditioner": self.precon_recon, \
+                                                               "maximum_iterations": 20, "absolute_tolerance": 1e-8, \
+                                                               "relative_tolerance": 1e-6})
+
+
+    """Forms for the interface quality indicators (adaptive reinitialization)"""
+    def Reinit_indicator_forms(self, phi, eps, method):
+        #Check availability of the method before proceding
+        assert method in self.reinit_method_dict, "Reinitialization method(" + method + ") not available"
+
+        #Check the correctness of type
+        if(not isinstance(phi, Function)):
+            raise ValueError("phi must be an instance of Function")
+
+        #Declare the forms: for the signed distance we monitor the deviation of |grad(phi)| from 1 in the interface band,
+        #while for the conservative profile we monitor the thickness (the ratio between the integral of phi*(1 - phi)
+        #and the integral of |grad(phi)| is equal to eps for the exact hyperbolic tangent profile).
+        #The forms are compiled here, so that no form is built when the indicators are evaluated
+        if(method == 'Non_Conservative_Hyperbolic'):
+            band = conditional(lt(abs(phi), eps), 1.0, 0.0)
+            self.band_indicator = Form(band*dx)
+            self.gradphi_indicator = Form(band*(mgrad(phi) - 1.0)**2*dx)
+            self.volume_indicator = Form(conditional(lt(phi, 0.0), 1.0, 0.0)*dx)
+        elif(method == 'Conservative'):
+            self.thickness_indicator = Form(phi*(1.0 - phi)*dx)
+            self.perimeter_indicator = Form(mgrad(phi)*dx)
+            self.volume_indicator = Form(conditional(lt(phi, 0.5), 1.0, 0.0)*dx)
+
+        #Reference volume (updated after each reinitialization)
+        self.Vol_reinit = None
+
+
+    """Update the reference volume for the drift indicator (after initialization or reinitialization)"""
+    def reset_reinit_indicators(self):
+        self.Vol_reinit = assemble(self.volume_indicator)
+
+
+    """Check the interface quality and return the reason for reinitialization (None if it is not needed)"""
+    def check_reinit_need(self, method, eps, tol_gradphi, tol_thickness, tol_volume):
+        #Check the mass drift since last reinitialization
+        Vol = assemble(self.volume_indicator)
+        if(self.Vol_reinit is None):
+            self.Vol_reinit = Vol
+        drift = abs(Vol - self.Vol_reinit)/max(self.Vol_reinit, DOLFIN_EPS)
+        if(drift > tol_volume):
+            return "volume drift " + "{:.3e}".format(drift) + " > " + "{:.3e}".format(tol_volume)
+
+        #Check the profile of the level-set
+        if(method == 'Non_Conservative_Hyperbolic'):
+            band_area = assemble(self.band_indicator)
+            if(band_area > DOLFIN_EPS):
+                dev = np.sqrt(assemble(self.gradphi_indicator)/band_area)
+                if(dev > tol_gradphi):
+                    return "|grad(phi)| deviation " + "{:.3e}".format(dev) + " > " + "{:.3e}".format(tol_gradphi)
+        elif(method == 'Conservative'):
+            perimeter = assemble(self.perimeter_indicator)
+            if(perimeter > DOLFIN_EPS):
+                dev = abs(assemble(self.thickness_indicator)/(perimeter*float(eps)) - 1.0)
+                if(dev > tol_thickness):
+                    return "thickness deviation " + "{:.3e}".format(dev) + " > " + "{:.3e}".format(tol_thickness)
+
+        return None
+
+
+    """Read the stopping criteria from a comma separated list"""
+    def read_stopping_criteria(self, criteria, window, tol):
+        self.stop_criteria = set()
+        if(criteria.strip() != 'None'):
+            self.stop_criteria = {c.strip() for c in criteria.split(',')}
+
+        #Save the settings and allocate the in-memory series (only the last window + 1 samples are needed)
+        self.stop_window = window
+        self.stop_tol = tol
+        self.Vc_series  = deque(maxlen = window + 1)
+        self.Chi_series = deque(maxlen = window + 1)
+        self.Ek_series  = deque(maxlen = window + 1)
+        self.wall_sides = None
+
+
+    """Check whether a monitored series reached a plateau over the stopping window"""
+    def plateau_reached(self, series):
+        if(len(series) < self.stop_window + 1):
+            return False
+        ref = series[-1]
+        if(abs(ref) < DOLFIN_EPS):
+            return False
+        return np.max(np.abs(np.array(series) - ref)) <= self.stop_tol*abs(ref)
+
+
+    """Detect the local dofs of the level-set on the bottom and top walls and the side of the interface they lie on
+       (the sides are computed only if they are not already available, e.g. after a repartition)"""
+    def set_wall_monitor(self, phi, level, height, sides = None):
+        coords = phi.function_space().tabulate_dof_coordinates().reshape((-1, self.n_dim))
+        coords = coords[:phi.vector().local_size()]
+        self.wall_dofs = [np.where(np.isclose(coords[:,1], 0.0))[0], np.where(np.isclose(coords[:,1], height))[0]]
+        if(sides is not None):
+            self.wall_sides = sides
+            return
+        self.wall_sides = [self.wall_side(phi, dofs, level) for dofs in self.wall_dofs]
+        if(0 in self.wall_sides):
+            raise ValueError("The interface crosses the walls already at the beginning of the simulation")
+
+
+    """Return +1 (-1) if the level-set is above (below) the level on the given local dofs and 0 if the interface crosses them"""
+    def wall_side(self, phi, dofs, level):
+        values = phi.vector().get_local()[dofs]
+        phi_min = MPI.min(self.comm, float(np.min(values)) if values.size > 0 else np.inf)
+        phi_max = MPI.max(self.comm, float(np.max(values)) if values.size > 0 else -np.inf)
+        if(phi_min > level):
+            return 1
+        if(phi_max < level):
+            return -1
+        return 0
+
+
+    """Extract the interface as the iso-contour phi = level on the owned cells and combine the geometry of all
+       the processes (the optional velocity is averaged over the region phi < level)"""
+    def interface_geometry(self, phi, level, u = None):
+        mesh = phi.function_space().mesh()
+        n_owned = mesh.topology().ghost_offset(mesh.topology().dim())
+        fields = None if u is None else u.compute_vertex_values(mesh).reshape(mesh.geometry().dim(), -1).T
+        partial = extract_interface(mesh.coordinates(), mesh.cells()[:n_owned], phi.compute_vertex_values(mesh), level, fields)
+        partial.pop('segments')
+        return geometry_summary(combine_geometries(mesh.mpi_comm().allgather(partial)))
+
+
+    """Velocity at the vertices of the band |phi - level| < delta (each shared vertex is taken only by the process
+       with the lowest rank among the ones sharing it): return an array with rows x y u_x u_y"""
+    def band_velocity(self, phi, level, u, delta):
+        mesh = phi.function_space().mesh()
+        rank = MPI.rank(mesh.mpi_comm())
+        owned = np.ones(mesh.num_vertices(), dtype = bool)
+        for (vertex, procs) in mesh.topology().shared_entities(0).items():
+            owned[vertex] = rank < min(procs)
+        in_band = np.logical_and(owned, np.abs(phi.compute_vertex_values(mesh) - level) < delta)
+        u_values = u.compute_vertex_values(mesh).reshape(mesh.geometry().dim(), -1).T
+        return np.hstack([mesh.coordinates()[in_band], u_values[in_band]])
+
+
+    """Append the extracted interface (and optionally the velocity in the band |phi - level| < delta)
+       to the compact interface stream"""
+    def save_interface(self, phi, level, t, u = None, delta = None):
+        mesh = phi.function_space().mesh()
+        n_owned = mesh.topology().ghost_offset(mesh.topology().dim())
+        segments = extract_interface(mesh.coordinates(), mesh.cells()[:n_owned], phi.compute_vertex_values(mesh), level)['segments']
+        velocity_points = self.band_velocity(phi, level, u, delta) if u is not None else None
+        self.interface_writer.write(t, segments, velocity_points)
+
+
+    """Append a row with the geometry of the interface to the geometry series
+       (time, area, perimeter, circularity, centroid, bounding box)"""
+    def save_geometry(self, geometry, t):
+        if(MPI.rank(self.comm) == 0):
+            row = [t, geometry['area'], geometry['perimeter'], geometry['circularity']] + \
+                  list(geometry['centroid']) + list(geometry['bbox'])
+            with open(self.geometry_file, 'ab') as f:
+                np.savetxt(f, [row])
+
+
+    """Flag the local cells (ghosts included) intersecting the band |phi - level| < delta: the range of the vertex values
+       of each cell is enlarged by the given fraction of itself to account for the higher order level-set inside the cell"""
+    def interface_cells(self, phi, level, delta, margin = 0.0):
+        mesh = phi.function_space().mesh()
+        values = phi.compute_vertex_values(mesh)[mesh.cells()]
+        (v_min, v_max) = (np.min(values, axis = 1), np.max(values, axis = 1))
+        pad = margin*(v_max - v_min)
+        return np.logical_and(v_min - pad < level + delta, v_max + pad > level - delta)
+
+
+    """Set the measures for the Navier-Stokes forms: the bulk terms employ the given quadrature degree (automatic if 0),
+       while the interface terms are integrated only over the cells of the interface band (marked with 1).
+       All the cells are marked until the band is computed by 'update_band'"""
+    def set_integration_measures(self, mesh, bulk_degree):
+        self.band_markers = MeshFunction("size_t", mesh, mesh.topology().dim(), 1)
+        self.dx_interface = Measure("dx", domain = mesh, subdomain_data = self.band_markers)(1)
+        self.dx_bulk = Measure("dx", domain = mesh, metadata = {"quadrature_degree": bulk_degree}) if bulk_degree > 0 else \
+                       Measure("dx", domain = mesh)
+
+
+    """Mark the cells of the band |phi - level| < delta where the interface terms are integrated (the markers are
+       shared by the compiled forms, so no form has to be rebuilt)"""
+    def update_band(self, phi, level, delta):
+        self.band_markers.array()[:] = self.interface_cells(phi, level, delta, margin = 0.5)
 
 
     """Build and solve the system for Level set transport"""
     def solve_Levelset_system(self, phi_curr):
-        #Assemble matrix and right-hand side
-        assemble(self.a1, tensor = self.A1)
-        assemble(self.L1, tensor = self.b1)
+        if(self.LS_solver != 'Implicit'):
+            self.solve_Levelset_explicit(phi_curr)
+            self.mark_changed(phi_curr)
+            return
+
+        #Assemble matrix (if its coefficients changed) and right-hand side
+        with self.timed('assembly'):
+            self.assembly_cache.assemble('A1', self.a1, self.A1)
+            assemble(self.L1, tensor = self.b1)
 
         #Solve the level-set system
-        solve(self.A1, phi_curr.vector(), self.b1, self.solver_Levset, self.precon_Levset)
+        with self.timed('solve'):
+            self.solve_linear('Levelset', self.A1, phi_curr.vector(), self.b1, self.solver_Levset, self.precon_Levset)
+        self.mark_changed(phi_curr)
+
+
+    """Advance the level-set with an explicit SSP Runge-Kutta scheme (sub-cycled to satisfy the CFL condition)"""
+    def solve_Levelset_explicit(self, phi_curr):
+        #Compute the number of sub-steps (the maximum nodal component of the velocity is employed)
+        dt = float(self.dt_transport_LS)
+        u_max = self.u_transport_LS.vector().norm('linf')
+        n_sub = max(1, int(np.ceil(dt*u_max/(self.LS_CFL*self.h_min))))
+        dt_sub = dt/n_sub
+
+        #The vector operations update only the owned entries, so the ghost values are refreshed after each stage
+        #(the assembly of the next stage reads them)
+        phi_curr.assign(self.phi_old_LS)
+        x = phi_curr.vector()
+        x.apply('insert')
+        for k in range(n_sub):
+            self.phi_n_LS.assign(phi_curr)
+            for a in self.SSP_RK_coefficients[self.LS_solver]:
+                #Assemble the action of the operators on the current stage
+                self.phi_stage.assign(phi_curr)
+                self.phi_stage.vector().apply('insert')
+                with self.timed('assembly'):
+                    assemble(self.L1_explicit, tensor = self.b1)
+
+                #Update with the inverse of the lumped mass matrix
+                with self.timed('solve'):
+                    self.b1 *= self.ML_inv
+                    x.axpy(dt_sub, self.b1)
+                    if(a > 0.0):
+                        x *= 1.0 - a
+                        x.axpy(a, self.phi_n_LS.vector())
+                    x.apply('insert')
+
+
+    """Advance the level-set with the sub-steps of a macro step: the transport velocity is interpolated linearly in time
+       between 'u_start' and u_end at the midpoint of each sub-step and the level-set is reinitialized when needed"""
+    def advance_levelset_subcycled(self, u_end):
+        for k in range(self.LS_subcycles):
+            begin(int(LogLevel.INFO) + 1,"Solving Level-set (sub-step " + str(k + 1) + ")")
+            self.interpolate_velocity(self.u_LS, self.u_start, u_end, (k + 0.5)/self.LS_subcycles)
+            self.solve_Levelset_system(self.phi_curr)
+            end()
+            self.n_LS_iter += 1
+
+            #Reinitialization is driven by the number of level-set steps (or by the interface quality)
+            reason = self.reinit_reason()
+            if(reason is not None):
+                self.solve_reinit(reason)
+            self.phi_old.assign(self.phi_curr)
+            self.mark_changed(self.phi_old)
+
+
+    """Interpolate linearly in time the velocity transporting the level-set (sub-cycling)"""
+    def interpolate_velocity(self, u_LS, u_start, u_end, theta):
+        #Check the correctness of type
+        if(not isinstance(u_LS, Function)):
+            raise ValueError("u_LS must be an instance of Function")
+
+        #Compute u_LS = (1 - theta)*u_start + theta*u_end directly on the vectors
+        u_LS.vector().zero()
+        u_LS.vector().axpy(1.0 - theta, u_start.vector())
+        u_LS.vector().axpy(theta, u_end.vector())
+        self.mark_changed(u_LS)
 
 
     """Build and solve the system for Level set hyperbolic reinitialization (non-conservative)"""
@@ -316,12 +1102,13 @@ class TwoPhaseFlows():
         E_old = 1e10
         for n in range(n_subiters):
             #Assemble and solve the system
-            assemble(self.L1_reinit, tensor = self.b1_reinit)
-            solve(self.A1_reinit, phi_intermediate.vector(), self.b1_reinit, self.solver_recon , self.precon_recon)
+            with self.timed('assembly'):
+                assemble(self.L1_reinit, tensor = self.b1_reinit)
+            with self.timed('solve'):
+                self.solve_linear('Reinit', self.A1_reinit, phi_intermediate.vector(), self.b1_reinit, self.solver_recon, self.precon_recon)
 
             #Compute the L2-error and check no divergence
-            error = (((phi_intermediate - phi0)/dt_reinit)**2)*dx
-            E = sqrt(assemble(error))
+            E = sqrt(assemble(self.reinit_error_form(phi_intermediate, phi0, dt_reinit)))
 
             if(E_old < E):
                 raise RuntimeError("Divergence at the reinitialization level (iteration " + str(n + 1) + ")")
@@ -333,6 +1120,7 @@ class TwoPhaseFlows():
 
         #Assign the reinitialized level-set to the current solution
         phi_curr.assign(phi_intermediate)
+        self.mark_changed(phi_curr, phi_intermediate, phi0)
 
 
     """Build and solve the system for Level set reinitialization (conservative)"""
@@ -343,14 +1131,11 @@ class TwoPhaseFlows():
         #Start the loop
         for n in range(n_subiters):
             #Solve the system
-            solve(self.F1_reinit == 0, phi_intermediate, \
-                  solver_parameters={"newton_solver": {"linear_solver": self.solver_recon, "preconditioner": self.precon_recon,\
-                                     "maximum_iterations": 20, "absolute_tolerance": 1e-8, "relative_tolerance": 1e-6}}, \
-                  form_compiler_parameters={"optimize": True})
+            with self.timed('solve'):
+                self.solver_reinit.solve()
 
             #Check if convergence has been reached
-            error = (((phi_intermediate - phi0)/dt_reinit)**2)*dx
-            E = sqrt(assemble(error))
+            E = sqrt(assemble(self.reinit_error_form(phi_intermediate, phi0, dt_reinit)))
             if(E < tol):
                 break
 
@@ -359,42 +1144,51 @@ class TwoPhaseFlows():
 
         #Assign the reinitialized level-set to the current solution
         phi_curr.assign(phi_intermediate)
+        self.mark_changed(phi_curr, phi_intermediate, phi0)
+
+
+    """Assemble matrix and right-hand side of the (first) Navier-Stokes system in a single pass over the mesh
+       with the boundary conditions applied symmetrically (only the right-hand side if the matrix can be reused)"""
+    def assemble_NS_system(self, bcs):
+        with self.timed('assembly'):
+            if(self.NS_assembler is None):
+                self.NS_assembler = SystemAssembler(self.a2, self.L2, bcs)
+            if(self.assembly_cache.needs_assembly('A2', self.a2, self.A2)):
+                self.NS_assembler.assemble(self.A2, self.b2)
+            else:
+                self.NS_assembler.assemble(self.b2)
 
 
     """Build and solve the system for Navier-Stokes part using Standard method"""
     def solve_Standard_NS_system(self, bcs, w_curr):
-        #Assemble matrices and right-hand sides
-        assemble(self.a2, tensor = self.A2)
-        assemble(self.L2, tensor = self.b2)
-
-        #Apply boundary conditions
-        for bc in bcs:
-            bc.apply(self.A2)
-            bc.apply(self.b2)
+        #Assemble matrix and right-hand side
+        self.assemble_NS_system(bcs)
 
         #Solve the system
-        solve(self.A2, w_curr.vector(), self.b2, self.solver_Standard_NS, self.precon_Standard_NS)
+        with self.timed('solve'):
+            self.solve_linear('Standard_NS', self.A2, w_curr.vector(), self.b2, self.solver_Standard_NS, self.precon_Standard_NS)
+        self.mark_changed(w_curr)
 
 
     """Build and solve the system for Navier-Stokes part using ICT method"""
     def solve_ICT_NS_systems(self, bcs, u_curr, p_curr):
         #Assemble matrix and right-hand side for the first step
-        assemble(self.a2, tensor = self.A2)
-        assemble(self.L2, tensor = self.b2)
-
-        #Apply boundary conditions
-        for bc in bcs:
-            bc.apply(self.A2)
-            bc.apply(self.b2)
+        self.assemble_NS_system(bcs)
 
         #Solve the first system
-        solve(self.A2, u_curr.vector(), self.b2, self.solver_ICT_1, self.precon_ICT_1)
+        with self.timed('solve'):
+            self.solve_linear('ICT_1', self.A2, u_curr.vector(), self.b2, self.solver_ICT_1, self.precon_ICT_1)
 
         #Assemble and solve the second system
-        assemble(self.a2_bis, tensor = self.A2_bis)
-        assemble(self.L2_bis, tensor = self.b2_bis)
-        solve(self.A2_bis, p_curr.vector(), self.b2_bis, self.solver_ICT_2, self.precon_ICT_2)
+        with self.timed('assembly'):
+            self.assembly_cache.assemble('A2_bis', self.a2_bis, self.A2_bis)
+            assemble(self.L2_bis, tensor = self.b2_bis)
+        with self.timed('solve'):
+            self.solve_linear('ICT_2', self.A2_bis, p_curr.vector(), self.b2_bis, self.solver_ICT_2, self.precon_ICT_2)
 
         #Assemble and solve the third system
-        assemble(self.L2_tris, tensor = self.b2_tris)
-        solve(self.A2_tris, u_curr.vector(), self.b2_tris, self.solver_ICT_3, self.precon_ICT_3)
+        with self.timed('assembly'):
+            assemble(self.L2_tris, tensor = self.b2_tris)
+        with self.timed('solve'):
+            self.solve_linear('ICT_3', self.A2_tris, u_curr.vector(), self.b2_tris, self.solver_ICT_3, self.precon_ICT_3)
+        self.mark_changed(u_curr, p_curr)
@@ -1,6 +1,40 @@
+import os
 from sys import argv
+
+"""Read the directory for the cache of the compiled forms from the configuration file without DOLFIN
+   ('Default' if it is not given)"""
+def jit_cache_directory(config_file):
+    with open(config_file, "r") as f:
+        for line in f.read().splitlines():
+            if(line.startswith("JIT_Cache_Directory = ")):
+                return line[len("JIT_Cache_Directory = ") :]
+    return 'Default'
+
+
+#Set the directory for the cache of the compiled forms (it can be shared among runs and filled by 'precompile.py')
+#before DOLFIN is imported, since the JIT parameters are fixed at the import (when this module is imported,
+#e.g. by 'precompile.py', the caller sets it)
+if(__name__ == "__main__" and len(argv) <= 2):
+    config_file = argv[1] if len(argv) == 2 else "test.cfg"
+    cache_dir = jit_cache_directory(config_file) if os.path.isfile(config_file) else 'Default'
+    if(cache_dir != 'Default'):
+        os.environ["DIJITSO_CACHE_DIR"] = os.path.abspath(cache_dir)
+
 from Bubble_move import *
 from Rayleigh_Taylor import *
+from Ensemble import *
+
+"""Build the right problem according to the parameters"""
+def build_problem(param_handler, config_file = None):
+    if(param_handler["Problem"] == 'Bubble'):
+        return BubbleMove(param_handler)
+    elif(param_handler["Problem"] == 'RT'):
+        if(param_handler["Ensemble_Atwood_numbers"] != 'None' and config_file is not None):
+            return RayleighTaylorEnsemble(config_file)
+        return RayleighTaylor(param_handler)
+    else:
+        raise ValueError("Unknown problem type. Please check configuration file")
+
 
 def main():
     if(len(argv) == 2):
@@ -14,16 +48,9 @@ def main():
     param_handler = My_Parameters(config_file).get_param()
 
     #Build the right problem
-    if(param_handler["Problem"] == 'Bubble'):
-        sim = BubbleMove(param_handler)
-        #Save also the communicator for future printing purporses
-        comm = sim.get_communicator()
-    elif(param_handler["Problem"] == 'RT'):
-        sim = RayleighTaylor(param_handler)
-        #Save also the communicator for future printing purporses
-        comm = sim.get_communicator()
-    else:
-        raise ValueError("Unknown problem type. Please check configuration file")
+    sim = build_problem(param_handler, config_file)
+    #Save also the communicator for future printing purporses
+    comm = sim.get_communicator()
 
     #Run the simulation
     try:
@@ -1,108 +1,228 @@
 import os
 import sys
+import glob
+import argparse
+import itertools
 import numpy as np
-import matplotlib.pyplot as plt
-
-#Find the name of the file you eant post-process: if no argument is present supply with a default one
-nargin = len(sys.argv)
-if(nargin == 2):
-    filename = sys.argv[1]
-elif(nargin == 1):
-    filename = 'test.cfg'
-else:
-    print("Too many input arguments")
-    sys.exit(1)
-
-#Initialize saving directory and reinitialization type with the default choices of the code
-saving_dir = 'Sim'
-reinit_type = 'Non_Conservative_Hyperbolic'
-
-#Read the file passed in input
-config_file = open(filename, "r")
-found_dir = False #Flag to check if we found the name of the directory
-found_reinit = False #Flag to check if we found the type of reinitialization
-for line in config_file.read().splitlines():
-    if('Saving_Directory' in line):
-        found_dir = True
-        saving_dir = line[19::]
-    elif('Reinit_Type' in line):
-        found_reinit = True
-        reinit_type = line[14::]
-    if(found_dir == True and found_reinit == True):
-        break
-
-#Close the file
-config_file.close()
-
-#Read the file found
-datafile = os.getcwd() + '/' + saving_dir + '/benchmark_series.dat'
-data = np.loadtxt(datafile)
-if(reinit_type == 'Non_Conservative_Hyperbolic'):
-    assert np.size(data) % 8 == 0, 'Wrong number of values in the file'
-    t = data[0::8]
-    Vol = data[1::8]
-    chi = data[2::8]
-    Xc = data[3::8]
-    Yc = data[4::8]
-    Uc = data[5::8]
-    Vc = data[6::8]
-    L2_grad_phi = data[7::8]
-elif(reinit_type == 'Conservative'):
-    assert np.size(data) % 7 == 0, 'Wrong number of values in the file'
-    t = data[0::7]
-    Vol = data[1::7]
-    chi = data[2::7]
-    Xc = data[3::7]
-    Yc = data[4::7]
-    Uc = data[5::7]
-    Vc = data[6::7]
-
-#Plot volume behaviour
-plt.figure()
-plt.plot(t,Vol)
-plt.xlabel('t')
-plt.ylabel('Area')
-plt.title('Area evolution in time',fontweight="bold")
-
-#Plot circularity behaviour
-plt.figure()
-plt.plot(t,chi)
-plt.xlabel('t')
-plt.ylabel('Circularity')
-plt.title('Degree of circularity evolution in time',fontweight="bold")
-
-#Plot horizontal component for centroid and rising velocity
-plt.figure()
-plt.subplot(1,2,1)
-plt.plot(t,Xc)
-plt.xlabel('t')
-plt.ylabel('$x_c$')
-plt.title('Time evolution of $x_c$ coordinate of the centroid',fontweight="bold")
-plt.subplot(1,2,2)
-plt.plot(t,Uc)
-plt.xlabel('t')
-plt.ylabel('$u_c$')
-plt.title('Time evolution of $u_c$ coordinate of the rising velocity',fontweight="bold")
-
-#Plot vertical component for centroid and rising velocity
-plt.figure()
-plt.subplot(1,2,1)
-plt.plot(t,Yc)
-plt.xlabel('t')
-plt.ylabel('$y_c$')
-plt.title('Time evolution of $y_c$ coordinate of the centroid',fontweight="bold")
-plt.subplot(1,2,2)
-plt.plot(t,Vc)
-plt.xlabel('t')
-plt.ylabel('$v_c$')
-plt.title('Time evolution of $v_c$ coordinate of the rising velocity',fontweight="bold")
-
-#Plot grad_phi if necessary
-if(reinit_type == 'Non_Conservative_Hyperbolic'):
-    plt.figure()
-    plt.plot(t,L2_grad_phi)
+
+from Reference_Benchmark import *
+
+#Names of the columns of the benchmark series of the rising bubble (the last one only for the non-conservative method)
+BENCHMARK_COLUMNS = ['t', 'Vol', 'chi', 'Xc', 'Yc', 'Uc', 'Vc', 'L2_grad_phi']
+
+#Names of the columns of the geometry series of the extracted interface
+GEOMETRY_COLUMNS = ['t', 'area', 'perimeter', 'circularity', 'Xc', 'Yc', 'x_min', 'x_max', 'y_min', 'y_max']
+
+"""Read the configuration file as a dictionary"""
+def read_config(filename):
+    options = {}
+    with open(filename, "r") as config_file:
+        for line in config_file.read().splitlines():
+            idx_eq = line.find(' = ')
+            if(idx_eq != -1):
+                options[line[0 : idx_eq]] = line[idx_eq + 3 :]
+    return options
+
+
+"""Read a text series processing the file in chunks of lines (one or more values per line): return the complete
+   records as rows (an incomplete last record, e.g. of a simulation which has been stopped, is discarded)"""
+def read_text_series(filename, n_columns, chunk_lines = 1000000):
+    chunks = []
+    with open(filename, "r") as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_lines))
+            if(not lines):
+                break
+            chunks.append(np.array(''.join(line for line in lines if not line.startswith('#')).split(), dtype = np.float64))
+    data = np.concatenate(chunks) if chunks else np.empty(0)
+    n_rows = len(data)//n_columns
+    return data[: n_rows*n_columns].reshape(n_rows, n_columns)
+
+
+"""Memory-map a binary series of float64 records"""
+def read_binary_series(filename, n_columns):
+    if(os.path.getsize(filename) == 0):
+        return np.empty((0, n_columns))
+    data = np.memmap(filename, dtype = np.float64, mode = 'r')
+    n_rows = len(data)//n_columns
+    return data[: n_rows*n_columns].reshape(n_rows, n_columns)
+
+
+"""Names of the columns of the benchmark series of a run: they are read from 'benchmark_columns.dat' (written by the run,
+   so runs with different reinitialization methods can be mixed in a sweep), otherwise the first n_columns are taken.
+   The runs with reference series ('Reference_Series') add the running errors after the benchmark quantities,
+   three columns for each quantity (e.g. 'Vc_L1', 'Vc_L2' and 'Vc_Linf')"""
+def benchmark_columns(directory, n_columns):
+    if(os.path.isfile(directory + '/benchmark_columns.dat')):
+        with open(directory + '/benchmark_columns.dat', "r") as f:
+            return f.read().split()
+    return BENCHMARK_COLUMNS[: n_columns]
+
+
+"""Load the series of a run: return a dictionary with a dictionary of columns for the benchmark series
+   and for the geometry series (None if not available). The number of columns of the benchmark series
+   is employed only for the runs which do not save the names of the columns"""
+def load_run(directory, n_benchmark_columns):
+    run = {'name': directory, 'benchmark': None, 'geometry': None}
+    columns = benchmark_columns(directory, n_benchmark_columns)
+    if(os.path.isfile(directory + '/benchmark_series.bin')):
+        data = read_binary_series(directory + '/benchmark_series.bin', len(columns))
+    elif(os.path.isfile(directory + '/benchmark_series.dat')):
+        data = read_text_series(directory + '/benchmark_series.dat', len(columns))
+    else:
+        data = None
+    if(data is not None):
+        run['benchmark'] = dict(zip(columns, data.T))
+    if(os.path.isfile(directory + '/geometry_series.dat')):
+        data = read_text_series(directory + '/geometry_series.dat', len(GEOMETRY_COLUMNS))
+        run['geometry'] = dict(zip(GEOMETRY_COLUMNS, data.T))
+    return run
+
+
+"""Find the runs of a sweep: all the sub-directories (at any depth) containing a series"""
+def find_runs(sweep_dir):
+    runs = set()
+    for pattern in ('benchmark_series.dat', 'benchmark_series.bin', 'geometry_series.dat'):
+        runs.update(os.path.dirname(f) for f in glob.glob(sweep_dir + '/**/' + pattern, recursive = True))
+    return sorted(runs)
+
+
+"""Terminal velocity: mean of the velocity over the final fraction of the time interval"""
+def terminal_velocity(t, v, window = 0.1):
+    mask = t >= t[-1] - window*(t[-1] - t[0])
+    return np.mean(v[mask])
+
+
+"""Exponential growth rate of the amplitude (fit of its logarithm) over the initial phase in which
+   the amplitude does not exceed max_ratio times the initial one"""
+def growth_rate(t, amplitude, max_ratio = 5.0):
+    mask = np.logical_and(amplitude > 0.0, amplitude <= max_ratio*amplitude[0])
+    if(np.sum(mask) < 2):
+        return np.nan
+    return np.polyfit(t[mask], np.log(amplitude[mask]), 1)[0]
+
+
+"""Derived quantities of a run"""
+def derived_quantities(run):
+    quantities = {}
+    series = run['benchmark']
+    if(series is not None and len(series['t']) > 0):
+        t = series['t']
+        quantities['terminal_velocity'] = terminal_velocity(t, series['Vc'])
+        k = np.argmax(series['Vc'])
+        quantities['rise_velocity_max'] = series['Vc'][k]
+        quantities['t_rise_velocity_max'] = t[k]
+        k = np.argmin(series['chi'])
+        quantities['circularity_min'] = series['chi'][k]
+        quantities['t_circularity_min'] = t[k]
+        quantities['yc_final'] = series['Yc'][-1]
+    series = run['geometry']
+    if(series is not None and len(series['t']) > 1):
+        quantities['growth_rate'] = growth_rate(series['t'], 0.5*(series['y_max'] - series['y_min']))
+        quantities['bubble_tip_final'] = series['y_max'][-1]
+        quantities['spike_tip_final'] = series['y_min'][-1]
+    return quantities
+
+
+"""Plot a quantity for all the runs in the same figure and save it"""
+def plot_overlay(plt, runs, series_name, column, ylabel, title, filename):
+    fig = plt.figure()
+    for run in runs:
+        series = run[series_name]
+        if(series is not None and column in series):
+            plt.plot(series['t'], series[column], label = run['label'])
     plt.xlabel('t')
-    plt.ylabel('grad($\phi$)')
-    plt.title('Time evolution of average grad($\phi$)',fontweight="bold")
+    plt.ylabel(ylabel)
+    plt.title(title, fontweight = "bold")
+    if(len(runs) > 1):
+        plt.legend(fontsize = 'small')
+    fig.savefig(filename, dpi = 150)
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Post-process the benchmark and geometry series of one or more runs")
+    parser.add_argument("config_file", nargs = '?', default = 'test.cfg', help = "configuration file of the runs ('test.cfg' by default)")
+    parser.add_argument("--sweep", default = None, help = "directory containing several runs (all the sub-directories with a series)")
+    parser.add_argument("--output", default = None, help = "directory for the plots and the summary (by default 'plots' in the saving directory)")
+    parser.add_argument("--reference", action = 'append', default = [], \
+                        help = "reference series as column=file (two columns: time and value), e.g. Vc=velocity.dat")
+    parser.add_argument("--benchmark", default = None, choices = sorted(BENCHMARK_QUANTITIES.keys()), \
+                        help = "compare with the reference values of a rising bubble benchmark")
+    parser.add_argument("--show", action = 'store_true', help = "show the figures interactively")
+    args = parser.parse_args()
+
+    #Render to files unless the figures have to be shown
+    import matplotlib
+    if(not args.show):
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    #Read the configuration file (the reinitialization type fixes the number of columns of the benchmark series
+    #of the runs which do not save the names of their columns)
+    try:
+        config = read_config(args.config_file)
+    except IOError:
+        print("Configuration file '" + args.config_file + "' not found")
+        sys.exit(1)
+    saving_dir = config.get('Saving_Directory', 'Sim')
+    n_columns = 8 if config.get('Reinit_Type', 'Non_Conservative_Hyperbolic') == 'Non_Conservative_Hyperbolic' else 7
+
+    #Load the runs
+    directories = find_runs(args.sweep) if args.sweep is not None else [os.getcwd() + '/' + saving_dir]
+    runs = [load_run(directory, n_columns) for directory in directories]
+    runs = [run for run in runs if run['benchmark'] is not None or run['geometry'] is not None]
+    if(not runs):
+        print("No series found")
+        sys.exit(1)
+    base_dir = args.sweep if args.sweep is not None else directories[0]
+    for run in runs:
+        run['label'] = os.path.relpath(run['name'], base_dir) if args.sweep is not None else saving_dir
+    output_dir = args.output if args.output is not None else base_dir + '/plots'
+    os.makedirs(output_dir, exist_ok = True)
+
+    #Plot the series
+    plots = [('benchmark', 'Vol', 'Area', 'Area evolution in time', 'area.png'), \
+             ('benchmark', 'chi', 'Circularity', 'Degree of circularity evolution in time', 'circularity.png'), \
+             ('benchmark', 'Xc', '$x_c$', 'Time evolution of $x_c$ coordinate of the centroid', 'xc.png'), \
+             ('benchmark', 'Uc', '$u_c$', 'Time evolution of $u_c$ coordinate of the rising velocity', 'uc.png'), \
+             ('benchmark', 'Yc', '$y_c$', 'Time evolution of $y_c$ coordinate of the centroid', 'yc.png'), \
+             ('benchmark', 'Vc', '$v_c$', 'Time evolution of $v_c$ coordinate of the rising velocity', 'vc.png'), \
+             ('benchmark', 'L2_grad_phi', 'grad($\\phi$)', 'Time evolution of average grad($\\phi$)', 'grad_phi.png'), \
+             ('geometry', 'y_max', 'Bubble tip', 'Time evolution of the bubble tip', 'bubble_tip.png'), \
+             ('geometry', 'y_min', 'Spike tip', 'Time evolution of the spike tip', 'spike_tip.png')]
+    for (series_name, column, ylabel, title, filename) in plots:
+        if(any(run[series_name] is not None and column in run[series_name] for run in runs)):
+            fig = plot_overlay(plt, runs, series_name, column, ylabel, title, output_dir + '/' + filename)
+            if(not args.show):
+                plt.close(fig)
+
+    #Compute the derived quantities and the errors with respect to the references
+    references = {}
+    for item in args.reference:
+        (column, filename) = item.split('=', 1)
+        references[column] = load_reference_series(filename)
+    lines = []
+    for run in runs:
+        quantities = derived_quantities(run)
+        for (column, (t_ref, values_ref)) in references.items():
+            if(run['benchmark'] is not None and column in run['benchmark']):
+                for (norm, value) in error_norms(run['benchmark']['t'], run['benchmark'][column], t_ref, values_ref).items():
+                    quantities['error_' + column + '_' + norm] = value
+        if(args.benchmark is not None):
+            for (key, value) in benchmark_deviations(quantities, args.benchmark).items():
+                quantities['deviation_' + key] = value
+        lines.append(run['label'] + ": " + ", ".join(key + " = " + "{:.6g}".format(value) for (key, value) in quantities.items()))
+
+    #Print and save the summary
+    summary = "\n".join(lines)
+    print(summary)
+    with open(output_dir + '/summary.dat', "w") as f:
+        f.write(summary + "\n")
+
+    if(args.show):
+        plt.show()
+
 
-plt.show()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+
+from Default_Parameters import *
+
+"""Read the configuration file as a list of (key, value) pairs preserving the order"""
+def read_config(filename):
+    options = []
+    with open(filename, "r") as config_file:
+        for line in config_file.read().splitlines():
+            idx_eq = line.find(' = ')
+            if(idx_eq != -1):
+                options.append((line[0 : idx_eq], line[idx_eq + 3 :]))
+    return options
+
+
+"""Write a configuration file overriding some options"""
+def write_config(filename, options, overrides):
+    with open(filename, "w") as config_file:
+        for (key, value) in options:
+            if(key not in overrides):
+                config_file.write(key + " = " + value + "\n")
+        for (key, value) in overrides.items():
+            config_file.write(key + " = " + str(value) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Generate the code of all the forms for the given combinations of settings \
+                                                    and store it in a shared cache directory")
+    parser.add_argument("config_file", help = "configuration file of the problem (physical parameters are part of the forms)")
+    parser.add_argument("--cache-dir", default = None, help = "cache directory (by default 'JIT_Cache_Directory' of the configuration file)")
+    parser.add_argument("--degrees", default = None, help = "comma separated list of values for 'Polynomial_degree'")
+    parser.add_argument("--ns-procedures", default = None, help = "comma separated list of values for 'NS_Procedure'")
+    parser.add_argument("--reinit-types", default = None, help = "comma separated list of values for 'Reinit_Type'")
+    parser.add_argument("--stabilizations", default = None, help = "comma separated list of values for 'Stabilization_Type'")
+    args = parser.parse_args()
+
+    #Detect the cache directory: it has to be known before importing DOLFIN
+    options = read_config(args.config_file)
+    cache_dir = args.cache_dir if args.cache_dir is not None else dict(options).get('JIT_Cache_Directory', 'Default')
+    if(cache_dir == 'Default'):
+        print("No cache directory specified (use --cache-dir or 'JIT_Cache_Directory' in the configuration file)")
+        sys.exit(1)
+    cache_dir = os.path.abspath(cache_dir)
+    os.environ["DIJITSO_CACHE_DIR"] = cache_dir
+
+    from main import build_problem
+    from My_Parameters import My_Parameters
+
+    #Build the combinations of settings (the values of the configuration file are used for the options not specified)
+    choices = []
+    for (key, arg) in (('Polynomial_degree', args.degrees), ('NS_Procedure', args.ns_procedures), \
+                       ('Reinit_Type', args.reinit_types), ('Stabilization_Type', args.stabilizations)):
+        if(arg is not None):
+            choices.append([(key, value.strip()) for value in arg.split(',')])
+        elif(key in dict(options)):
+            choices.append([(key, dict(options)[key])])
+
+    #Run one step of each combination on a small mesh: the code of the forms does not depend on the resolution,
+    #which is the smallest one (at least 8 x 16) compatible with the continuation and with the multigrid levels
+    defaults = dict(DEFAULT_PARAMETERS)
+    factor = max(convert_value(defaults['Continuation_Coarsening'], dict(options).get('Continuation_Coarsening', '1')), 1)
+    levels = max(convert_value(defaults['Multigrid_Levels'], dict(options).get('Multigrid_Levels', '1')), 1)
+    unit = factor*2**(levels - 1)
+    (nx, ny) = (unit*math.ceil(8/unit), unit*math.ceil(16/unit))
+    tmp_dir = tempfile.mkdtemp(prefix = 'precompile_')
+    try:
+        for combination in itertools.product(*choices):
+            overrides = dict(combination)
+            overrides.update({'JIT_Cache_Directory': cache_dir, 'Saving_Directory': os.path.relpath(tmp_dir), \
+                              'Number_vertices_x': nx, 'Number_vertices_y': ny, 'Maximum_steps': 1, \
+                              'Reinitialization_Frequency': 1, 'Log_Level': 30})
+            if(overrides.get('NS_Procedure', dict(options).get('NS_Procedure', defaults['NS_Procedure'])) != 'ICT'):
+                overrides['Multigrid_Levels'] = 1 #The geometric multigrid is available only for the ICT method
+            config_file = tmp_dir + '/precompile.cfg'
+            write_config(config_file, options, overrides)
+
+            t_start = time.perf_counter()
+            sim = build_problem(My_Parameters(config_file).get_param())
+            sim.run()
+            print("Compiled forms for " + str(dict(combination)) + " in " + "{:.3f}".format(time.perf_counter() - t_start) + " s")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors = True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import subprocess
+
+"""Read the configuration file as a list of (key, value) pairs preserving the order"""
+def read_config(filename):
+    options = []
+    with open(filename, "r") as config_file:
+        for line in config_file.read().splitlines():
+            idx_eq = line.find(' = ')
+            if(idx_eq != -1):
+                options.append((line[0 : idx_eq], line[idx_eq + 3 :]))
+    return options
+
+
+"""Write a configuration file for a run of the scaling study"""
+def write_config(filename, options, saving_dir, n_steps):
+    with open(filename, "w") as config_file:
+        for (key, value) in options:
+            if(key not in {'Saving_Directory', 'Profiling', 'Maximum_steps'}):
+                config_file.write(key + " = " + value + "\n")
+        config_file.write("Saving_Directory = " + saving_dir + "\n")
+        config_file.write("Profiling = True\n")
+        config_file.write("Maximum_steps = " + str(n_steps) + "\n")
+
+
+"""Read the profiling reports written by each process"""
+def read_profiles(directory):
+    reports = []
+    for filename in glob.glob(directory + '/profile_rank*.json'):
+        with open(filename, "r") as f:
+            reports.append(json.load(f))
+    return sorted(reports, key = lambda r: r['rank'])
+
+
+"""Build the text of the report for the scaling study"""
+def format_report(results):
+    lines = []
+    T1 = results[0]['loop_time']
+    lines.append("%6s %12s %12s %10s %10s" % ('nproc', 'setup [s]', 'loop [s]', 'speedup', 'efficiency'))
+    for res in results:
+        speedup = T1/res['loop_time']
+        lines.append("%6d %12.4f %12.4f %10.3f %10.3f" % (res['nproc'], res['setup_time'], res['loop_time'], \
+                                                        speedup, speedup/res['nproc']))
+    for res in results:
+        lines.append("")
+        lines.append("Load balance with " + str(res['nproc']) + " processes")
+        spaces = sorted(res['profiles'][0]['dofs'].keys())
+        header = "%6s" % 'rank'
+        for name in spaces:
+            header += " %12s %12s" % (name + ' owned', name + ' ghost')
+        header += " %12s %12s %12s" % ('assembly [s]', 'solve [s]', 'wait [s]')
+        lines.append(header)
+        for prof in res['profiles']:
+            row = "%6d" % prof['rank']
+            for name in spaces:
+                row += " %12d %12d" % (prof['dofs'][name]['owned'], prof['dofs'][name]['ghost'])
+            row += " %12.4f %12.4f %12.4f" % (prof['timings']['assembly'], prof['timings']['solve'], \
+                                              prof['timings']['wait'])
+            lines.append(row)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run a configuration with 1, 2, 4, ... processes and report the parallel scaling")
+    parser.add_argument("config_file", help = "configuration file of the problem")
+    parser.add_argument("max_nproc", type = int, help = "maximum number of processes")
+    parser.add_argument("n_steps", type = int, nargs = '?', default = 20, help = "number of time-steps of each run (20 by default)")
+    parser.add_argument("--mpiexec", default = "mpirun", help = "command to launch MPI runs ('mpirun' by default)")
+    args = parser.parse_args()
+
+    if(args.max_nproc < 1 or args.n_steps < 1):
+        print("The maximum number of processes and the number of steps must be positive integers")
+        sys.exit(1)
+
+    #Set the directory for the study
+    options = read_config(args.config_file)
+    saving_dir = dict(options).get('Saving_Directory', 'Sim') + '_scaling'
+    os.makedirs(saving_dir, exist_ok = True)
+
+    #Run the configurations
+    results = []
+    nproc = 1
+    while nproc <= args.max_nproc:
+        run_dir = saving_dir + '/np' + str(nproc)
+        run_config = saving_dir + '/np' + str(nproc) + '.cfg'
+        write_config(run_config, options, run_dir, args.n_steps)
+        print("Running with " + str(nproc) + " processes...")
+        t_start = time.perf_counter()
+        subprocess.run([args.mpiexec, "-n", str(nproc), sys.executable, os.path.dirname(os.path.abspath(__file__)) + "/main.py", \
+                        run_config], check = True)
+        t_total = time.perf_counter() - t_start
+
+        profiles = read_profiles(run_dir)
+        if(len(profiles) != nproc):
+            print("Found " + str(len(profiles)) + " profiling reports instead of " + str(nproc) + " in " + run_dir)
+            sys.exit(1)
+        results.append({'nproc': nproc, 'total_time': t_total, 'profiles': profiles, \
+                        'setup_time': max(p['setup_time'] for p in profiles), \
+                        'loop_time': max(p['loop_time'] for p in profiles)})
+        nproc *= 2
+
+    #Print and save the report
+    report = format_report(results)
+    print(report)
+    with open(saving_dir + '/scaling_report.dat', "w") as f:
+        f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("dolfin")
+
+from Auxiliary_Functions import *
+
+"""Check of the NumPy counterparts of the auxiliary functions against the UFL ones: the UFL expressions are evaluated
+   at the vertices of a small mesh with the vertex quadrature scheme (for a continuous expression the value at a vertex
+   is the ratio between its lumped load and the lumped mass) and compared with the NumPy values of the P1 level-set"""
+
+EPS = 0.1
+TOL = 1.0e-10
+
+"""Values at the vertices (in the order of the dofs of the P1 space) of a UFL expression"""
+def vertex_values(expr, Q):
+    v = TestFunction(Q)
+    dx_vertex = dx(metadata = {"quadrature_degree": 1, "quadrature_scheme": "vertex"})
+    load = assemble(expr*v*dx_vertex).get_local()
+    mass = assemble(v*dx_vertex).get_local()
+    return load/mass
+
+
+"""P1 space on the unit square and a level-set whose values cover both sides of the band |phi| < EPS"""
+@pytest.fixture
+def levelset():
+    mesh = UnitSquareMesh(MPI.comm_self, 16, 16)
+    Q = FunctionSpace(mesh, "CG", 1)
+    phi = interpolate(Expression("0.3*sin(2.0*pi*x[0]) + x[1] - 0.5", degree = 4), Q)
+    return (Q, phi)
+
+
+def test_CHeaviside_np(levelset):
+    (Q, phi) = levelset
+    values = phi.vector().get_local()
+    assert np.any(np.abs(values) < EPS) and np.any(np.abs(values) > EPS)
+    assert np.allclose(CHeaviside_np(values, EPS), vertex_values(CHeaviside(phi, EPS), Q), rtol = 0.0, atol = TOL)
+
+
+def test_CDelta_np(levelset):
+    (Q, phi) = levelset
+    values = phi.vector().get_local()
+    assert np.allclose(CDelta_np(values, EPS), vertex_values(CDelta(phi, EPS), Q), rtol = 0.0, atol = TOL)
+
+
+"""The gradient of a P1 function is discontinuous at the vertices, so an affine level-set (constant gradient) is employed"""
+def test_signp_np(levelset):
+    (Q, _) = levelset
+    phi = interpolate(Expression("2.0*x[0] - x[1] - 0.3", degree = 1), Q)
+    values = phi.vector().get_local()
+    grad_phi = np.tile([2.0, -1.0], (len(values), 1))
+    assert np.allclose(signp_np(values, grad_phi, EPS), vertex_values(signp(phi, EPS), Q), rtol = 0.0, atol = TOL)
+
+
+def test_mgrad_np():
+    grad_b = np.array([[3.0, 4.0], [0.0, -2.0]])
+    assert np.allclose(mgrad_np(grad_b), [5.0, 2.0])